@@ -0,0 +1,35 @@
+"""
+Interface for the web services API provided by the Winlink project - www.winlink.org
+
+    from src.cms_api_wrapper import Account
+
+Names are imported on first access, so importing the package is cheap; httpx and asyncio
+are only loaded once a request is made.
+"""
+import importlib
+
+__all__ = ["Account", "Sysop", "Inquires", "CmsApiAdapter", "CmsApiError", "CmsApiTransportError", "SyncClient"]
+
+# Where each exported name is defined
+_EXPORTS = {
+    "Account": "src.cms_api_wrapper.models.account",
+    "Sysop": "src.cms_api_wrapper.models.sysop",
+    "Inquires": "src.cms_api_wrapper.models.inquiries",
+    "CmsApiAdapter": "src.cms_api_wrapper.cms_api_adapter",
+    "CmsApiError": "src.cms_api_wrapper.cms_api_adapter",
+    "CmsApiTransportError": "src.cms_api_wrapper.cms_api_adapter",
+    "SyncClient": "src.cms_api_wrapper.sync_client",
+}
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import functools
+import heapq
+import itertools
+from typing import TYPE_CHECKING, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from src.cms_api_wrapper.ratelimit import PRIORITY_BACKGROUND
+
+if TYPE_CHECKING:
+    import asyncio
+
+# Response encodings the adapter can ask for, most compact first
+ENCODING_PREFERENCE = ("zstd", "br", "gzip", "deflate")
+
+
+@functools.lru_cache(maxsize=None)
+def _installed_encodings() -> FrozenSet[str]:
+    # The same imports httpx tries for its optional decoders
+    encodings = {"gzip", "deflate"}
+    try:
+        import brotli
+        encodings.add("br")
+    except ImportError:
+        try:
+            import brotlicffi
+            encodings.add("br")
+        except ImportError:
+            pass
+    try:
+        import zstandard
+        encodings.add("zstd")
+    except ImportError:
+        pass
+    return frozenset(encodings)
+
+
+def supported_encodings(encodings: Sequence[str] = ENCODING_PREFERENCE) -> List[str]:
+    """
+    Returns those of the encodings that httpx can decode here, in the given order. gzip and deflate
+    always work; br needs the brotli (or brotlicffi) package and zstd the zstandard package.
+    """
+    installed = _installed_encodings()
+    return [encoding for encoding in encodings if encoding in installed]
+
+
+def accept_encoding(encodings: Sequence[str]) -> str:
+    """
+    Builds an Accept-Encoding header that asks for the encodings in order of preference
+    """
+    if not encodings:
+        return "identity"
+    return ", ".join(encoding if i == 0 else f"{encoding};q={1 - i / 10:.1f}" for i, encoding in enumerate(encodings))
+
+
+class EndpointTransfer:
+    __slots__ = ("requests", "sent_bytes", "wire_bytes", "content_bytes", "streamed_wire_bytes", "encodings")
+
+    def __init__(self):
+        self.requests = 0
+        # Request bodies sent
+        self.sent_bytes = 0
+        # Response bodies as received, and after decompression
+        self.wire_bytes = 0
+        self.content_bytes = 0
+        # Wire bytes of streamed responses, whose decompressed size isn't measured
+        self.streamed_wire_bytes = 0
+        self.encodings: Dict[str, int] = {}
+
+    @property
+    def compression_ratio(self) -> float:
+        """
+        Decompressed bytes per byte received, for the responses whose decompressed size is known
+        """
+        measured = self.wire_bytes - self.streamed_wire_bytes
+        return self.content_bytes / measured if measured else 1.0
+
+
+class TransferStats:
+    """
+    Counts the bytes CmsApiAdapter sends and receives per endpoint, before and after response
+    decompression. Every response is counted, including those of retried and hedged requests.
+    """
+
+    def __init__(self):
+        self.endpoints: Dict[str, EndpointTransfer] = {}
+
+    def record(self, endpoint: str, wire_bytes: int, content_bytes: Optional[int], encoding: str = None,
+               sent_bytes: int = 0):
+        """
+        :param wire_bytes: Size of the response body as received
+        :param content_bytes: Size of the decompressed body, None for a streamed response
+        :param encoding: Content-Encoding of the response, None if it wasn't compressed
+        :param sent_bytes: Size of the request body
+        """
+        transfer = self.endpoints.get(endpoint)
+        if transfer is None:
+            transfer = self.endpoints[endpoint] = EndpointTransfer()
+        transfer.requests += 1
+        transfer.sent_bytes += sent_bytes
+        transfer.wire_bytes += wire_bytes
+        if content_bytes is None:
+            transfer.streamed_wire_bytes += wire_bytes
+        else:
+            transfer.content_bytes += content_bytes
+        encoding = encoding or "identity"
+        transfer.encodings[encoding] = transfer.encodings.get(encoding, 0) + 1
+
+    @property
+    def wire_bytes(self) -> int:
+        return sum(transfer.wire_bytes for transfer in self.endpoints.values())
+
+    @property
+    def content_bytes(self) -> int:
+        return sum(transfer.content_bytes for transfer in self.endpoints.values())
+
+    def dump(self) -> Dict:
+        """
+        Returns the counts as a dictionary keyed by endpoint
+        """
+        return {endpoint: {"requests": transfer.requests, "sent_bytes": transfer.sent_bytes,
+                           "wire_bytes": transfer.wire_bytes, "content_bytes": transfer.content_bytes,
+                           "streamed_wire_bytes": transfer.streamed_wire_bytes,
+                           "compression_ratio": transfer.compression_ratio, "encodings": dict(transfer.encodings)}
+                for endpoint, transfer in self.endpoints.items()}
+
+    def format(self) -> str:
+        """
+        Returns a per-endpoint summary as text
+        """
+        lines = [f"{'endpoint':40} {'reqs':>7} {'sent':>9} {'received':>10} {'decoded':>10} {'ratio':>6}"]
+        for endpoint, transfer in sorted(self.endpoints.items()):
+            lines.append(f"{endpoint:40} {transfer.requests:7d} {transfer.sent_bytes:9d} {transfer.wire_bytes:10d} "
+                         f"{transfer.content_bytes:10d} {transfer.compression_ratio:6.2f}")
+        return "\n".join(lines)
+
+
+class TransferSlots:
+    """
+    Limits the number of transfers in progress at once. Waiting transfers are started by priority,
+    and in arrival order within the same priority. Background transfers may only use some of the
+    slots, so that interactive requests don't queue behind a large download.
+    """
+
+    def __init__(self, slots: int, background_slots: int):
+        """
+        :param slots: Transfers allowed at once
+        :param background_slots: How many of them may be background transfers
+        """
+        if slots < 1 or not 1 <= background_slots <= slots:
+            raise ValueError("slots must be at least 1 and background_slots between 1 and slots")
+        self.slots = slots
+        self.background_slots = background_slots
+        self.active = 0
+        self.background_active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for _, _, waiter in self._waiters if not waiter.done())
+
+    def _can_start(self, priority: int) -> bool:
+        if self.active >= self.slots:
+            return False
+        return priority < PRIORITY_BACKGROUND or self.background_active < self.background_slots
+
+    def _start(self, priority: int):
+        self.active += 1
+        if priority >= PRIORITY_BACKGROUND:
+            self.background_active += 1
+
+    async def acquire(self, priority: int):
+        """
+        Waits until the transfer may start. Call release() with the same priority when it is done.
+        """
+        if not self._waiters and self._can_start(priority):
+            self._start(priority)
+            return
+        import asyncio
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), waiter))
+        # A transfer may start ahead of waiting ones with a lower priority
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the wait was cancelled
+                self.release(priority)
+            raise
+
+    def release(self, priority: int):
+        self.active -= 1
+        if priority >= PRIORITY_BACKGROUND:
+            self.background_active -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._waiters:
+            priority, _, waiter = self._waiters[0]
+            if waiter.done():
+                # Cancelled while queued
+                heapq.heappop(self._waiters)
+            elif self._can_start(priority):
+                heapq.heappop(self._waiters)
+                self._start(priority)
+                waiter.set_result(None)
+            else:
+                # Waiters behind this one have the same or a lower priority
+                break
+
+
+class LowBandwidthProfile:
+    """
+    Settings for clients on slow or metered links. Pass one to CmsApiAdapter as low_bandwidth:
+    cached results are kept longer, the catalog is refreshed less often, and only a few transfers run
+    at once, with background ones (such as catalog refreshes) limited further so that interactive
+    calls are not stuck behind them.
+    """
+
+    def __init__(self, max_transfers: int = 2, background_transfers: int = 1, cache_ttl_factor: float = 4.0):
+        """
+        :param max_transfers: Requests the adapter has in progress at once
+        :param background_transfers: How many of them may have background priority (ratelimit.PRIORITY_BACKGROUND)
+        :param cache_ttl_factor: Cached results, and the catalog kept by Inquires, are used this many times longer
+        """
+        if cache_ttl_factor < 1:
+            raise ValueError("cache_ttl_factor must be at least 1")
+        self.max_transfers = max_transfers
+        self.background_transfers = background_transfers
+        self.cache_ttl_factor = cache_ttl_factor
+
+    def transfer_slots(self) -> TransferSlots:
+        return TransferSlots(self.max_transfers, self.background_transfers)
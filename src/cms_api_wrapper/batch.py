@@ -0,0 +1,52 @@
+from typing import Awaitable, Callable, Dict, Iterable, TypeVar, Union
+
+T = TypeVar("T")
+
+DEFAULT_CONCURRENCY = 20
+
+
+def normalize_callsign(callsign: str) -> str:
+    """
+    Callsigns are not case-sensitive; batch results are keyed by the upper-case form.
+    """
+    return callsign.strip().upper()
+
+
+async def run_many(keys: Iterable[str], call: Callable[[str], Awaitable[T]],
+                   concurrency: int = DEFAULT_CONCURRENCY) -> Dict[str, Union[T, Exception]]:
+    """
+    Runs call(key) for every distinct key with at most 'concurrency' calls in flight.
+    A failing call does not abort the batch -- its exception is returned in place of the result.
+    :param keys: Keys to process, duplicates are dropped (first occurrence keeps its position)
+    :param call: Coroutine function invoked once per key
+    :param concurrency: Maximum number of concurrent calls
+    :return: Dictionary mapping each key to its result or exception
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    import asyncio
+    unique_keys = list(dict.fromkeys(keys))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(key: str):
+        async with semaphore:
+            try:
+                return await call(key)
+            except Exception as e:
+                return e
+
+    results = await asyncio.gather(*(run_one(key) for key in unique_keys))
+    return dict(zip(unique_keys, results))
+
+
+async def gather_calls(calls: Dict[str, Awaitable[T]]) -> Dict[str, Union[T, BaseException]]:
+    """
+    Runs independent calls at the same time, for operations that would otherwise make
+    several round trips one after the other.
+    :param calls: Awaitables by name
+    :return: Dictionary mapping each name to its result, or the exception it raised (including the
+        CancelledError of a call that was cancelled)
+    """
+    import asyncio
+    results = await asyncio.gather(*calls.values(), return_exceptions=True)
+    return dict(zip(calls, results))
@@ -0,0 +1,192 @@
+import hashlib
+import hmac
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+# Seconds to keep results of the read-only endpoints that change rarely
+DEFAULT_CACHE_TTLS = {
+    "account/exists/": 300.0,
+    "account/maxMessageSize/get": 300.0,
+    "inquiries/catalog/": 3600.0,
+    "sysop2/get": 600.0,
+}
+
+# Parameters added by the adapter itself, which never distinguish two requests
+EXCLUDED_PARAMS = {"key", "format"}
+
+# Parameters whose values must not be held in memory in plain text
+SECRET_PARAMS = {"password", "oldpassword", "newpassword"}
+
+# Per-process salt, so hashed secrets cannot be looked up in precomputed tables
+_SECRET_SALT = os.urandom(16)
+
+
+def make_key(endpoint: str, params: Dict = None) -> Tuple:
+    """
+    Builds a hashable key from the endpoint and its parameters. Parameter names are
+    compared case-insensitively, callsigns are upper-cased and secrets are replaced with
+    a salted hash.
+    """
+    items = []
+    for name, value in (params or {}).items():
+        name = name.lower()
+        if name in EXCLUDED_PARAMS:
+            continue
+        value = str(value)
+        if name == "callsign":
+            value = value.strip().upper()
+        elif name in SECRET_PARAMS:
+            value = hmac.new(_SECRET_SALT, value.encode(), hashlib.sha256).hexdigest()
+        items.append((name, value))
+    return endpoint, tuple(sorted(items))
+
+
+def key_callsign(key: Tuple) -> Optional[str]:
+    """
+    Returns the callsign a key was built for, if any
+    """
+    for name, value in key[1]:
+        if name == "callsign":
+            return value
+    return None
+
+
+class ResponseCache:
+    """
+    A TTL and LRU bounded cache of successful API results, used by CmsApiAdapter for GET requests.
+    Only endpoints with a positive TTL are cached.
+    """
+
+    def __init__(self, ttls: Dict[str, float] = None, default_ttl: float = 0.0, max_entries: int = 1024,
+                 max_bytes: int = None, clock: Callable[[], float] = time.monotonic):
+        """
+        :param ttls: Seconds to keep results, by endpoint (defaults to DEFAULT_CACHE_TTLS)
+        :param default_ttl: Seconds to keep results of endpoints not listed in ttls (0 = don't cache)
+        :param max_entries: Maximum number of cached results
+        :param max_bytes: (optional) Maximum total size of the cached response bodies
+        :param clock: Time source, in seconds
+        """
+        self.ttls = dict(DEFAULT_CACHE_TTLS if ttls is None else ttls)
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._entries: OrderedDict = OrderedDict()
+        self._by_callsign: Dict[str, Set[Hashable]] = {}
+        # [reads in progress, generation] per callsign, kept only while a read of it is in progress.
+        # invalidate_callsign() bumps the generation, so a read that started before a write can't cache
+        # the old value.
+        self._reads: Dict[str, List[int]] = {}
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def ttl_for(self, endpoint: str) -> float:
+        return self.ttls.get(endpoint, self.default_ttl)
+
+    def get(self, key: Tuple, ttl_factor: float = 1.0):
+        """
+        Returns the cached result for the key, or None if it is missing or expired
+        :param ttl_factor: Also return results up to this many times the TTL of their endpoint old
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, size, result = entry
+            if ttl_factor > 1:
+                expires += (ttl_factor - 1) * self.ttl_for(key[0])
+            if expires > self._clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+            self._remove(key)
+        self.misses += 1
+        return None
+
+    def start_read(self, key: Tuple) -> int:
+        """
+        Call before fetching a result for the key, and finish_read() once it is done (after put()).
+        :return: The invalidation generation of the key's callsign, to pass to put()
+        """
+        callsign = key_callsign(key)
+        if not callsign:
+            return 0
+        reads = self._reads.setdefault(callsign, [0, 0])
+        reads[0] += 1
+        return reads[1]
+
+    def finish_read(self, key: Tuple):
+        callsign = key_callsign(key)
+        reads = self._reads.get(callsign) if callsign else None
+        if reads is not None:
+            reads[0] -= 1
+            if not reads[0]:
+                del self._reads[callsign]
+
+    def _generation(self, key: Tuple) -> int:
+        callsign = key_callsign(key)
+        reads = self._reads.get(callsign) if callsign else None
+        return reads[1] if reads is not None else 0
+
+    def put(self, key: Tuple, result, size: int = 0, generation: int = None):
+        """
+        Caches a result for the TTL of its endpoint, evicting the least recently used entries
+        to stay within the configured bounds.
+        :param generation: (optional) start_read() of the key when the result was requested. If the
+            callsign has been invalidated since, the result may be out of date and isn't cached.
+        """
+        ttl = self.ttl_for(key[0])
+        if ttl <= 0 or (self.max_bytes is not None and size > self.max_bytes):
+            return
+        if generation is not None and generation != self._generation(key):
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (self._clock() + ttl, size, result)
+        self.size_bytes += size
+        callsign = key_callsign(key)
+        if callsign:
+            self._by_callsign.setdefault(callsign, set()).add(key)
+        while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self.size_bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate_callsign(self, callsign: str) -> int:
+        """
+        Removes every cached result for the callsign
+        :return: Number of entries removed
+        """
+        callsign = callsign.strip().upper()
+        reads = self._reads.get(callsign)
+        if reads is not None:
+            reads[1] += 1
+        keys = self._by_callsign.get(callsign, set()).copy()
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def clear(self):
+        self._entries.clear()
+        self._by_callsign.clear()
+        self.size_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "bytes": self.size_bytes, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
+
+    def _remove(self, key: Tuple):
+        _, size, _ = self._entries.pop(key)
+        self.size_bytes -= size
+        callsign = key_callsign(key)
+        if callsign:
+            keys = self._by_callsign.get(callsign)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_callsign[callsign]
@@ -0,0 +1,66 @@
+import hashlib
+from typing import NamedTuple, Optional
+
+
+class StoredCatalog(NamedTuple):
+    """
+    The last inquiry catalog fetched from the CMS, as kept on disk
+    """
+    body: bytes
+    content_hash: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+
+
+def content_hash(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+class CatalogStore:
+    """
+    Keeps the last inquiry catalog response in an SQLite file, so it survives restarts.
+    The response body is stored undecoded together with its hash and cache validators.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: SQLite database file, created if it doesn't exist
+        """
+        import sqlite3
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS catalog ("
+                " id INTEGER PRIMARY KEY CHECK (id = 1),"
+                " body BLOB NOT NULL,"
+                " content_hash TEXT NOT NULL,"
+                " etag TEXT,"
+                " last_modified TEXT,"
+                " fetched_at REAL NOT NULL)")
+
+    def load(self) -> Optional[StoredCatalog]:
+        row = self._connection.execute(
+            "SELECT body, content_hash, etag, last_modified, fetched_at FROM catalog WHERE id = 1").fetchone()
+        return StoredCatalog(*row) if row else None
+
+    def save(self, body: bytes, etag: str = None, last_modified: str = None, fetched_at: float = 0.0) -> StoredCatalog:
+        stored = StoredCatalog(body, content_hash(body), etag, last_modified, fetched_at)
+        with self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO catalog (id, body, content_hash, etag, last_modified, fetched_at)"
+                " VALUES (1, ?, ?, ?, ?, ?)", stored)
+        return stored
+
+    def touch(self, fetched_at: float, etag: str = None, last_modified: str = None):
+        """
+        Records that the stored catalog was found unchanged, without rewriting the body
+        """
+        with self._connection:
+            self._connection.execute(
+                "UPDATE catalog SET fetched_at = ?, etag = COALESCE(?, etag),"
+                " last_modified = COALESCE(?, last_modified) WHERE id = 1", (fetched_at, etag, last_modified))
+
+    def close(self):
+        self._connection.close()
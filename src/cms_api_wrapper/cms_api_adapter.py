@@ -1,40 +1,153 @@
-import json
+from __future__ import annotations
+
 import logging
+import time
+from contextlib import asynccontextmanager
 from http import HTTPStatus
 from json import JSONDecodeError
-from types import SimpleNamespace
-from typing import List, Dict
-import httpx
+from typing import TYPE_CHECKING, AsyncIterator, Callable, List, Dict, Optional, Sequence, Tuple, Union
+
+from src.cms_api_wrapper.bandwidth import (ENCODING_PREFERENCE, LowBandwidthProfile, TransferStats, accept_encoding,
+                                            supported_encodings)
+from src.cms_api_wrapper.cache import ResponseCache, key_callsign, make_key
+from src.cms_api_wrapper.deadlines import clear_deadline, remaining
+from src.cms_api_wrapper.decoders import get_decoder
+from src.cms_api_wrapper.hedging import HedgingPolicy
+from src.cms_api_wrapper.hosts import HostSelector
+from src.cms_api_wrapper.instrumentation import Instrumentation, PhaseTracer, RequestMetrics, redact_params
+from src.cms_api_wrapper.ratelimit import PRIORITY_NORMAL, shared_bucket
+from src.cms_api_wrapper.resilience import CircuitBreaker, RetryPolicy
+
+if TYPE_CHECKING:
+    # asyncio and httpx are imported on first use, keeping the package quick to import
+    import asyncio
+    import httpx
+
+    from src.cms_api_wrapper.validation import RequestValidator
+
+# Endpoints that change data on the server. They are sent as POST, but are never cached or
+# retried if called with GET (as older versions of this library did).
+MUTATING_GET_ENDPOINTS = {"account/maxMessageSize/set", "sysop/add/"}
+# POST endpoints that only read data; they leave cached results alone
+READ_ONLY_POST_ENDPOINTS = {"account/password/validate/"}
+
+PARAMS_IN_QUERY = "query"
+PARAMS_IN_BODY = "body"
+# Where the parameters of each POST endpoint go. Parameters in the body keep passwords out of
+# URLs (and server logs) and have no length limit. GET parameters, and those of POST endpoints
+# not listed here, go in the query string. The API key always goes in the query string.
+# The CMS only offers GET for account/alternateEmail/get, account/password/recovery/email/get and
+# sysop2/get, so the password those take still goes in the query string, where proxy and server
+# logs can record it.
+PARAM_PLACEMENT = {
+    "account/add/": PARAMS_IN_BODY,
+    "account/password/change/": PARAMS_IN_BODY,
+    "account/password/validate/": PARAMS_IN_BODY,
+    "account/password/send": PARAMS_IN_BODY,
+    "account/alternateEmail/set": PARAMS_IN_BODY,
+    "account/password/recovery/email/set": PARAMS_IN_BODY,
+    "account/maxMessageSize/set": PARAMS_IN_BODY,
+    "sysop/add/": PARAMS_IN_BODY,
+}
 
 
 class ApiResult:
     """
     The result of the API request
     """
+    __slots__ = ("error_code", "error_message", "data", "size")
 
-    def __init__(self, error_code: str = "", error_message: str = "", data: List[Dict] = None):
+    def __init__(self, error_code: str = "", error_message: str = "", data: List[Dict] = None, size: int = 0):
         """
         The results returned from low-level CmsApiAdapter
         :param error_code: code for error, if any
         :param error_message: descriptive error message or blank
         :param data: List of Dictionaries
+        :param size: size of the response body in bytes
         """
         self.error_code = error_code
         self.error_message = error_message
         self.data = data if data else []
+        self.size = size
 
 
 class CmsApiError(Exception):
     pass
 
 
+class CmsApiTransportError(Exception):
+    """
+    Raised when the CMS could not be reached, or answered with a server error
+    """
+    pass
+
+
+class CircuitOpenError(CmsApiTransportError):
+    """
+    Raised without sending the request while the circuit breaker for the host is open
+    """
+    pass
+
+
+class DeadlineExceeded(CmsApiTransportError):
+    """
+    Raised when the deadline of a call runs out (see deadlines.py). Requests still in flight are cancelled.
+    """
+    pass
+
+
+class lazy_field:
+    """
+    Decorator for a response field that is computed from the result on first access.
+    Works like functools.cached_property, but stores the value in the slot named
+    '_' + the field name, which the class must declare in __slots__.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.__doc__ = func.__doc__
+        self.slot = None
+
+    def __set_name__(self, owner, name):
+        self.slot = getattr(owner, "_" + name)
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        try:
+            return self.slot.__get__(instance, owner)
+        except AttributeError:
+            value = self.func(instance)
+            self.slot.__set__(instance, value)
+            return value
+
+
 class WebServiceResponse:
-    def __init__(self, result: ApiResult):
+    __slots__ = ("error_code", "error_message", "has_error", "_result", "_keep_raw")
+
+    def __init__(self, result: ApiResult, keep_raw: bool = False):
         self.error_code = result.error_code
         self.error_message = result.error_message
         self.has_error = self.error_code != ""
         if self.has_error:
             raise CmsApiError(f"{self.error_code}: {self.error_message}")
+        # Subclasses read their fields from the result on first access
+        self._result = result
+        self._keep_raw = keep_raw
+
+    @property
+    def raw_data(self):
+        """
+        The decoded response payload, only available if keep_raw was requested
+        """
+        return self._result.data if self._keep_raw else None
+
+    def _release_result(self):
+        """
+        Drops the reference to the raw payload once all fields have been built from it
+        """
+        if not self._keep_raw:
+            self._result = None
 
 
 # Internal class
@@ -50,47 +163,373 @@ class ResponseStatus:
 
 
 class CmsApiAdapter:
+    """
+    Low-level access to the CMS web services. A single adapter keeps a pool of keep-alive
+    connections open, so it should be created once and shared by the Account, Sysop and
+    Inquires classes. Use it as an async context manager, or call aclose() when done.
+    """
 
-    def __init__(self, api_key: str, hostname: str = 'api.winlink.org', logger: logging.Logger = None):
+    def __init__(self, api_key: str, hostname: Union[str, Sequence[str]] = 'api.winlink.org',
+                 logger: logging.Logger = None,
+                 http2: bool = False, max_connections: int = 100, max_keepalive_connections: int = 20,
+                 keepalive_expiry: float = 30.0, timeout: float = 5.0,
+                 transport: httpx.AsyncBaseTransport = None, cache: ResponseCache = None,
+                 coalesce: bool = True, retry_policy: RetryPolicy = None, failure_threshold: int = 5,
+                 reset_timeout: float = 30.0, event_hook: Callable[[str, Dict], None] = None,
+                 rate_limit: float = None, burst: int = 10, decoder: str = None, scheme: str = "https",
+                 instrumentation: Instrumentation = None, probe_interval: float = 60.0, body_format: str = "json",
+                 param_placement: Dict[str, str] = None, validator: Union[RequestValidator, bool] = None,
+                 hedging: HedgingPolicy = None, compression: Union[bool, Sequence[str]] = True,
+                 low_bandwidth: LowBandwidthProfile = None):
         """
         Constructor for RestAdapter
         :param api_key: Web service access key
-        :param hostname: Normally, api.winlink.org
+        :param hostname: Normally, api.winlink.org. With a list of hosts, each request goes to the host
+            with the lowest recent latency and error rate, and fails over to another host on connection errors.
         :param logger: (optional)
+        :param http2: Negotiate HTTP/2 with the server (requires the httpx[http2] extra)
+        :param max_connections: Maximum number of concurrent connections in the pool
+        :param max_keepalive_connections: Maximum number of idle connections kept open
+        :param keepalive_expiry: Seconds an idle connection is kept open
+        :param timeout: Network timeout in seconds
+        :param transport: (optional) Custom httpx transport, e.g. for testing
+        :param cache: (optional) Cache for the results of read-only GET requests
+        :param coalesce: Share one HTTP request between identical concurrent read-only GET requests
+        :param retry_policy: (optional) Retry policy for read-only GET requests
+        :param failure_threshold: Consecutive failures after which requests to a host fail fast
+        :param reset_timeout: Seconds to fail fast before a host is probed again
+        :param event_hook: (optional) Called with (event name, fields) on retries and circuit breaker changes
+        :param rate_limit: (optional) Requests per second allowed for this API key. The limit is shared by
+            all adapters in the process using the same key, on every host; requests beyond it wait their turn.
+            Adapters sharing a key must use the same rate_limit and burst.
+        :param burst: Number of requests that may be sent at once before rate_limit applies
+        :param decoder: (optional) JSON decoder: 'orjson', 'msgspec' or 'json'. Defaults to the fastest installed.
+        :param scheme: URL scheme, 'http' is only useful against a local test server
+        :param instrumentation: (optional) Receives timing and size measurements for every request,
+            see instrumentation.MetricsAggregator and instrumentation.SpanInstrumentation
+        :param probe_interval: With several hosts, seconds after which an unused host is sent a request
+            to measure its latency again
+        :param body_format: How parameters sent in a POST body are encoded, 'json' or 'form'
+        :param param_placement: (optional) Overrides PARAM_PLACEMENT for some endpoints
+        :param validator: (optional) Checks the parameters of get() and post() requests before they are sent,
+            raising validation.ValidationError for callsigns, addresses, grid squares and message sizes the CMS
+            would reject. True uses validation.DEFAULT_VALIDATOR. Requests are sent unchecked by default.
+        :param hedging: (optional) Sends a second copy of read-only GET requests that are slower than usual,
+            and uses whichever answer comes first
+        :param compression: Ask for compressed responses. True asks for zstd, brotli, gzip or deflate, whichever
+            of them httpx can decode here; a sequence names the encodings in order of preference; False asks
+            for uncompressed responses. The bytes received per endpoint are counted in transfers.
+        :param low_bandwidth: (optional) Settings for slow or metered links: longer cache lifetimes (a cache with
+            the default TTLs is created if none is given) and a limit on concurrent transfers
         """
 
         self.api_key = api_key
-        self.url = f"https://{hostname}/"
+        self.hosts = [hostname] if isinstance(hostname, str) else list(hostname)
+        self.hostname = self.hosts[0]
+        self._scheme = scheme
+        self.url = f"{scheme}://{self.hostname}/"
         self._logger = logger or logging.getLogger(__name__)
+        self._http2 = http2
+        self._limits = dict(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections,
+                            keepalive_expiry=keepalive_expiry)
+        self._timeout = timeout
+        self._transport = transport
+        self._client = None
+        self.cache = cache
+        self.coalesce = coalesce
+        self._in_flight: Dict[Tuple, asyncio.Future] = {}
+        self.retry_policy = retry_policy or RetryPolicy()
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self.host_selector = HostSelector(self.hosts, self._breaker_for, probe_interval=probe_interval)
+        self._event_hook = event_hook
+        self._rate_limiter = shared_bucket(api_key, rate_limit, burst) if rate_limit else None
+        self._decode, self._decode_errors = get_decoder(decoder)
+        self.instrumentation = instrumentation
+        if body_format not in ("json", "form"):
+            raise ValueError(f"Unknown body format: {body_format}")
+        self.body_format = body_format
+        self.param_placement = {**PARAM_PLACEMENT, **(param_placement or {})}
+        if validator is True:
+            from src.cms_api_wrapper.validation import DEFAULT_VALIDATOR as validator
+        self.validator = validator or None
+        self.hedging = hedging
+        if compression is True:
+            compression = ENCODING_PREFERENCE
+        unknown = set(compression or ()) - set(ENCODING_PREFERENCE)
+        if unknown:
+            raise ValueError(f"Unknown response encoding: {', '.join(sorted(unknown))}")
+        self.compression = tuple(compression or ())
+        self.transfers = TransferStats()
+        self.low_bandwidth = low_bandwidth
+        self._transfer_slots = None
+        self._cache_ttl_factor = 1.0
+        if low_bandwidth is not None:
+            self._transfer_slots = low_bandwidth.transfer_slots()
+            self._cache_ttl_factor = low_bandwidth.cache_ttl_factor
+            if self.cache is None:
+                self.cache = ResponseCache()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
 
-    async def _do(self, http_method: str, endpoint: str, ep_params: Dict = None, data: Dict = None) -> ApiResult:
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        Returns the pooled http client, creating it on first use
+        """
+        if self._client is None or self._client.is_closed:
+            import httpx
+            headers = {"Accept-Encoding": accept_encoding(supported_encodings(self.compression))}
+            self._client = httpx.AsyncClient(verify=False, http2=self._http2, limits=httpx.Limits(**self._limits),
+                                             timeout=self._timeout, transport=self._transport, headers=headers)
+        return self._client
+
+    async def aclose(self):
+        """
+        Closes the pooled connections. The adapter may be used again afterwards;
+        a new pool is created on the next request.
+        """
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _emit(self, event: str, **fields):
+        """
+        Reports an event to the event hook and instrumentation, if any
+        """
+        if self.instrumentation is not None:
+            try:
+                self.instrumentation.on_event(event, fields)
+            except Exception:
+                self._logger.exception(msg=f"instrumentation failed for {event}")
+        if self._event_hook is not None:
+            try:
+                self._event_hook(event, fields)
+            except Exception:
+                self._logger.exception(msg=f"event hook failed for {event}")
+
+    def _breaker_for(self, host: str) -> CircuitBreaker:
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            def on_state_change(old_state: str, new_state: str):
+                self._logger.warning(msg=f"circuit for {host} changed from {old_state} to {new_state}")
+                self._emit("circuit_state", host=host, old_state=old_state, new_state=new_state)
+
+            breaker = CircuitBreaker(self._failure_threshold, self._reset_timeout, on_state_change)
+            self._breakers[host] = breaker
+        return breaker
+
+    async def _backoff(self, endpoint: str, attempt: int, reason: str, response: httpx.Response = None):
+        delay = self.retry_policy.delay(attempt, response)
+        budget = remaining()
+        if budget is not None and delay >= budget:
+            raise DeadlineExceeded(f"Deadline exceeded, not retrying {endpoint} after attempt {attempt}: {reason}")
+        self._logger.warning(msg=f"retrying {endpoint} in {delay:.2f}s after attempt {attempt}: {reason}")
+        self._emit("retry", endpoint=endpoint, attempt=attempt, delay=delay, reason=reason)
+        import asyncio
+        await asyncio.sleep(delay)
+
+    async def _do(self, http_method: str, endpoint: str, ep_params: Dict = None, data: Dict = None,
+                  priority: int = PRIORITY_NORMAL) -> ApiResult:
         """
         Private method for get(), post(), etc. methods
         :param http_method: GET, POST, DELETE, etc.
         :param endpoint: URL Endpoint as a string
         :param ep_params: Dictionary of Endpoint parameters (Optional)
         :param data: Dictionary of data to pass to TheCatApi (Optional)
+        :param priority: Queue position when rate limited, see ratelimit.PRIORITY_*
         :return: a Result object
         """
-        full_url = self.url + endpoint
-        # Create dictionary for params if not supplied.
-        if ep_params is None:
-            ep_params = {}
-        ep_params["key"] = self.api_key
-        ep_params["format"] = "json"
-        log_line_pre = f"method={http_method}, url={full_url}, params={ep_params}"
+        metrics = self._start_metrics(http_method, endpoint, ep_params)
+        if metrics is None:
+            response, log_line_pre = await self._send(http_method, endpoint, ep_params, data, priority)
+            return self._to_result(response, log_line_pre)
+        start = time.perf_counter()
+        try:
+            response, log_line_pre = await self._send(http_method, endpoint, ep_params, data, priority,
+                                                      metrics=metrics)
+            decode_start = time.perf_counter()
+            result = self._to_result(response, log_line_pre)
+            metrics.phases["decode"] = time.perf_counter() - decode_start
+            return result
+        except BaseException as e:
+            metrics.error = type(e).__name__
+            raise
+        finally:
+            metrics.duration = time.perf_counter() - start
+            self._report(metrics)
 
-        # Log HTTP params and perform an HTTP request, catching and re-raising any exceptions.
+    def _start_metrics(self, http_method: str, endpoint: str, ep_params: Dict,
+                       cache_hit: bool = False) -> Optional[RequestMetrics]:
+        """
+        Returns a metrics record for the request, or None when no instrumentation is configured
+        """
+        if self.instrumentation is None:
+            return None
+        metrics = RequestMetrics(http_method, endpoint, self.hostname, ep_params)
+        metrics.cache_hit = cache_hit
+        return metrics
+
+    def _report(self, metrics: RequestMetrics):
         try:
-            self._logger.debug(msg=log_line_pre)
+            self.instrumentation.on_request(metrics)
+        except Exception:
+            self._logger.exception(msg=f"instrumentation failed for {metrics.endpoint}")
+
+    async def _send(self, http_method: str, endpoint: str, ep_params: Dict = None, data: Dict = None,
+                    priority: int = PRIORITY_NORMAL, headers: Dict = None,
+                    metrics: RequestMetrics = None, stream: bool = False) -> Tuple[httpx.Response, str]:
+        """
+        Sends the request to the best available host, applying the rate limit, retry policy and circuit breakers
+        :param metrics: (optional) Filled in with the attempt count, status, size and phase timings
+        :param stream: Return as soon as the headers arrive, leaving the body to be read (and the response closed)
+            by the caller
+        :return: The final response, and the log line describing the request
+        """
+        slots = self._transfer_slots
+        if slots is None:
+            return await self._send_attempts(http_method, endpoint, ep_params, data, priority, headers, metrics,
+                                             stream)
+        await slots.acquire(priority)
+        try:
+            result = await self._send_attempts(http_method, endpoint, ep_params, data, priority, headers, metrics,
+                                               stream)
+        except BaseException:
+            slots.release(priority)
+            raise
+        if not stream:
+            slots.release(priority)
+        # A streamed response keeps its transfer slot until stream() closes it
+        return result
+
+    async def _send_attempts(self, http_method: str, endpoint: str, ep_params: Dict, data: Dict, priority: int,
+                             headers: Dict, metrics: RequestMetrics, stream: bool) -> Tuple[httpx.Response, str]:
+        query = {"key": self.api_key, "format": "json"}
+        body = data
+        if http_method != 'GET' and self.param_placement.get(endpoint) == PARAMS_IN_BODY:
+            body = {**(ep_params or {}), **(data or {})}
+        else:
+            query = {**(ep_params or {}), **query}
+        if body is None:
+            content = {}
+        elif self.body_format == "form" and body is not data:
+            content = {"data": body}
+        else:
+            content = {"json": body}
+        redacted_params = redact_params(query)
+        if body is not None:
+            redacted_params = f"{redacted_params}, body={redact_params(body)}"
+
+        # Only read-only GET requests are safe to send more than once
+        retryable = http_method == 'GET' and endpoint not in MUTATING_GET_ENDPOINTS
+        max_attempts = self.retry_policy.max_attempts if retryable else 1
+        selector = self.host_selector
+        # Hosts that failed this request; retries go elsewhere if possible
+        failed = set()
+        attempt = 0
+        sent = 0
+
+        client = self._get_client()
+        import httpx
 
-            async with httpx.AsyncClient(verify=False) as client:
-                response = await client.request(method=http_method, url=full_url, params=ep_params, json=data)
+        # Log HTTP params and perform an HTTP request, catching and re-raising any exceptions.
+        while True:
+            attempt += 1
+            host = selector.choose(avoid=failed)
+            if host is None:
+                self._emit("circuit_rejected", host=", ".join(self.hosts), endpoint=endpoint)
+                raise CircuitOpenError(f"Circuit open for {', '.join(self.hosts)}")
+            full_url = f"{self._scheme}://{host.host}/{endpoint}"
+            log_line_pre = f"method={http_method}, url={full_url}, params={redacted_params}"
+            if self._rate_limiter is not None:
+                await self._rate_limiter.acquire(priority)
+            budget = remaining()
+            if budget is not None and budget <= 0:
+                raise DeadlineExceeded(f"Deadline exceeded before {endpoint} could be sent")
+            try:
+                self._logger.debug(msg=log_line_pre)
+
+                extensions = None
+                sent += 1
+                if metrics is not None:
+                    metrics.attempts = sent
+                    metrics.host = host.host
+                    # Phase timings describe the last attempt only
+                    metrics.phases.clear()
+                    extensions = {"trace": PhaseTracer(metrics.phases)}
+                if budget is not None and budget < self._timeout:
+                    # The request may take no longer than the call it is made for
+                    content["timeout"] = budget
+                request = client.build_request(method=http_method, url=full_url, params=query, headers=headers,
+                                               extensions=extensions, **content)
+                start = time.perf_counter()
+                response = await client.send(request, stream=stream)
+
+            except httpx.RequestError as e:
+                if budget is not None and isinstance(e, httpx.TimeoutException) and remaining() <= 0:
+                    # Timed out on the caller's deadline, which says nothing about the host
+                    raise DeadlineExceeded(f"Deadline exceeded waiting for {endpoint}") from e
+                selector.record_failure(host)
+                failed.add(host.host)
+                if isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout)) and len(failed) < len(selector):
+                    # The request never reached the host, so any request can go to the next one.
+                    # A failover doesn't use up a retry.
+                    self._logger.warning(msg=f"{host.host} unreachable, failing over: {e!r}")
+                    self._emit("failover", host=host.host, endpoint=endpoint, reason=repr(e))
+                    attempt -= 1
+                    continue
+                if attempt < max_attempts and self.retry_policy.is_retryable_error(e):
+                    await self._backoff(endpoint, attempt, repr(e))
+                    continue
+                self._logger.error(msg=(str(e)))
+                raise CmsApiTransportError("Request failed") from e
 
-        except httpx.RequestError as e:
-            self._logger.error(msg=(str(e)))
-            raise Exception("Request failed") from e
+            if not stream:
+                self.transfers.record(endpoint, response.num_bytes_downloaded, len(response.content),
+                                      response.headers.get("Content-Encoding"), len(request.content))
+            if metrics is not None:
+                metrics.status_code = response.status_code
+                if not stream:
+                    metrics.response_bytes = len(response.content)
+                    metrics.wire_bytes = response.num_bytes_downloaded
+            if response.status_code < 500:
+                selector.record_success(host, time.perf_counter() - start)
+                return response, log_line_pre
+            selector.record_failure(host)
+            failed.add(host.host)
+            if attempt < max_attempts and response.status_code in self.retry_policy.retry_statuses:
+                if stream:
+                    await response.aclose()
+                await self._backoff(endpoint, attempt, f"status_code={response.status_code}", response)
+                continue
+            return response, log_line_pre
+
+    def decode(self, body: bytes):
+        """
+        Decodes JSON with the configured decoder
+        """
+        return self._decode(body)
 
+    def result_from_body(self, body: bytes) -> ApiResult:
+        """
+        Decodes a CMS API response body into a result
+        """
+        data_out = self._decode(body)
+        # Unpack response status returned from API call.
+        response_status = ResponseStatus(data_out["ResponseStatus"])
+        # Remove response status from data list -- data_out will just be the requested information.
+        del data_out["ResponseStatus"]
+        return ApiResult(response_status.api_error_code, response_status.api_error_message, data=data_out,
+                         size=len(body))
+
+    def _to_result(self, response: httpx.Response, log_line_pre: str) -> ApiResult:
+        """
+        Turns the response into a result, raising an exception for anything but success or a validation error
+        """
         is_success = 299 >= response.status_code >= 200  # 200 to 299 is OK
         log_line = ', '.join((log_line_pre, f"success={is_success}, status_code={response.status_code}"))
 
@@ -98,25 +537,18 @@ class CmsApiAdapter:
         if is_success:
             # Get JSON result, or return failed result on exception.
             try:
-                data_out = response.json()
-            except (ValueError, JSONDecodeError) as e:
+                return self.result_from_body(response.content)
+            except (ValueError, JSONDecodeError, *self._decode_errors) as e:
                 log_line = ', '.join((log_line_pre, f"success={False}, status_code={None}, message={e}"))
                 self._logger.error(msg=log_line)
                 raise Exception("Bad JSON in response") from e
-
-            # Unpack response status returned from API call.
-            response_status = ResponseStatus(data_out["ResponseStatus"])
-            # Remove response status from data list -- data_out will just be the requested information.
-            del data_out["ResponseStatus"]
-
-            return ApiResult(response_status.api_error_code, response_status.api_error_message, data=data_out)
         elif response.status_code == 400:
             """
             API validation error - extract the response status object
             """
-            jo = json.loads(response.content, object_hook=lambda d: SimpleNamespace(**d))
+            response_status = ResponseStatus(self._decode(response.content)["ResponseStatus"])
             # Return validation error status
-            return ApiResult(jo.ResponseStatus.ErrorCode, jo.ResponseStatus.Message)
+            return ApiResult(response_status.api_error_code, response_status.api_error_message)
 
         # Try to find the expanded HTTP error text.
         try:
@@ -126,18 +558,222 @@ class CmsApiAdapter:
 
         # Some other error - log it
         self._logger.error(msg=log_line)
+        if response.status_code >= 500:
+            raise CmsApiTransportError(str(response.status_code), reason)
         raise Exception(str(response.status_code), reason)
 
-    async def get(self, endpoint: str, params: Dict = None) -> ApiResult:
+    def _invalidate(self, params: Dict):
+        """
+        Drops cached results for the callsign a write request was made for. Reads of it still in
+        flight are left to their current callers, and later readers start a new request.
+        """
+        if not params or not params.get("Callsign"):
+            return
+        callsign = str(params["Callsign"]).strip().upper()
+        if self.cache is not None:
+            self.cache.invalidate_callsign(callsign)
+        for key in [key for key in self._in_flight if key_callsign(key) == callsign]:
+            del self._in_flight[key]
+
+    async def get(self, endpoint: str, params: Dict = None, priority: int = PRIORITY_NORMAL) -> ApiResult:
+        """
+        Make an HTTP GET request. Successful results of read-only endpoints are served
+        from the cache, if one is configured, and identical concurrent requests share
+        one HTTP call and result.
+        """
+        if self.validator is not None:
+            self.validator.check(endpoint, params)
+        if endpoint in MUTATING_GET_ENDPOINTS:
+            try:
+                return await self._do(http_method='GET', endpoint=endpoint, ep_params=params, priority=priority)
+            finally:
+                self._invalidate(params)
+
+        cacheable = self.cache is not None and self.cache.ttl_for(endpoint) > 0
+        if not cacheable and not self.coalesce:
+            return await self._fetch(endpoint, params, priority)
+
+        key = make_key(endpoint, params)
+        if cacheable:
+            result = self.cache.get(key, self._cache_ttl_factor)
+            if result is not None:
+                metrics = self._start_metrics('GET', endpoint, params, cache_hit=True)
+                if metrics is not None:
+                    metrics.response_bytes = result.size
+                    self._report(metrics)
+                return result
+        if not self.coalesce:
+            return await self._get_and_cache(endpoint, params, key, priority)
+
+        # Single-flight: concurrent identical requests wait on the same task. The task is
+        # shielded so that a cancelled caller doesn't cancel the request for everybody else.
+        import asyncio
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._shared_get(endpoint, params, key, priority))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._request_done(key, t))
+        return await asyncio.shield(task)
+
+    async def _get_and_cache(self, endpoint: str, params: Dict, key: Tuple, priority: int) -> ApiResult:
+        cache = self.cache
+        if cache is None:
+            return await self._fetch(endpoint, params, priority)
+        generation = cache.start_read(key)
+        try:
+            result = await self._fetch(endpoint, params, priority)
+            if not result.error_code:
+                # Not cached if a write to the callsign finished while the request was in flight
+                cache.put(key, result, result.size, generation)
+            return result
+        finally:
+            cache.finish_read(key)
+
+    async def _shared_get(self, endpoint: str, params: Dict, key: Tuple, priority: int) -> ApiResult:
+        # Runs in its own task, for every caller waiting on it; a caller's deadline only ends its own wait
+        clear_deadline()
+        return await self._get_and_cache(endpoint, params, key, priority)
+
+    async def _fetch(self, endpoint: str, params: Dict, priority: int) -> ApiResult:
         """
-        Make an HTTP GET request
+        Sends a read-only GET request, hedging it if the hedging policy says so
         """
-        return await self._do(http_method='GET', endpoint=endpoint, ep_params=params)
+        hedging = self.hedging
+        if hedging is None:
+            return await self._do(http_method='GET', endpoint=endpoint, ep_params=params, priority=priority)
+        start = time.perf_counter()
+        delay = hedging.delay(endpoint)
+        if delay is None:
+            result = await self._do(http_method='GET', endpoint=endpoint, ep_params=params, priority=priority)
+            hedging.record(endpoint, time.perf_counter() - start)
+            return result
+
+        import asyncio
+        primary = asyncio.ensure_future(self._do(http_method='GET', endpoint=endpoint, ep_params=params,
+                                                 priority=priority))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                hedging.hedged += 1
+                self._emit("hedge", endpoint=endpoint, delay=delay)
+                tasks.add(asyncio.ensure_future(self._do(http_method='GET', endpoint=endpoint, ep_params=params,
+                                                         priority=priority)))
+            pending = tasks
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        hedging.record(endpoint, time.perf_counter() - start)
+                        if task is not primary:
+                            hedging.hedge_wins += 1
+                        return task.result()
+            # Both copies failed; report the original request's error
+            return primary.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            # Let cancelled requests release their connections before returning
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _request_done(self, key: Tuple, task: asyncio.Future):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Mark the exception as retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
 
-    async def post(self, endpoint: str, params: Dict = None, data: Dict = None) -> ApiResult:
+    async def get_conditional(self, endpoint: str, params: Dict = None, etag: str = None, last_modified: str = None,
+                              priority: int = PRIORITY_NORMAL) -> Tuple[Optional[bytes], httpx.Headers]:
         """
-        Make an HTTP POST request
+        Make an HTTP GET request that the server may answer with '304 Not Modified'. The body is
+        returned undecoded, so the caller can skip decoding a copy it already has. Use
+        result_from_body() to decode it.
+        :param etag: ETag of the copy the caller has
+        :param last_modified: Last-Modified date of the copy the caller has
+        :return: The response body (None if not modified) and the response headers
+        """
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        metrics = self._start_metrics('GET', endpoint, params)
+        start = time.perf_counter()
+        try:
+            response, log_line_pre = await self._send('GET', endpoint, params, priority=priority, headers=headers,
+                                                      metrics=metrics)
+        except BaseException as e:
+            if metrics is not None:
+                metrics.error = type(e).__name__
+            raise
+        finally:
+            if metrics is not None:
+                metrics.duration = time.perf_counter() - start
+                self._report(metrics)
+        if response.status_code == HTTPStatus.NOT_MODIFIED:
+            return None, response.headers
+        if not (299 >= response.status_code >= 200 or response.status_code == 400):
+            # Raises the same exception a plain get() would
+            self._to_result(response, log_line_pre)
+        return response.content, response.headers
+
+    @asynccontextmanager
+    async def stream(self, endpoint: str, params: Dict = None,
+                     priority: int = PRIORITY_NORMAL) -> AsyncIterator[httpx.Response]:
         """
-        return await self._do(http_method='POST', endpoint=endpoint, ep_params=params, data=data)
+        Make an HTTP GET request whose body is read incrementally, with response.aiter_bytes(), inside
+        the 'async with' block. The request is retried like get() until the headers arrive, but it
+        bypasses the cache and is never shared with other callers. Error statuses raise the same
+        exceptions get() would.
+        """
+        metrics = self._start_metrics('GET', endpoint, params)
+        start = time.perf_counter()
+        response = None
+        try:
+            response, log_line_pre = await self._send('GET', endpoint, params, priority=priority, metrics=metrics,
+                                                      stream=True)
+            if not 299 >= response.status_code >= 200:
+                await response.aread()
+                result = self._to_result(response, log_line_pre)
+                # Only a validation error gets this far
+                raise CmsApiError(f"{result.error_code}: {result.error_message}")
+            yield response
+        except GeneratorExit:
+            # The caller stopped reading early
+            raise
+        except BaseException as e:
+            if metrics is not None:
+                metrics.error = type(e).__name__
+            raise
+        finally:
+            if response is not None:
+                await response.aclose()
+                self.transfers.record(endpoint, response.num_bytes_downloaded, None,
+                                      response.headers.get("Content-Encoding"), len(response.request.content))
+                if self._transfer_slots is not None:
+                    self._transfer_slots.release(priority)
+            if metrics is not None:
+                metrics.response_bytes = response.num_bytes_downloaded if response is not None else 0
+                metrics.wire_bytes = metrics.response_bytes
+                metrics.duration = time.perf_counter() - start
+                self._report(metrics)
+
+    async def post(self, endpoint: str, params: Dict = None, data: Dict = None,
+                   priority: int = PRIORITY_NORMAL) -> ApiResult:
+        """
+        Make an HTTP POST request. Cached results for the same callsign are dropped.
+        """
+        if self.validator is not None:
+            self.validator.check(endpoint, params)
+        if endpoint in READ_ONLY_POST_ENDPOINTS:
+            return await self._do(http_method='POST', endpoint=endpoint, ep_params=params, data=data,
+                                  priority=priority)
+        try:
+            return await self._do(http_method='POST', endpoint=endpoint, ep_params=params, data=data,
+                                  priority=priority)
+        finally:
+            self._invalidate(params)
 
     # Could also do PUT and DELETE, but the CMS API doesn't support those HTTP verbs
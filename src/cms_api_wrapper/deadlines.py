@@ -0,0 +1,80 @@
+import functools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Monotonic time by which the current call has to finish, None for no deadline
+_deadline: ContextVar[Optional[float]] = ContextVar("cms_api_deadline", default=None)
+
+
+def remaining() -> Optional[float]:
+    """
+    Seconds left before the current deadline, or None if there is none
+    """
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[Optional[float]]:
+    """
+    Sets a deadline for the calls made in the block. A deadline set further out keeps the nearer
+    one, so a multi-step call never gets more time than its caller allowed.
+    :return: The seconds left before the deadline now in effect
+    """
+    current = _deadline.get()
+    if seconds is not None:
+        deadline = time.monotonic() + seconds
+        if current is None or deadline < current:
+            current = deadline
+    token = _deadline.set(current)
+    try:
+        yield remaining()
+    finally:
+        _deadline.reset(token)
+
+
+def clear_deadline():
+    """
+    Removes the deadline from the current context, for work shared by several callers
+    (such as a coalesced request) that must not be bound by the deadline of the first one
+    """
+    _deadline.set(None)
+
+
+async def run_with_deadline(call: Awaitable[T], seconds: Optional[float]) -> T:
+    """
+    Awaits call, cancelling it and raising cms_api_adapter.DeadlineExceeded once the deadline passes
+    """
+    import asyncio
+
+    from src.cms_api_wrapper.cms_api_adapter import DeadlineExceeded
+    with deadline_scope(seconds) as budget:
+        if budget is None:
+            return await call
+        if budget <= 0:
+            if asyncio.iscoroutine(call):
+                call.close()
+            raise DeadlineExceeded("Deadline exceeded before the call was made")
+        try:
+            return await asyncio.wait_for(call, budget)
+        except asyncio.TimeoutError as e:
+            raise DeadlineExceeded(f"Deadline of {seconds}s exceeded") from e
+
+
+def with_deadline(method: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+    """
+    Gives a coroutine method a 'deadline' keyword argument: the seconds the whole call, including
+    all of its requests and retries, may take. Every request made within it is sent with no more
+    than the time left, and whatever is still in flight when the time runs out is cancelled.
+    Without a deadline the method is called as it is.
+    """
+    @functools.wraps(method)
+    async def wrapper(*args, deadline: float = None, **kwargs) -> T:
+        if deadline is None:
+            return await method(*args, **kwargs)
+        return await run_with_deadline(method(*args, **kwargs), deadline)
+    return wrapper
@@ -0,0 +1,42 @@
+import json
+from typing import Any, Callable, Tuple, Type
+
+# A decoder turns a raw response body into Python objects
+Decoder = Callable[[bytes], Any]
+
+
+def _orjson_decoder() -> Tuple[Decoder, Tuple[Type[Exception], ...]]:
+    import orjson
+    return orjson.loads, (orjson.JSONDecodeError,)
+
+
+def _msgspec_decoder() -> Tuple[Decoder, Tuple[Type[Exception], ...]]:
+    import msgspec
+    return msgspec.json.Decoder().decode, (msgspec.DecodeError,)
+
+
+def _json_decoder() -> Tuple[Decoder, Tuple[Type[Exception], ...]]:
+    return json.loads, (ValueError,)
+
+
+_DECODERS = {
+    "orjson": _orjson_decoder,
+    "msgspec": _msgspec_decoder,
+    "json": _json_decoder,
+}
+
+
+def get_decoder(name: str = None) -> Tuple[Decoder, Tuple[Type[Exception], ...]]:
+    """
+    Returns a JSON decoder that works directly on bytes, and the exceptions it raises for bad input.
+    Without a name the fastest installed one is used: orjson, then msgspec, then the standard library.
+    :param name: (optional) 'orjson', 'msgspec' or 'json'
+    """
+    if name is not None:
+        return _DECODERS[name]()
+    for factory in _DECODERS.values():
+        try:
+            return factory()
+        except ImportError:
+            continue
+    return _json_decoder()
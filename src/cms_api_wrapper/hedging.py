@@ -0,0 +1,68 @@
+from collections import deque
+from typing import Deque, Dict, Optional
+
+
+class HedgingPolicy:
+    """
+    Decides when a read-only GET request gets a second copy ("hedge"). Once a request has
+    taken longer than the given percentile of recent latencies for its endpoint, the same
+    request is sent again and whichever answers first is used; the other is cancelled.
+    Hedges are capped at max_ratio of all requests, so a slow server isn't sent twice the load.
+    Pass one to CmsApiAdapter as hedging.
+    """
+
+    def __init__(self, percentile: float = 95.0, min_samples: int = 20, window: int = 200,
+                 max_ratio: float = 0.1, min_delay: float = 0.005):
+        """
+        :param percentile: Latency percentile (0-100) after which the hedge is sent
+        :param min_samples: Requests to an endpoint that are measured before its requests are hedged
+        :param window: Number of recent latencies kept per endpoint
+        :param max_ratio: Largest share of requests that may be hedged
+        :param min_delay: Seconds to wait at least before hedging
+        """
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.window = window
+        self.max_ratio = max_ratio
+        self.min_delay = min_delay
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._thresholds: Dict[str, float] = {}
+        self._since_update: Dict[str, int] = {}
+        self.requests = 0
+        self.hedged = 0
+        # Hedges that answered before the original request
+        self.hedge_wins = 0
+
+    def delay(self, endpoint: str) -> Optional[float]:
+        """
+        Seconds after which a request to endpoint should be hedged, or None to not hedge it.
+        Counts the request.
+        """
+        self.requests += 1
+        threshold = self._thresholds.get(endpoint)
+        if threshold is None or self.hedged >= self.max_ratio * self.requests:
+            return None
+        return max(threshold, self.min_delay)
+
+    def record(self, endpoint: str, seconds: float):
+        """
+        Adds the latency of a request that completed
+        """
+        latencies = self._latencies.get(endpoint)
+        if latencies is None:
+            latencies = self._latencies[endpoint] = deque(maxlen=self.window)
+        latencies.append(seconds)
+        # Sorting the window on every request would cost more than it is worth
+        since_update = self._since_update.get(endpoint, 0) + 1
+        if len(latencies) >= self.min_samples and (since_update >= 10 or endpoint not in self._thresholds):
+            ordered = sorted(latencies)
+            self._thresholds[endpoint] = ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))]
+            since_update = 0
+        self._since_update[endpoint] = since_update
+
+    def threshold(self, endpoint: str) -> Optional[float]:
+        return self._thresholds.get(endpoint)
+
+    def stats(self) -> Dict[str, float]:
+        return {"requests": self.requests, "hedged": self.hedged, "hedge_wins": self.hedge_wins,
+                "thresholds_ms": {endpoint: threshold * 1000 for endpoint, threshold in self._thresholds.items()}}
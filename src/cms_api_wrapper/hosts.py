@@ -0,0 +1,116 @@
+import time
+from typing import Callable, Collection, Dict, List, Optional
+
+from src.cms_api_wrapper.resilience import CircuitBreaker
+
+
+class HostHealth:
+    """
+    Rolling latency and error rate of one CMS API host, as exponentially weighted moving averages
+    """
+    __slots__ = ("host", "breaker", "latency", "error_rate", "requests", "failures", "last_used")
+
+    def __init__(self, host: str, breaker: CircuitBreaker):
+        self.host = host
+        self.breaker = breaker
+        # Seconds until the response headers arrived, None until a request has succeeded
+        self.latency: Optional[float] = None
+        # Share of recent requests that failed, 0 to 1
+        self.error_rate = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.last_used = None
+
+    def score(self, error_penalty: float) -> float:
+        """
+        Lower is better. A host that has not answered yet scores 0 so that it gets measured,
+        unless it has only failed so far.
+        """
+        if self.latency is None:
+            return float("inf") if self.failures else 0.0
+        return self.latency * (1 + error_penalty * self.error_rate)
+
+
+class HostSelector:
+    """
+    Picks the CMS API host for each request. Each host has a circuit breaker and a rolling latency
+    and error rate; requests go to the closed host with the best score. A host whose circuit is
+    half-open gets the next request as a probe, so it is used again as soon as it recovers, and a
+    host that hasn't been used for probe_interval seconds gets one request to refresh its latency.
+    """
+
+    def __init__(self, hosts: List[str], breaker_for: Callable[[str], CircuitBreaker], alpha: float = 0.3,
+                 error_penalty: float = 4.0, probe_interval: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        :param hosts: Host names, in order of preference when they score the same
+        :param breaker_for: Returns the circuit breaker of a host
+        :param alpha: Weight of the newest sample in the moving averages
+        :param error_penalty: How much the error rate inflates a host's latency score
+        :param probe_interval: Seconds after which an unused host is sent a request to measure it again
+        :param clock: Time source, in seconds
+        """
+        if not hosts:
+            raise ValueError("at least one host is required")
+        self.hosts: Dict[str, HostHealth] = {host: HostHealth(host, breaker_for(host)) for host in hosts}
+        self.alpha = alpha
+        self.error_penalty = error_penalty
+        self.probe_interval = probe_interval
+        self._clock = clock
+
+    def __len__(self):
+        return len(self.hosts)
+
+    def choose(self, avoid: Collection[str] = ()) -> Optional[HostHealth]:
+        """
+        Returns the host to send the next request to, or None if every circuit is open
+        :param avoid: Hosts that already failed this request; they are used only if nothing else is available
+        """
+        now = self._clock()
+        preferred = [health for host, health in self.hosts.items() if host not in avoid]
+        chosen = self._choose_from(preferred, now)
+        if chosen is None and len(preferred) < len(self.hosts):
+            chosen = self._choose_from([health for host, health in self.hosts.items() if host in avoid], now)
+        return chosen
+
+    def _choose_from(self, candidates: List[HostHealth], now: float) -> Optional[HostHealth]:
+        best = None
+        for health in candidates:
+            state = health.breaker.state
+            if state == CircuitBreaker.HALF_OPEN:
+                if health.breaker.allow_request():
+                    return self._use(health, now)
+                continue
+            if state != CircuitBreaker.CLOSED:
+                continue
+            if health.last_used is not None and now - health.last_used >= self.probe_interval:
+                return self._use(health, now)
+            if best is None or health.score(self.error_penalty) < best.score(self.error_penalty):
+                best = health
+        return self._use(best, now) if best is not None else None
+
+    def _use(self, health: HostHealth, now: float) -> HostHealth:
+        health.last_used = now
+        return health
+
+    def record_success(self, health: HostHealth, latency: float):
+        health.breaker.record_success()
+        health.requests += 1
+        health.latency = latency if health.latency is None else \
+            self.alpha * latency + (1 - self.alpha) * health.latency
+        health.error_rate = (1 - self.alpha) * health.error_rate
+
+    def record_failure(self, health: HostHealth):
+        health.breaker.record_failure()
+        health.requests += 1
+        health.failures += 1
+        health.error_rate = self.alpha + (1 - self.alpha) * health.error_rate
+
+    def stats(self) -> Dict[str, Dict]:
+        """
+        Returns the state, latency (ms) and error rate of every host
+        """
+        return {host: {"state": health.breaker.state, "requests": health.requests, "failures": health.failures,
+                       "latency_ms": None if health.latency is None else health.latency * 1000,
+                       "error_rate": health.error_rate}
+                for host, health in self.hosts.items()}
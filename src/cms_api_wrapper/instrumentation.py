@@ -0,0 +1,235 @@
+import time
+from bisect import bisect_left
+from typing import Dict, Optional
+
+from src.cms_api_wrapper.cache import EXCLUDED_PARAMS, SECRET_PARAMS
+
+REDACTED = "***"
+
+# Request phases, in the order they happen
+PHASES = ("connect", "tls", "send", "server", "download", "decode")
+
+# httpcore trace event names (without the 'http11.'/'http2.'/'connection.' prefix) per phase
+_TRACE_PHASES = {
+    "connect_tcp": "connect",
+    "start_tls": "tls",
+    "send_request_headers": "send",
+    "send_request_body": "send",
+    "receive_response_headers": "server",
+    "receive_response_body": "download",
+}
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, float("inf"))
+
+
+def redact_params(params: Dict) -> Dict:
+    """
+    Returns a copy of the request parameters with the API key and passwords masked
+    """
+    if not params:
+        return {}
+    return {name: REDACTED if name.lower() in SECRET_PARAMS or name.lower() == "key" else value
+            for name, value in params.items()}
+
+
+class RequestMetrics:
+    """
+    Measurements for one CmsApiAdapter request, passed to Instrumentation.on_request()
+    """
+    __slots__ = ("method", "endpoint", "host", "params", "started_at", "duration", "phases", "status_code",
+                 "attempts", "cache_hit", "response_bytes", "wire_bytes", "error")
+
+    def __init__(self, method: str, endpoint: str, host: str, params: Dict):
+        self.method = method
+        self.endpoint = endpoint
+        self.host = host
+        # Redacted copy, without the parameters the adapter adds itself
+        self.params = {name: value for name, value in redact_params(params).items()
+                       if name.lower() not in EXCLUDED_PARAMS}
+        # Wall clock start time in nanoseconds, and total duration in seconds
+        self.started_at = time.time_ns()
+        self.duration = 0.0
+        # Seconds spent in each of PHASES (for the last attempt)
+        self.phases: Dict[str, float] = {}
+        self.status_code: Optional[int] = None
+        self.attempts = 0
+        self.cache_hit = False
+        # Response body size after and before decompression
+        self.response_bytes = 0
+        self.wire_bytes = 0
+        self.error: Optional[str] = None
+
+    @property
+    def retries(self) -> int:
+        return max(0, self.attempts - 1)
+
+
+class PhaseTracer:
+    """
+    Collects phase timings from httpcore trace events. Passed to httpx as the 'trace' extension.
+    """
+    __slots__ = ("phases", "_started")
+
+    def __init__(self, phases: Dict[str, float]):
+        self.phases = phases
+        self._started: Dict[str, float] = {}
+
+    async def __call__(self, event_name: str, info: Dict):
+        name, _, state = event_name.rpartition(".")
+        phase = _TRACE_PHASES.get(name.rpartition(".")[2])
+        if phase is None:
+            return
+        if state == "started":
+            self._started[phase] = time.perf_counter()
+        elif phase in self._started:
+            self.phases[phase] = self.phases.get(phase, 0.0) + time.perf_counter() - self._started.pop(phase)
+
+
+class Instrumentation:
+    """
+    Receives measurements from CmsApiAdapter. Subclass it and override the hooks you need.
+    """
+
+    def on_request(self, metrics: RequestMetrics):
+        """
+        Called once per request after it completes or fails, and for results served from the cache
+        """
+        pass
+
+    def on_event(self, name: str, fields: Dict):
+        """
+        Called for retries, circuit breaker state changes and other adapter events
+        """
+        pass
+
+
+class LatencyHistogram:
+    """
+    Counts durations in fixed LATENCY_BUCKETS_MS buckets
+    """
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS_MS)
+        self.total = 0.0
+        self.count = 0
+
+    def add(self, seconds: float):
+        self.counts[bisect_left(LATENCY_BUCKETS_MS, seconds * 1000)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def percentile(self, p: float) -> float:
+        """
+        Returns the upper bound (in milliseconds) of the bucket holding the p-th percentile
+        """
+        rank = p / 100 * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.counts):
+            seen += count
+            if count and seen >= rank:
+                return bound
+        return 0.0
+
+    def to_dict(self) -> Dict:
+        return {"count": self.count, "mean_ms": 1000 * self.total / self.count if self.count else 0.0,
+                "p50_ms": self.percentile(50), "p95_ms": self.percentile(95), "p99_ms": self.percentile(99),
+                "buckets": {f"le_{bound}ms": count for bound, count in zip(LATENCY_BUCKETS_MS, self.counts)
+                            if count}}
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.phases = {phase: LatencyHistogram() for phase in PHASES}
+        self.status_codes: Dict[int, int] = {}
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.cache_hits = 0
+        self.response_bytes = 0
+        self.wire_bytes = 0
+
+
+class MetricsAggregator(Instrumentation):
+    """
+    Aggregates request metrics per endpoint in process, for dumping latency histograms
+    """
+
+    def __init__(self):
+        self.endpoints: Dict[str, EndpointStats] = {}
+        self.events: Dict[str, int] = {}
+
+    def on_request(self, metrics: RequestMetrics):
+        stats = self.endpoints.get(metrics.endpoint)
+        if stats is None:
+            stats = self.endpoints[metrics.endpoint] = EndpointStats()
+        stats.requests += 1
+        if metrics.cache_hit:
+            stats.cache_hits += 1
+            return
+        stats.latency.add(metrics.duration)
+        for phase, seconds in metrics.phases.items():
+            stats.phases[phase].add(seconds)
+        if metrics.status_code is not None:
+            stats.status_codes[metrics.status_code] = stats.status_codes.get(metrics.status_code, 0) + 1
+        if metrics.error is not None:
+            stats.errors += 1
+        stats.retries += metrics.retries
+        stats.response_bytes += metrics.response_bytes
+        stats.wire_bytes += metrics.wire_bytes
+
+    def on_event(self, name: str, fields: Dict):
+        self.events[name] = self.events.get(name, 0) + 1
+
+    def dump(self) -> Dict:
+        """
+        Returns the aggregated metrics as a dictionary keyed by endpoint
+        """
+        return {endpoint: {"requests": stats.requests, "errors": stats.errors, "retries": stats.retries,
+                           "cache_hits": stats.cache_hits, "response_bytes": stats.response_bytes,
+                           "wire_bytes": stats.wire_bytes, "status_codes": dict(stats.status_codes),
+                           "latency": stats.latency.to_dict(),
+                           "phases": {phase: histogram.to_dict() for phase, histogram in stats.phases.items()
+                                      if histogram.count}}
+                for endpoint, stats in self.endpoints.items()}
+
+    def format(self) -> str:
+        """
+        Returns a per-endpoint latency summary as text
+        """
+        lines = [f"{'endpoint':40} {'reqs':>7} {'hits':>6} {'errs':>5} {'p50':>7} {'p95':>7} {'p99':>7}"]
+        for endpoint, stats in sorted(self.endpoints.items()):
+            lines.append(f"{endpoint:40} {stats.requests:7d} {stats.cache_hits:6d} {stats.errors:5d} "
+                         f"{stats.latency.percentile(50):6g}ms {stats.latency.percentile(95):6g}ms "
+                         f"{stats.latency.percentile(99):6g}ms")
+        return "\n".join(lines)
+
+
+class SpanInstrumentation(Instrumentation):
+    """
+    Records each request as a span on an OpenTelemetry-style tracer, for example
+    SpanInstrumentation(opentelemetry.trace.get_tracer(__name__)). Any object whose
+    start_span(name, start_time=ns) returns a span with set_attribute() and end(end_time=ns) works.
+    """
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+
+    def on_request(self, metrics: RequestMetrics):
+        span = self.tracer.start_span(f"CMS {metrics.method} {metrics.endpoint}", start_time=metrics.started_at)
+        attributes = {"http.request.method": metrics.method, "server.address": metrics.host,
+                      "cms.endpoint": metrics.endpoint, "cms.attempts": metrics.attempts,
+                      "cms.cache_hit": metrics.cache_hit, "cms.response_bytes": metrics.response_bytes,
+                      "cms.wire_bytes": metrics.wire_bytes}
+        if metrics.status_code is not None:
+            attributes["http.response.status_code"] = metrics.status_code
+        if metrics.error is not None:
+            attributes["error.type"] = metrics.error
+        for phase, seconds in metrics.phases.items():
+            attributes[f"cms.phase.{phase}_ms"] = seconds * 1000
+        for name, value in metrics.params.items():
+            attributes[f"cms.param.{name}"] = str(value)
+        for name, value in attributes.items():
+            span.set_attribute(name, value)
+        span.end(end_time=metrics.started_at + int(metrics.duration * 1e9))
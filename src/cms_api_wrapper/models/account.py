@@ -1,94 +1,172 @@
-from src.cms_api_wrapper.cms_api_adapter import *
-from src.cms_api_wrapper.models.constants import *
+import logging
+from typing import Dict, Iterable, Union
+
+from src.cms_api_wrapper.batch import DEFAULT_CONCURRENCY, gather_calls, normalize_callsign, run_many
+from src.cms_api_wrapper.cms_api_adapter import ApiResult, CmsApiAdapter, WebServiceResponse, lazy_field
+from src.cms_api_wrapper.deadlines import with_deadline
+from src.cms_api_wrapper.models.constants import CMS_API_HOSTNAME
+from src.cms_api_wrapper.negative_cache import NegativeLookupCache
+from src.cms_api_wrapper.ratelimit import PRIORITY_INTERACTIVE
+from src.cms_api_wrapper.write_queue import WriteQueue
 
 
 class AccountExistsResponse(WebServiceResponse):
+    __slots__ = ("_exists",)
+
     def __init__(self, result: ApiResult):
         """
         Deconstructs the response to expose the 'CallsignExists' api result.
         :param result: The result of the API request
         """
         super().__init__(result)
-        self.exists: bool = result.data["CallsignExists"]
+
+    @lazy_field
+    def exists(self) -> bool:
+        return self._result.data["CallsignExists"]
 
 
 class ValidatePasswordResponse(WebServiceResponse):
+    __slots__ = ("_is_valid",)
+
     def __init__(self, result: ApiResult):
         """
         Deconstructs the response to expose the 'IsValid' api result.
         :param result: The result of the API request
         """
         super().__init__(result)
-        self.is_valid: bool = result.data["IsValid"]
+
+    @lazy_field
+    def is_valid(self) -> bool:
+        return self._result.data["IsValid"]
 
 
 class ForwardingAddressResponse(WebServiceResponse):
+    __slots__ = ("_forwarding_address",)
+
     def __init__(self, result: ApiResult):
         """
         Deconstructs the response to expose the 'AlternateEmailGet' api result.
         :param result: The result of the API request
         """
         super().__init__(result)
-        self.forwarding_address: str = result.data["AlternateEmail"]
+
+    @lazy_field
+    def forwarding_address(self) -> str:
         # Strip leading 'SMTP:' if it exists
-        self.forwarding_address = self.forwarding_address.replace('SMTP:', '')
+        return self._result.data["AlternateEmail"].replace('SMTP:', '')
 
 
 class PasswordRecoveryResponse(WebServiceResponse):
+    __slots__ = ("_recovery_address",)
+
     def __init__(self, result: ApiResult):
         """
         Deconstructs the response to expose the 'PasswordRecoveryEmailGet' api result.
         :param result: The result of the API request
         """
         super().__init__(result)
-        self.recovery_address: str = result.data["RecoveryEmail"]
+
+    @lazy_field
+    def recovery_address(self) -> str:
+        return self._result.data["RecoveryEmail"]
 
 
 class MaxMessageSizeResponse(WebServiceResponse):
+    __slots__ = ("_max_message_size",)
+
     def __init__(self, result: ApiResult):
         """
         Deconstructs the response to expose the 'MaxMessageSize' api result.
         :param result: The result of the API request
         """
         super().__init__(result)
-        self.max_message_size: str = result.data["MaxMessageSize"]
+
+    @lazy_field
+    def max_message_size(self) -> str:
+        return self._result.data["MaxMessageSize"]
 
 
 class LockedOutResponse(WebServiceResponse):
+    __slots__ = ("_is_locked_out", "lockout_reason")
+
     def __init__(self, result: ApiResult):
         """
         Deconstructs the response to expose the 'LockedOut' api result.
         :param result: The result of the API request
         """
         super().__init__(result)
-        self.is_locked_out: bool = result.data["LockedOut"]
         self.lockout_reason = ""
 
+    @lazy_field
+    def is_locked_out(self) -> bool:
+        return self._result.data["LockedOut"]
+
 
 class Account:
     """
     Provides methods and classes relating to a callsign (and sometimes a tactical) account
     """
-    def __init__(self, api_key: str, hostname: str = CMS_API_HOSTNAME, logger: logging.Logger = None):
-        self.cms_api = CmsApiAdapter(api_key, hostname, logger)
+    def __init__(self, api_key: str = None, hostname: str = CMS_API_HOSTNAME, logger: logging.Logger = None,
+                 cms_api: CmsApiAdapter = None, write_queue: WriteQueue = None,
+                 negative_cache: NegativeLookupCache = None):
+        """
+        :param api_key: Web service access key (not needed when cms_api is supplied)
+        :param hostname: Normally, api.winlink.org
+        :param logger: (optional)
+        :param cms_api: (optional) Shared adapter, so several classes can use one connection pool
+        :param write_queue: (optional) Journals address and message size changes while the CMS can't be reached
+        :param negative_cache: (optional) Answers account_exists() for callsigns recently found not to exist,
+            e.g. NegativeLookupSet() or CountingBloomFilter()
+        """
+        self.cms_api = cms_api or CmsApiAdapter(api_key, hostname, logger)
+        self.write_queue = write_queue
+        self.negative_cache = negative_cache
 
+    @with_deadline
     async def account_exists(self, callsign: str) -> AccountExistsResponse:
         """
         Returns a true response if the account exists and is not blocked, False otherwise.
         """
+        generation = None
+        if self.negative_cache is not None:
+            if self.negative_cache.contains(callsign):
+                return AccountExistsResponse(ApiResult(data={"CallsignExists": False}))
+            generation = self.negative_cache.generation(callsign)
         params = {"Callsign": callsign}
         result = await self.cms_api.get("account/exists/", params)
-        return AccountExistsResponse(result)
+        response = AccountExistsResponse(result)
+        if self.negative_cache is not None and not response.exists:
+            # Skipped if add_callsign_account() ran for the callsign during the request
+            self.negative_cache.add(callsign, generation)
+        return response
 
+    @with_deadline
+    async def account_exists_many(self, callsigns: Iterable[str], concurrency: int = DEFAULT_CONCURRENCY
+                                  ) -> Dict[str, Union[AccountExistsResponse, Exception]]:
+        """
+        Checks many callsigns at once, with at most 'concurrency' requests in flight.
+        Duplicate callsigns are checked once. A failed lookup is returned as the exception
+        for that callsign instead of aborting the batch.
+        :return: Dictionary keyed by upper-case callsign
+        """
+        return await run_many(map(normalize_callsign, callsigns), self.account_exists, concurrency)
+
+    @with_deadline
     async def add_callsign_account(self, callsign: str, password: str, email_address: str = "") -> WebServiceResponse:
         """
         Adds a new account for the provided callsign.
         Optionally, sets the email address used for password recovery.
         """
         params = {"Callsign": callsign, "Password": password, "RecoveryEmail": email_address}
-        result = await self.cms_api.post("account/add/", params)
+        try:
+            result = await self.cms_api.post("account/add/", params)
+        finally:
+            # Even a failed request may have added the account
+            if self.negative_cache is not None:
+                self.negative_cache.discard(callsign)
         return WebServiceResponse(result)
 
+    @with_deadline
     async def change_account_password(self, callsign: str, old_password: str, new_password: str) -> WebServiceResponse:
         """
         Changes the account password if the old password is verified.
@@ -97,22 +175,27 @@ class Account:
         result = await self.cms_api.post("account/password/change/", params)
         return WebServiceResponse(result)
 
+    @with_deadline
     async def validate_password(self, callsign: str, password: str):
         """
-        Verifies that the password is valid for this account
+        Verifies that the password is valid for this account. Sent ahead of other queued
+        requests when rate limited, since a user is usually waiting on it.
         """
         params = {"Callsign": callsign, "Password": password}
-        result = await self.cms_api.post("account/password/validate/", params)
+        result = await self.cms_api.post("account/password/validate/", params, priority=PRIORITY_INTERACTIVE)
         return ValidatePasswordResponse(result)
 
+    @with_deadline
     async def get_forwarding_email_address(self, callsign: str, password: str):
         """
         Gets the alternate(forwarding) address for the callsign account.
+        The CMS only accepts this request as a GET, so the password is sent in the query string.
         """
         params = {"Callsign": callsign, "Password": password}
         result = await self.cms_api.get("account/alternateEmail/get", params)
         return ForwardingAddressResponse(result)
 
+    @with_deadline
     async def set_forwarding_email_address(self, callsign: str, password: str,
                                            email_address: str) -> WebServiceResponse:
         """
@@ -120,9 +203,9 @@ class Account:
         must be a standard internet address (no winlink addresses).
         """
         params = {"Callsign": callsign, "Password": password, "AlternateEmail": email_address}
-        result = await self.cms_api.post("account/alternateEmail/set", params)
-        return WebServiceResponse(result)
+        return await self._write("account/alternateEmail/set", params)
 
+    @with_deadline
     async def send_password(self, callsign: str):
         """
         Requests that the account password be sent to the password recovery email address on record.
@@ -131,15 +214,18 @@ class Account:
         result = await self.cms_api.post("account/password/send", params)
         return WebServiceResponse(result)
 
+    @with_deadline
     async def get_password_recovery_email_address(self, callsign: str,
                                                   password: str) -> PasswordRecoveryResponse:
         """
         Gets the password recovery address for the callsign account.
+        The CMS only accepts this request as a GET, so the password is sent in the query string.
         """
         params = {"Callsign": callsign, "Password": password}
         result = await self.cms_api.get("account/password/recovery/email/get", params)
         return PasswordRecoveryResponse(result)
 
+    @with_deadline
     async def set_password_recovery_email_address(self, callsign: str, password: str,
                                                   email_address: str) -> WebServiceResponse:
         """
@@ -147,15 +233,33 @@ class Account:
         must be a standard internet address (no winlink addresses).
         """
         params = {"Callsign": callsign, "Password": password, "RecoveryEmail": email_address}
-        result = await self.cms_api.post("account/password/recovery/email/set", params)
-        return WebServiceResponse(result)
+        return await self._write("account/password/recovery/email/set", params)
 
-    async def get_locked_out(self, callsign: str) -> LockedOutResponse:
+    @with_deadline
+    async def get_locked_out(self, callsign: str, concurrent: bool = False) -> LockedOutResponse:
         """
         Gets the locked out status for the callsign account. If the account is locked out
         the response will contain the reason for the lockout (if any was recorded).
+        :param concurrent: Request the status and the reason at the same time. This saves a round
+            trip for locked accounts, at the cost of an extra request for accounts that are not.
         """
         params = {"Callsign": callsign}
+        if concurrent:
+            results = await gather_calls({
+                "locked_out": self.cms_api.get("account/lockedOut/get", params),
+                "reason": self.cms_api.get("account/lockedOutReason/get", {"Callsign": callsign}),
+            })
+            # A cancelled call's CancelledError is a BaseException, not an Exception
+            if isinstance(results["locked_out"], BaseException):
+                raise results["locked_out"]
+            locked_out_response = LockedOutResponse(results["locked_out"])
+            if locked_out_response.is_locked_out:
+                if isinstance(results["reason"], BaseException):
+                    raise results["reason"]
+                if results["reason"].data:
+                    locked_out_response.lockout_reason = results["reason"].data["Reason"]
+            return locked_out_response
+
         result = await self.cms_api.get("account/lockedOut/get", params)
         locked_out_response = LockedOutResponse(result)
         if locked_out_response.is_locked_out:
@@ -165,6 +269,20 @@ class Account:
                 locked_out_response.lockout_reason = result.data["Reason"]
         return locked_out_response
 
+    @with_deadline
+    async def get_locked_out_many(self, callsigns: Iterable[str], concurrency: int = DEFAULT_CONCURRENCY,
+                                  concurrent: bool = False) -> Dict[str, Union[LockedOutResponse, Exception]]:
+        """
+        Gets the locked out status for many callsigns at once, with at most 'concurrency'
+        callsigns being checked at a time. Duplicate callsigns are checked once. A failed
+        lookup is returned as the exception for that callsign instead of aborting the batch.
+        :param concurrent: See get_locked_out()
+        :return: Dictionary keyed by upper-case callsign
+        """
+        return await run_many(map(normalize_callsign, callsigns),
+                              lambda callsign: self.get_locked_out(callsign, concurrent), concurrency)
+
+    @with_deadline
     async def get_max_message_size(self, callsign: str):
         """
         Gets the message size limit stored for this account
@@ -173,10 +291,53 @@ class Account:
         result = await self.cms_api.get("account/maxMessageSize/get", params)
         return MaxMessageSizeResponse(result)
 
+    @with_deadline
     async def set_max_message_size(self, callsign: str, max_size: int):
         """
         Sets the message size limit for this account (max is 120K)
         """
         params = {"Callsign": callsign, "MaxMessageSize": max_size}
-        result = await self.cms_api.get("account/maxMessageSize/set", params)
-        return WebServiceResponse(result)
+        return await self._write("account/maxMessageSize/set", params)
+
+    @with_deadline
+    async def set_settings(self, callsign: str, password: str, forwarding_address: str = None,
+                           recovery_address: str = None, max_message_size: int = None) -> Dict[str, WebServiceResponse]:
+        """
+        Sets any of the forwarding address, the password recovery address and the message size
+        limit of one account. Settings left as None are not changed.
+        :return: The response for each setting changed, keyed by the argument name
+        """
+        responses = {}
+        if forwarding_address is not None:
+            responses["forwarding_address"] = await self.set_forwarding_email_address(callsign, password,
+                                                                                      forwarding_address)
+        if recovery_address is not None:
+            responses["recovery_address"] = await self.set_password_recovery_email_address(callsign, password,
+                                                                                           recovery_address)
+        if max_message_size is not None:
+            responses["max_message_size"] = await self.set_max_message_size(callsign, max_message_size)
+        return responses
+
+    @with_deadline
+    async def set_settings_many(self, records: Iterable[Dict], concurrency: int = DEFAULT_CONCURRENCY
+                                ) -> Dict[str, Union[Dict[str, WebServiceResponse], Exception]]:
+        """
+        Bulk update: applies set_settings() to many accounts, with at most 'concurrency' accounts
+        being updated at a time over the adapter's pooled keep-alive connections. With an adapter
+        created with http2=True the requests are multiplexed over a single connection.
+        A failed update is returned as the exception for that callsign instead of aborting the batch.
+        :param records: Keyword arguments for set_settings(), one dictionary per account. If a callsign
+            appears more than once, its last record is used.
+        :return: Dictionary keyed by upper-case callsign
+        """
+        by_callsign = {normalize_callsign(record["callsign"]): record for record in records}
+        return await run_many(by_callsign, lambda callsign: self.set_settings(**by_callsign[callsign]), concurrency)
+
+    async def _write(self, endpoint: str, params: Dict) -> WebServiceResponse:
+        """
+        Sends a setting change, through the write queue if there is one. With a write queue the
+        response is a QueuedResponse if the change was journaled for later delivery.
+        """
+        if self.write_queue is not None:
+            return await self.write_queue.submit('POST', endpoint, params)
+        return WebServiceResponse(await self.cms_api.post(endpoint, params))
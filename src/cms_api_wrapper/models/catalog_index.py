@@ -0,0 +1,126 @@
+import re
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from typing import Dict, List, Optional, Sequence
+
+_WORD = re.compile(r"\w+")
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+class _SizeIndex:
+    """
+    Records ordered by size estimate, with running totals for range sums
+    """
+
+    def __init__(self, records: List):
+        self.records = sorted(records, key=lambda rec: rec.size_estimate)
+        self.sizes = [rec.size_estimate for rec in self.records]
+        self.totals = [0, *accumulate(self.sizes)]
+
+    def at_most(self, max_size: int) -> int:
+        """
+        Returns the number of records no larger than max_size
+        """
+        return bisect_right(self.sizes, max_size)
+
+
+class CatalogIndex:
+    """
+    Lookup structures over an inquiry catalog, built once per catalog fetch. Lookups by
+    id and category are O(1); subject prefix, keyword and size queries use binary search.
+    Results are lists of InquiryRecord.
+    """
+
+    def __init__(self, inquiries: Sequence):
+        """
+        :param inquiries: The catalog entries (InquiryRecord)
+        """
+        self._by_id = {rec.inquiry_id: rec for rec in inquiries}
+        grouped: Dict[str, List] = {}
+        for rec in inquiries:
+            grouped.setdefault(rec.category, []).append(rec)
+        self._by_category = {category: _SizeIndex(records) for category, records in grouped.items()}
+        self._all = _SizeIndex(list(inquiries))
+
+        # Subject prefix search: lower-case subjects in sorted order
+        self._subjects = sorted((rec.subject.lower(), i) for i, rec in enumerate(inquiries))
+        self._subject_keys = [subject for subject, _ in self._subjects]
+
+        # Keyword search: word -> positions of the records whose subject contains it
+        postings: Dict[str, set] = {}
+        for i, rec in enumerate(inquiries):
+            for word in _words(rec.subject):
+                postings.setdefault(word, set()).add(i)
+        self._postings = postings
+        self._vocabulary = sorted(postings)
+        self._records = list(inquiries)
+
+    def __len__(self):
+        return len(self._records)
+
+    def get(self, inquiry_id: str):
+        """
+        Returns the record with this id, or None
+        """
+        return self._by_id.get(inquiry_id)
+
+    @property
+    def categories(self) -> List[str]:
+        return sorted(self._by_category)
+
+    def in_category(self, category: str, max_size: int = None) -> List:
+        """
+        Returns the records of the category, smallest first, optionally only those of at most max_size
+        """
+        index = self._by_category.get(category)
+        if index is None:
+            return []
+        return index.records[:len(index.records) if max_size is None else index.at_most(max_size)]
+
+    def total_size(self, category: str = None, max_size: int = None) -> int:
+        """
+        Returns the sum of the size estimates of the category (or the whole catalog),
+        optionally counting only records of at most max_size
+        """
+        index = self._all if category is None else self._by_category.get(category)
+        if index is None:
+            return 0
+        return index.totals[len(index.sizes) if max_size is None else index.at_most(max_size)]
+
+    def within_size(self, max_size: int) -> List:
+        """
+        Returns the records of the whole catalog of at most max_size, smallest first
+        """
+        return self._all.records[:self._all.at_most(max_size)]
+
+    def subject_prefix(self, prefix: str) -> List:
+        """
+        Returns the records whose subject starts with prefix (case-insensitive), in subject order
+        """
+        prefix = prefix.lower()
+        start = bisect_left(self._subject_keys, prefix)
+        end = bisect_left(self._subject_keys, prefix + "\uffff", start)
+        return [self._records[i] for _, i in self._subjects[start:end]]
+
+    def search(self, text: str) -> List:
+        """
+        Returns the records whose subject contains every word of text. The last word may be
+        incomplete and matches any word that starts with it, for search-as-you-type.
+        """
+        words = _words(text)
+        if not words:
+            return []
+        matches: Optional[set] = None
+        for word in words[:-1]:
+            postings = self._postings.get(word, set())
+            matches = postings if matches is None else matches & postings
+        last = set()
+        start = bisect_left(self._vocabulary, words[-1])
+        end = bisect_left(self._vocabulary, words[-1] + "\uffff", start)
+        for word in self._vocabulary[start:end]:
+            last |= self._postings[word]
+        matches = last if matches is None else matches & last
+        return [self._records[i] for i in sorted(matches)]
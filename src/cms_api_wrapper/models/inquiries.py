@@ -1,45 +1,162 @@
-from src.cms_api_wrapper.cms_api_adapter import *
-from src.cms_api_wrapper.models.constants import *
+import logging
+import time
+from typing import AsyncIterator, List, NamedTuple
 
+from src.cms_api_wrapper.catalog_store import CatalogStore, StoredCatalog, content_hash
+from src.cms_api_wrapper.cms_api_adapter import ApiResult, CmsApiAdapter, WebServiceResponse, lazy_field
+from src.cms_api_wrapper.deadlines import clear_deadline, with_deadline
+from src.cms_api_wrapper.models.catalog_index import CatalogIndex
+from src.cms_api_wrapper.models.constants import CMS_API_HOSTNAME
+from src.cms_api_wrapper.ratelimit import PRIORITY_BACKGROUND
+from src.cms_api_wrapper.streaming import JsonArrayScanner
 
-class InquiryRecord:
-    def __init__(self, category, inquiry_id, subject, size_estimate):
-        self.category: str = category
-        self.inquiry_id: str = inquiry_id
-        self.subject: str = subject
-        self.size_estimate: int = size_estimate
+CATALOG_ENDPOINT = "inquiries/catalog/"
+
+
+class InquiryRecord(NamedTuple):
+    """
+    An entry of the inquiry catalog (immutable)
+    """
+    category: str
+    inquiry_id: str
+    subject: str
+    size_estimate: int
 
 
 class InquiresCatalogGetResponse(WebServiceResponse):
-    def __init__(self, result: ApiResult):
+    __slots__ = ("_inquiries", "_index")
+
+    def __init__(self, result: ApiResult, keep_raw: bool = False):
         """
         Deconstructs the response to expose the 'catalog properties'.
         :param result: The result of the API request
+        :param keep_raw: Keep the decoded payload available as raw_data
         """
-        super().__init__(result)
+        super().__init__(result, keep_raw)
 
-        # TODO: Find better way to do this
-        self.inquiries = []
-        inquiry_list = result.data["Inquiries"]
-        for rec in inquiry_list:
-            self.inquiries.append(InquiryRecord(
-                rec["Category"],
-                rec["InquiryId"],
-                rec["Subject"],
-                rec["SizeEstimate"],
-            ))
+    @lazy_field
+    def inquiries(self) -> List[InquiryRecord]:
+        """
+        The catalog entries, built on first access
+        """
+        inquiries = [InquiryRecord(rec["Category"], rec["InquiryId"], rec["Subject"], rec["SizeEstimate"])
+                     for rec in self._result.data["Inquiries"]]
+        self._release_result()
+        return inquiries
+
+    @lazy_field
+    def index(self) -> CatalogIndex:
+        """
+        Lookup by id, category, subject prefix, keyword and size, built on first access
+        """
+        return CatalogIndex(self.inquiries)
 
 
 class Inquires:
     """
     Provides methods and classes relating winlink inquires
     """
-    def __init__(self, api_key: str, hostname: str = CMS_API_HOSTNAME, logger: logging.Logger = None):
-        self.cms_api = CmsApiAdapter(api_key, hostname, logger)
+    def __init__(self, api_key: str = None, hostname: str = CMS_API_HOSTNAME, logger: logging.Logger = None,
+                 cms_api: CmsApiAdapter = None, catalog_store: CatalogStore = None,
+                 catalog_max_age: float = 3600.0):
+        """
+        :param api_key: Web service access key (not needed when cms_api is supplied)
+        :param hostname: Normally, api.winlink.org
+        :param logger: (optional)
+        :param cms_api: (optional) Shared adapter, so several classes can use one connection pool
+        :param catalog_store: (optional) Local store that keeps the last catalog across restarts
+        :param catalog_max_age: Seconds after which a stored catalog is refreshed in the background
+        """
+        self.cms_api = cms_api or CmsApiAdapter(api_key, hostname, logger)
+        self._logger = logger or logging.getLogger(__name__)
+        self.catalog_store = catalog_store
+        self.catalog_max_age = catalog_max_age
+        self._stored_catalog: StoredCatalog = None
+        self._catalog: InquiresCatalogGetResponse = None
+        self._refresh_task = None
+
+    @with_deadline
+    async def catalog_get(self, priority: int = PRIORITY_BACKGROUND, keep_raw: bool = False):
+        """
+        Returns a list of winlink catalog items. When rate limited, catalog requests yield
+        to interactive traffic unless a higher priority is given.
+        With a catalog store, the stored catalog is returned right away and refreshed in the
+        background once it is older than catalog_max_age (times the cache_ttl_factor of the
+        adapter's low-bandwidth profile, if it has one).
+        :param keep_raw: Keep the decoded payload available as raw_data. With a catalog store the
+            stored body is decoded again for the caller, since the shared catalog doesn't keep it.
+        """
+        if self.catalog_store is None:
+            result = await self.cms_api.get(CATALOG_ENDPOINT, priority=priority)
+            return InquiresCatalogGetResponse(result, keep_raw)
+
+        if self._catalog is None:
+            self._stored_catalog = self.catalog_store.load()
+            if self._stored_catalog is not None:
+                self._catalog = InquiresCatalogGetResponse(self.cms_api.result_from_body(self._stored_catalog.body))
+        if self._catalog is None:
+            catalog = await self.refresh_catalog(priority)
+        else:
+            catalog = self._catalog
+            max_age = self.catalog_max_age
+            if self.cms_api.low_bandwidth is not None:
+                max_age *= self.cms_api.low_bandwidth.cache_ttl_factor
+            if time.time() - self._stored_catalog.fetched_at >= max_age:
+                self._refresh_in_background(priority)
+        if keep_raw:
+            return InquiresCatalogGetResponse(self.cms_api.result_from_body(self._stored_catalog.body), keep_raw)
+        return catalog
 
-    async def catalog_get(self):
+    async def iter_catalog(self, priority: int = PRIORITY_BACKGROUND) -> AsyncIterator[InquiryRecord]:
         """
-        Returns a list of winlink catalog items
+        Yields the catalog entries as they arrive, without holding the whole response in memory.
+        The catalog is always fetched from the CMS; the cache and catalog store are not used.
+        A deadline set with deadlines.deadline_scope() around the loop limits the wait for the response.
+        Raises CmsApiError once the body is complete if the CMS reported an error.
         """
-        result = await self.cms_api.get("inquiries/catalog/")
-        return InquiresCatalogGetResponse(result)
+        scanner = JsonArrayScanner("Inquiries")
+        async with self.cms_api.stream(CATALOG_ENDPOINT, priority=priority) as response:
+            async for chunk in response.aiter_bytes():
+                for item in scanner.feed(chunk):
+                    rec = self.cms_api.decode(item)
+                    yield InquiryRecord(rec["Category"], rec["InquiryId"], rec["Subject"], rec["SizeEstimate"])
+        # What is left is the response status and any other members, with the catalog array emptied
+        WebServiceResponse(self.cms_api.result_from_body(bytes(scanner.rest)))
+
+    @with_deadline
+    async def refresh_catalog(self, priority: int = PRIORITY_BACKGROUND) -> InquiresCatalogGetResponse:
+        """
+        Fetches the catalog into the catalog store. The request carries the stored ETag and
+        Last-Modified date, and a catalog that comes back unchanged is neither decoded nor rewritten.
+        """
+        stored = self._stored_catalog
+        body, headers = await self.cms_api.get_conditional(CATALOG_ENDPOINT,
+                                                           etag=stored.etag if stored else None,
+                                                           last_modified=stored.last_modified if stored else None,
+                                                           priority=priority)
+        now = time.time()
+        etag, last_modified = headers.get("ETag"), headers.get("Last-Modified")
+        if stored is not None and (body is None or content_hash(body) == stored.content_hash):
+            self.catalog_store.touch(now, etag, last_modified)
+            self._stored_catalog = stored._replace(fetched_at=now, etag=etag or stored.etag,
+                                                   last_modified=last_modified or stored.last_modified)
+            return self._catalog
+
+        # Raises CmsApiError before the stored copy is replaced if the CMS reported an error
+        catalog = InquiresCatalogGetResponse(self.cms_api.result_from_body(body))
+        self._stored_catalog = self.catalog_store.save(body, etag, last_modified, now)
+        self._catalog = catalog
+        return catalog
+
+    def _refresh_in_background(self, priority: int):
+        if self._refresh_task is None or self._refresh_task.done():
+            import asyncio
+            self._refresh_task = asyncio.ensure_future(self._background_refresh(priority))
+
+    async def _background_refresh(self, priority: int):
+        # Outlives the call that started it, so that call's deadline doesn't apply
+        clear_deadline()
+        try:
+            await self.refresh_catalog(priority)
+        except Exception as e:
+            self._logger.warning(msg=f"catalog refresh failed: {e!r}")
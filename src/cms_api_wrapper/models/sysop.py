@@ -1,33 +1,62 @@
-from src.cms_api_wrapper.cms_api_adapter import *
-from src.cms_api_wrapper.models.constants import *
-
-
-class SysopRecord:
-    def __init__(self, result: ApiResult):
-        sysop_rec = result.data["Sysop"]
-        self.callsign: str = sysop_rec["Callsign"]
-        self.grid_square: str = sysop_rec["GridSquare"]
-        self.sysop_name: str = sysop_rec["SysopName"]
-        self.street_address_1: str = sysop_rec["StreetAddress1"]
-        self.street_address_2: str = sysop_rec["StreetAddress2"]
-        self.city: str = sysop_rec["City"]
-        self.state: str = sysop_rec["State"]
-        self.country: str = sysop_rec["Country"]
-        self.postal_code: str = sysop_rec["PostalCode"]
-        self.email: str = sysop_rec["Email"]
-        self.phones: str = sysop_rec["Phones"]
-        self.website: str = sysop_rec["Website"]
-        self.comments: str = sysop_rec["Comments"]
+import logging
+from typing import Dict, Iterable, NamedTuple, Optional, Union
+
+from src.cms_api_wrapper.batch import DEFAULT_CONCURRENCY, normalize_callsign, run_many
+from src.cms_api_wrapper.cms_api_adapter import ApiResult, CmsApiAdapter, WebServiceResponse, lazy_field
+from src.cms_api_wrapper.deadlines import with_deadline
+from src.cms_api_wrapper.models.constants import CMS_API_HOSTNAME
+from src.cms_api_wrapper.write_queue import WriteQueue
+
+
+class SysopRecord(NamedTuple):
+    """
+    Sysop information for a callsign (immutable)
+    """
+    callsign: str
+    grid_square: str
+    sysop_name: str
+    street_address_1: str
+    street_address_2: str
+    city: str
+    state: str
+    country: str
+    postal_code: str
+    email: str
+    phones: str
+    website: str
+    comments: str
+
+    @classmethod
+    def from_dict(cls, sysop_rec: Dict) -> "SysopRecord":
+        """
+        Builds the record from the 'Sysop' object of the API result
+        """
+        return cls(sysop_rec["Callsign"], sysop_rec["GridSquare"], sysop_rec["SysopName"],
+                   sysop_rec["StreetAddress1"], sysop_rec["StreetAddress2"], sysop_rec["City"],
+                   sysop_rec["State"], sysop_rec["Country"], sysop_rec["PostalCode"], sysop_rec["Email"],
+                   sysop_rec["Phones"], sysop_rec["Website"], sysop_rec["Comments"])
 
 
 class SysopGetResponse(WebServiceResponse):
-    def __init__(self, result: ApiResult):
+    __slots__ = ("_sysop_record",)
+
+    def __init__(self, result: ApiResult, keep_raw: bool = False):
         """
         Deconstructs the response to expose the sysop information.
         :param result: The result of the API request
+        :param keep_raw: Keep the decoded payload available as raw_data
         """
-        super().__init__(result)
-        self.sysop_record = SysopRecord(result)
+        super().__init__(result, keep_raw)
+
+    @lazy_field
+    def sysop_record(self) -> Optional[SysopRecord]:
+        """
+        The sysop record, None if the account has none (the CMS returns a null Sysop)
+        """
+        sysop = self._result.data.get("Sysop")
+        sysop_record = SysopRecord.from_dict(sysop) if sysop is not None else None
+        self._release_result()
+        return sysop_record
 
 
 class Sysop:
@@ -35,27 +64,57 @@ class Sysop:
     Provides methods and classes relating to a sysop settings
     """
 
-    def __init__(self, api_key: str, hostname: str = CMS_API_HOSTNAME, logger: logging.Logger = None):
-        self.cms_api = CmsApiAdapter(api_key, hostname, logger)
+    def __init__(self, api_key: str = None, hostname: str = CMS_API_HOSTNAME, logger: logging.Logger = None,
+                 cms_api: CmsApiAdapter = None, write_queue: WriteQueue = None):
+        """
+        :param api_key: Web service access key (not needed when cms_api is supplied)
+        :param hostname: Normally, api.winlink.org
+        :param logger: (optional)
+        :param cms_api: (optional) Shared adapter, so several classes can use one connection pool
+        :param write_queue: (optional) Journals sysop_add() while the CMS can't be reached
+        """
+        self.cms_api = cms_api or CmsApiAdapter(api_key, hostname, logger)
+        self.write_queue = write_queue
 
+    @with_deadline
     async def sysop_add(self, callsign: str, password: str, sysop_name: str, grid_square: str, email: str,
                         address1: str = "", address2: str = "", city: str = "", state: str = "",
                         country: str = "", postal_code: str = "", phones: str = "", website: str = "",
                         comments: str = "") -> WebServiceResponse:
         """
-        Add sysop information to the callsign account.
+        Add sysop information to the callsign account. With a write queue the response is a
+        QueuedResponse if the change was journaled for later delivery.
         """
         params = {"Callsign": callsign, "Password": password, "SysopName": sysop_name, "GridSquare": grid_square,
                   "Email": email, "StreetAddress1": address1, "StreetAddress2": address2, "City": city,
                   "State": state, "Country": country, "PostalCode": postal_code, "Phones": phones,
                   "Website": website, "Comments": comments}
-        result = await self.cms_api.get("sysop/add/", params)
+        if self.write_queue is not None:
+            return await self.write_queue.submit('POST', "sysop/add/", params)
+        result = await self.cms_api.post("sysop/add/", params)
         return WebServiceResponse(result)
 
-    async def sysop_get(self, callsign: str, password: str) -> SysopGetResponse:
+    @with_deadline
+    async def sysop_add_many(self, records: Iterable[Dict], concurrency: int = DEFAULT_CONCURRENCY
+                             ) -> Dict[str, Union[WebServiceResponse, Exception]]:
+        """
+        Bulk update: adds many sysop records, with at most 'concurrency' requests in flight over
+        the adapter's pooled keep-alive connections. With an adapter created with http2=True the
+        requests are multiplexed over a single connection. A failed update is returned as the
+        exception for that callsign instead of aborting the batch.
+        :param records: Keyword arguments for sysop_add(), one dictionary per record. If a callsign
+            appears more than once, its last record is used.
+        :return: Dictionary keyed by upper-case callsign
+        """
+        by_callsign = {normalize_callsign(record["callsign"]): record for record in records}
+        return await run_many(by_callsign, lambda callsign: self.sysop_add(**by_callsign[callsign]), concurrency)
+
+    @with_deadline
+    async def sysop_get(self, callsign: str, password: str, keep_raw: bool = False) -> SysopGetResponse:
         """
         Get sysop information for this account.
+        The CMS only accepts this request as a GET, so the password is sent in the query string.
         """
         params = {"Callsign": callsign, "Password": password}
         result = await self.cms_api.get("sysop2/get", params)
-        return SysopGetResponse(result)
+        return SysopGetResponse(result, keep_raw)
@@ -0,0 +1,245 @@
+import hashlib
+import math
+import sys
+import time
+from abc import ABC, abstractmethod
+from array import array
+from collections import OrderedDict
+from typing import Callable, Dict, List
+
+from src.cms_api_wrapper.batch import normalize_callsign
+
+
+class NegativeLookupCache(ABC):
+    """
+    Remembers callsigns that account_exists() found not to exist, so that repeated lookups of
+    them (typos, scanners, unknown stations) are answered without a request. Pass one to
+    Account as negative_cache; add_callsign_account() removes the callsign it adds.
+    Share the object between Account instances so they all see the accounts added.
+    """
+
+    # Number of discard counters; callsigns share them by hash, so their memory is fixed
+    DISCARD_SLOTS = 1024
+
+    def __init__(self, ttl: float, clock: Callable[[], float] = time.monotonic):
+        """
+        :param ttl: Seconds a callsign is remembered, since it may be added elsewhere
+        :param clock: Time source, in seconds
+        """
+        if ttl <= 0:
+            raise ValueError("ttl must be positive")
+        self.ttl = ttl
+        self._clock = clock
+        # Lookups answered from the cache, i.e. requests saved
+        self.hits = 0
+        self.misses = 0
+        self.added = 0
+        self.invalidated = 0
+        # Bumped by discard(), so a lookup that started before an account was added can't mark it missing.
+        # Callsigns sharing a counter only cause a missing callsign not to be remembered, never a wrong answer.
+        self._discards = array("I", [0]) * self.DISCARD_SLOTS
+
+    def contains(self, callsign: str) -> bool:
+        """
+        Returns whether the callsign is known not to exist, counting the lookup
+        """
+        found = self._contains(normalize_callsign(callsign))
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return found
+
+    def _discard_slot(self, callsign: str) -> int:
+        return hash(callsign) % len(self._discards)
+
+    def generation(self, callsign: str) -> int:
+        """
+        Returns the number of times the callsign (or one sharing its counter) was discarded. Take it
+        before looking the callsign up and pass it to add().
+        """
+        return self._discards[self._discard_slot(normalize_callsign(callsign))]
+
+    def add(self, callsign: str, generation: int = None):
+        """
+        :param generation: (optional) generation() of the callsign when the lookup started. If it has
+            been discarded since, the account may have been added meanwhile, and it isn't remembered.
+        """
+        callsign = normalize_callsign(callsign)
+        if generation is not None and generation != self._discards[self._discard_slot(callsign)]:
+            return
+        self.added += 1
+        self._add(callsign)
+
+    def discard(self, callsign: str):
+        callsign = normalize_callsign(callsign)
+        self.invalidated += 1
+        slot = self._discard_slot(callsign)
+        self._discards[slot] = (self._discards[slot] + 1) & 0xFFFFFFFF
+        self._discard(callsign)
+
+    def stats(self) -> Dict[str, float]:
+        return {"hits": self.hits, "misses": self.misses, "added": self.added, "invalidated": self.invalidated,
+                "memory_bytes": self.memory_bytes()}
+
+    def memory_bytes(self) -> int:
+        return self._memory_bytes() + len(self._discards) * self._discards.itemsize
+
+    @abstractmethod
+    def _memory_bytes(self) -> int:
+        pass
+
+    @abstractmethod
+    def _contains(self, callsign: str) -> bool:
+        pass
+
+    @abstractmethod
+    def _add(self, callsign: str):
+        pass
+
+    @abstractmethod
+    def _discard(self, callsign: str):
+        pass
+
+
+class NegativeLookupSet(NegativeLookupCache):
+    """
+    Exact negative cache: a set of callsigns, each kept for ttl seconds, holding at most
+    max_entries (the oldest are dropped first). Never reports an existing account as missing,
+    except one added elsewhere within the TTL.
+    """
+
+    def __init__(self, ttl: float = 300.0, max_entries: int = 10_000, clock: Callable[[], float] = time.monotonic):
+        """
+        :param ttl: Seconds a callsign is remembered
+        :param max_entries: Maximum number of callsigns remembered
+        :param clock: Time source, in seconds
+        """
+        super().__init__(ttl, clock)
+        self.max_entries = max_entries
+        # Callsign -> expiry time; the TTL is the same for all, so the oldest entry is always first
+        self._entries: OrderedDict = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _contains(self, callsign: str) -> bool:
+        self._expire()
+        return callsign in self._entries
+
+    def _add(self, callsign: str):
+        self._entries.pop(callsign, None)
+        self._entries[callsign] = self._clock() + self.ttl
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._expire()
+
+    def _discard(self, callsign: str):
+        self._entries.pop(callsign, None)
+
+    def _expire(self):
+        now = self._clock()
+        while self._entries:
+            callsign, expires = next(iter(self._entries.items()))
+            if expires > now:
+                break
+            del self._entries[callsign]
+
+    def _memory_bytes(self) -> int:
+        return sys.getsizeof(self._entries) + sum(sys.getsizeof(callsign) + 24 for callsign in self._entries)
+
+    def stats(self) -> Dict[str, float]:
+        return {**super().stats(), "entries": len(self._entries)}
+
+
+class CountingBloomFilter(NegativeLookupCache):
+    """
+    Compact negative cache for very many callsigns: a counting Bloom filter sized for 'capacity'
+    callsigns per TTL at the given false positive rate, using one byte per counter. Counting lets
+    add_callsign_account() remove a callsign again.
+
+    A false positive reports an existing account as missing, so keep the rate low. Entries expire
+    by generation: the filter is replaced every ttl/2 seconds (or sooner, when 'capacity' callsigns
+    have been added to it) and the previous one is still consulted, so a callsign is remembered
+    for between ttl/2 and ttl seconds.
+    """
+
+    def __init__(self, ttl: float = 300.0, capacity: int = 100_000, false_positive_rate: float = 0.001,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        :param ttl: Longest time a callsign is remembered, in seconds
+        :param capacity: Callsigns per generation for which false_positive_rate holds
+        :param false_positive_rate: Probability of reporting a callsign that was never added, 0 to 1
+        :param clock: Time source, in seconds
+        """
+        super().__init__(ttl, clock)
+        if not 0 < false_positive_rate < 1:
+            raise ValueError("false_positive_rate must be between 0 and 1")
+        self.capacity = capacity
+        self.false_positive_rate = false_positive_rate
+        self.size = max(8, math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        # Current generation first
+        self._generations: List[bytearray] = [bytearray(self.size), bytearray(self.size)]
+        self._added_to_current = 0
+        self._rotated_at = clock()
+        self.rotations = 0
+
+    def _positions(self, callsign: str) -> List[int]:
+        digest = hashlib.blake2b(callsign.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def _rotate_if_due(self):
+        now = self._clock()
+        elapsed = now - self._rotated_at
+        if elapsed >= self.ttl / 2 or self._added_to_current >= self.capacity:
+            if elapsed >= self.ttl:
+                self._generations[0] = bytearray(self.size)  # Both generations are out of date
+            self._generations = [bytearray(self.size), self._generations[0]]
+            self._added_to_current = 0
+            # Keep to the ttl/2 schedule when rotating late, so nothing outlives the TTL
+            self._rotated_at = self._rotated_at + self.ttl / 2 if self.ttl / 2 <= elapsed < self.ttl else now
+            self.rotations += 1
+
+    def _contains(self, callsign: str) -> bool:
+        self._rotate_if_due()
+        positions = self._positions(callsign)
+        return any(all(counters[position] for position in positions) for counters in self._generations)
+
+    def _add(self, callsign: str):
+        self._rotate_if_due()
+        positions = self._positions(callsign)
+        current = self._generations[0]
+        if all(current[position] for position in positions):
+            return
+        for position in positions:
+            if current[position] < 255:  # Saturated counters stay, so they never drop to 0 wrongly
+                current[position] += 1
+        self._added_to_current += 1
+
+    def _discard(self, callsign: str):
+        positions = self._positions(callsign)
+        for counters in self._generations:
+            # If the callsign was never added this takes another callsign's counts away, which
+            # can only cause an unnecessary request, never a wrong answer
+            if all(counters[position] for position in positions):
+                for position in positions:
+                    if counters[position] < 255:
+                        counters[position] -= 1
+
+    def _memory_bytes(self) -> int:
+        return 2 * self.size
+
+    def estimated_false_positive_rate(self) -> float:
+        """
+        The current false positive rate, from how full the two generations are
+        """
+        rate_missed = 1.0
+        for counters in self._generations:
+            rate_missed *= 1 - ((self.size - counters.count(0)) / self.size) ** self.hash_count
+        return 1 - rate_missed
+
+    def stats(self) -> Dict[str, float]:
+        return {**super().stats(), "rotations": self.rotations,
+                "estimated_false_positive_rate": self.estimated_false_positive_rate()}
@@ -0,0 +1,348 @@
+"""
+Creates accounts in bulk from a CSV or JSONL file: for each record the account is added, its
+password recovery address set and its sysop information added, one step after the other, while
+many records are provisioned at the same time. Completed steps are written to a checkpoint file,
+so a run that was interrupted (or that failed for some records) can simply be started again.
+
+    python -m src.cms_api_wrapper.provisioning club.csv --checkpoint club.checkpoint --report club-report.csv
+
+Input columns (CSV header or JSONL keys): callsign, password, recovery_email, and optionally the
+sysop_add() arguments sysop_name, grid_square, email, address1, address2, city, state, country,
+postal_code, phones, website and comments. The sysop step runs only for records with a sysop_name.
+"""
+import argparse
+import contextlib
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, TextIO
+
+from src.cms_api_wrapper.batch import DEFAULT_CONCURRENCY, normalize_callsign
+from src.cms_api_wrapper.cms_api_adapter import CmsApiAdapter, CmsApiError
+from src.cms_api_wrapper.models.account import Account
+from src.cms_api_wrapper.models.constants import CMS_API_HOSTNAME
+from src.cms_api_wrapper.models.sysop import Sysop
+from src.cms_api_wrapper.validation import DEFAULT_VALIDATOR, RequestValidator, ValidationError
+
+STEP_ACCOUNT = "account"
+STEP_RECOVERY_EMAIL = "recovery_email"
+STEP_SYSOP = "sysop"
+STEPS = (STEP_ACCOUNT, STEP_RECOVERY_EMAIL, STEP_SYSOP)
+
+STATUS_PROVISIONED = "provisioned"
+STATUS_SKIPPED = "skipped"
+STATUS_FAILED = "failed"
+STATUS_VALID = "valid"
+
+SYSOP_FIELDS = ("sysop_name", "grid_square", "email", "address1", "address2", "city", "state", "country",
+                "postal_code", "phones", "website", "comments")
+
+
+class ProvisioningRecord(NamedTuple):
+    """
+    One account to create, read from a line of the input file
+    """
+    line: int
+    callsign: str
+    password: str
+    recovery_email: str
+    sysop: Dict[str, str]
+
+    @classmethod
+    def from_dict(cls, line: int, row: Dict) -> "ProvisioningRecord":
+        """
+        :raise ValueError: If the callsign or password is missing
+        """
+        callsign = normalize_callsign(str(row.get("callsign") or ""))
+        password = str(row.get("password") or "")
+        if not callsign or not password:
+            raise ValueError(f"line {line}: callsign and password are required")
+        sysop = {field: str(row[field]) for field in SYSOP_FIELDS if row.get(field) not in (None, "")}
+        return cls(line, callsign, password, str(row.get("recovery_email") or ""), sysop)
+
+    def steps(self) -> List[str]:
+        """
+        The steps this record needs, in the order they have to run
+        """
+        steps = [STEP_ACCOUNT]
+        if self.recovery_email:
+            steps.append(STEP_RECOVERY_EMAIL)
+        if self.sysop.get("sysop_name"):
+            steps.append(STEP_SYSOP)
+        return steps
+
+
+class ProvisioningResult(NamedTuple):
+    """
+    The outcome for one record, as written to the report
+    """
+    line: int
+    callsign: str
+    status: str
+    completed: List[str]
+    failed_step: str = ""
+    error: str = ""
+    seconds: float = 0.0
+
+
+def read_records(path: str, file_format: str = None) -> Iterator[Dict]:
+    """
+    Streams the rows of a CSV (with a header line) or JSONL file as dictionaries, with the row's
+    line number under "_line". Blank lines are skipped.
+    :param file_format: 'csv' or 'jsonl'; by default taken from the file extension
+    """
+    file_format = file_format or ("jsonl" if path.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv")
+    if file_format not in ("csv", "jsonl"):
+        raise ValueError(f"unknown input format {file_format!r}")
+    with open(path, newline="", encoding="utf-8") as f:
+        if file_format == "csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                if any(row.values()):
+                    yield {**row, "_line": reader.line_num}
+        else:
+            for line, text in enumerate(f, 1):
+                if text.strip():
+                    yield {**json.loads(text), "_line": line}
+
+
+class ProvisioningCheckpoint:
+    """
+    Append-only record of the steps completed for each callsign, one JSON object per line.
+    Each line is flushed as soon as the step succeeds, so at most the steps in flight are lost
+    when a run is interrupted. Passwords are not written.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Checkpoint file, created if it doesn't exist
+        """
+        self.path = path
+        self._completed: Dict[str, Set[str]] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for text in f:
+                    try:
+                        entry = json.loads(text)
+                    except ValueError:
+                        continue  # A line cut short by an interruption
+                    self._completed.setdefault(entry["callsign"], set()).add(entry["step"])
+        self._file: TextIO = open(path, "a", encoding="utf-8")
+        if self._file.tell() and not text.endswith("\n"):
+            self._file.write("\n")  # Don't append to the torn line
+
+    def completed(self, callsign: str) -> Set[str]:
+        return self._completed.get(callsign, set())
+
+    def mark(self, callsign: str, step: str):
+        self._completed.setdefault(callsign, set()).add(step)
+        self._file.write(json.dumps({"callsign": callsign, "step": step, "at": time.time()}) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ProvisioningReport:
+    """
+    Writes one CSV line per record as its provisioning finishes
+    """
+    COLUMNS = ("line", "callsign", "status", "completed", "failed_step", "error", "seconds")
+
+    def __init__(self, f: TextIO):
+        self._writer = csv.writer(f)
+        self._file = f
+        self._writer.writerow(self.COLUMNS)
+
+    def write(self, result: ProvisioningResult):
+        self._writer.writerow((result.line, result.callsign, result.status, " ".join(result.completed),
+                               result.failed_step, result.error, f"{result.seconds:.3f}"))
+        self._file.flush()
+
+
+class ProvisioningPipeline:
+    """
+    Runs each record's steps as a chain (a step runs only if the previous one succeeded) and
+    up to 'concurrency' records at a time. Records are read from the iterable as workers become
+    free, so the input file is never held in memory. Requests share the adapter of the Account
+    and Sysop objects; create it with rate_limit= to cap the request rate of the whole run.
+    """
+
+    def __init__(self, account: Account, sysop: Sysop, checkpoint: ProvisioningCheckpoint = None,
+                 report: ProvisioningReport = None, concurrency: int = DEFAULT_CONCURRENCY,
+                 logger: logging.Logger = None, validator: Optional[RequestValidator] = DEFAULT_VALIDATOR):
+        """
+        :param account: Used for the account and recovery address steps
+        :param sysop: Used for the sysop step
+        :param checkpoint: (optional) Completed steps are recorded here and skipped when run again
+        :param report: (optional) Receives the result of every record
+        :param concurrency: Maximum number of records provisioned at the same time
+        :param logger: (optional)
+        :param validator: Records it rejects fail without a request being made; None to skip the check
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        self.account = account
+        self.sysop = sysop
+        self.checkpoint = checkpoint
+        self.report = report
+        self.concurrency = concurrency
+        self._logger = logger or logging.getLogger(__name__)
+        self.validator = validator
+
+    async def run(self, rows: Iterable[Dict]) -> Dict[str, int]:
+        """
+        Provisions every row (dictionaries as produced by read_records())
+        :return: The number of records per status
+        """
+        import asyncio
+        numbered = enumerate(rows, 1)
+        seen: Set[str] = set()
+        counts = {STATUS_PROVISIONED: 0, STATUS_SKIPPED: 0, STATUS_FAILED: 0}
+
+        async def worker():
+            # Workers pull from the shared iterator; it is only touched between awaits, so this is safe
+            for line, row in numbered:
+                result = await self._provision_row(row.get("_line", line), row, seen)
+                counts[result.status] += 1
+                if self.report is not None:
+                    self.report.write(result)
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        return counts
+
+    async def _provision_row(self, line: int, row: Dict, seen: Set[str]) -> ProvisioningResult:
+        try:
+            record = ProvisioningRecord.from_dict(line, row)
+        except ValueError as e:
+            return ProvisioningResult(line, str(row.get("callsign") or ""), STATUS_FAILED, [], "input", str(e))
+        if self.validator is not None:
+            errors = self.validator.screen([row]).get(0)
+            if errors:
+                return ProvisioningResult(line, record.callsign, STATUS_FAILED, [], "input", describe_errors(errors))
+        if record.callsign in seen:
+            return ProvisioningResult(line, record.callsign, STATUS_FAILED, [], "input",
+                                      "callsign appears earlier in the input")
+        seen.add(record.callsign)
+        return await self.provision(record)
+
+    async def provision(self, record: ProvisioningRecord) -> ProvisioningResult:
+        """
+        Runs the steps of one record that the checkpoint doesn't list as done
+        """
+        started = time.perf_counter()
+        done = self.checkpoint.completed(record.callsign) if self.checkpoint is not None else set()
+        completed = [step for step in record.steps() if step in done]
+        pending = [step for step in record.steps() if step not in done]
+        if not pending:
+            return ProvisioningResult(record.line, record.callsign, STATUS_SKIPPED, completed)
+        for step in pending:
+            try:
+                await self._run_step(step, record)
+            except Exception as e:
+                self._logger.warning(msg=f"provisioning {record.callsign}: {step} failed: {e!r}")
+                return ProvisioningResult(record.line, record.callsign, STATUS_FAILED, completed, step,
+                                          str(e) or repr(e), time.perf_counter() - started)
+            completed.append(step)
+            if self.checkpoint is not None:
+                self.checkpoint.mark(record.callsign, step)
+        return ProvisioningResult(record.line, record.callsign, STATUS_PROVISIONED, completed,
+                                  seconds=time.perf_counter() - started)
+
+    async def _run_step(self, step: str, record: ProvisioningRecord):
+        if step == STEP_ACCOUNT:
+            try:
+                await self.account.add_callsign_account(record.callsign, record.password)
+            except CmsApiError:
+                # Added by an earlier run that was interrupted before the step was checkpointed;
+                # carry on only if it is the same account
+                if not (await self.account.validate_password(record.callsign, record.password)).is_valid:
+                    raise
+        elif step == STEP_RECOVERY_EMAIL:
+            await self.account.set_password_recovery_email_address(record.callsign, record.password,
+                                                                   record.recovery_email)
+        elif step == STEP_SYSOP:
+            sysop = record.sysop
+            await self.sysop.sysop_add(record.callsign, record.password, sysop["sysop_name"],
+                                       sysop.get("grid_square", ""), sysop.get("email", ""),
+                                       **{field: value for field, value in sysop.items()
+                                          if field not in ("sysop_name", "grid_square", "email")})
+
+
+def describe_errors(errors: List[ValidationError]) -> str:
+    return "; ".join(f"{error.field}: {error}" for error in errors)
+
+
+def check_records(rows: Iterable[Dict], report: ProvisioningReport = None,
+                  validator: RequestValidator = DEFAULT_VALIDATOR) -> Dict[str, int]:
+    """
+    Screens a whole input file in one pass, without contacting the CMS, and reports the records
+    that would fail
+    :return: The number of valid and failed records
+    """
+    rows = list(rows)
+    errors = validator.screen(rows)
+    if report is not None:
+        for index in sorted(errors):
+            report.write(ProvisioningResult(rows[index].get("_line", index + 1), str(rows[index].get("callsign") or ""),
+                                            STATUS_FAILED, [], "input", describe_errors(errors[index])))
+    return {STATUS_VALID: len(rows) - len(errors), STATUS_FAILED: len(errors)}
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Create CMS accounts in bulk from a CSV or JSONL file")
+    parser.add_argument("input", help="CSV file with a header line, or JSONL file")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="input format (default: from the extension)")
+    parser.add_argument("--checkpoint", help="file of completed steps (default: INPUT.checkpoint)")
+    parser.add_argument("--report", help="per-record results as CSV (default: standard output)")
+    parser.add_argument("--api-key", default=os.environ.get("CMS_API_KEY"),
+                        help="web service access key (default: $CMS_API_KEY)")
+    parser.add_argument("--hostname", action="append", help="CMS API host, may be repeated for failover")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="records provisioned at the same time")
+    parser.add_argument("--rate-limit", type=float, help="maximum requests per second for the whole run")
+    parser.add_argument("--scheme", default="https")
+    parser.add_argument("--check", action="store_true", help="only check the input, without contacting the CMS")
+    args = parser.parse_args(argv)
+    if not args.api_key and not args.check:
+        parser.error("an API key is required (--api-key or $CMS_API_KEY)")
+    return args
+
+
+async def provision_file(args: argparse.Namespace) -> Dict[str, int]:
+    if args.check:
+        with open(args.report, "w", newline="", encoding="utf-8") if args.report else contextlib.nullcontext(
+                sys.stdout) as report_file:
+            return check_records(read_records(args.input, args.format), ProvisioningReport(report_file))
+    checkpoint = ProvisioningCheckpoint(args.checkpoint or f"{args.input}.checkpoint")
+    report_file = open(args.report, "w", newline="", encoding="utf-8") if args.report else sys.stdout
+    try:
+        async with CmsApiAdapter(args.api_key, args.hostname or CMS_API_HOSTNAME, scheme=args.scheme,
+                                 rate_limit=args.rate_limit, max_keepalive_connections=args.concurrency,
+                                 coalesce=False) as cms_api:
+            pipeline = ProvisioningPipeline(Account(cms_api=cms_api), Sysop(cms_api=cms_api), checkpoint,
+                                            ProvisioningReport(report_file), args.concurrency)
+            return await pipeline.run(read_records(args.input, args.format))
+    finally:
+        checkpoint.close()
+        if report_file is not sys.stdout:
+            report_file.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Command line entry point
+    :return: Exit status, 1 if any record failed
+    """
+    import asyncio
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(message)s")
+    counts = asyncio.run(provision_file(parse_args(argv)))
+    print(", ".join(f"{count} {status}" for status, count in counts.items()), file=sys.stderr)
+    return 1 if counts[STATUS_FAILED] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
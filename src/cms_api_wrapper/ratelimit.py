@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, List, Tuple
+
+if TYPE_CHECKING:
+    import asyncio
+
+# Request priorities, lowest value is served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BACKGROUND = 2
+
+
+class _Waiter:
+    __slots__ = ("future", "loop", "granted", "cancelled")
+
+    def __init__(self, future: asyncio.Future, loop: asyncio.AbstractEventLoop):
+        self.future = future
+        self.loop = loop
+        self.granted = False
+        self.cancelled = False
+
+
+class TokenBucket:
+    """
+    An asyncio token bucket. Requests wait in a queue instead of failing; waiters are
+    served by priority, and in arrival order within the same priority.
+    A bucket may be shared by event loops in different threads (shared_bucket() is process wide):
+    its state is guarded by a lock, each waiter times its own wait on its own loop, and a token
+    granted to a waiter on another loop is handed over with call_soon_threadsafe().
+    """
+
+    def __init__(self, rate: float, burst: int = 10, clock: Callable[[], float] = time.monotonic):
+        """
+        :param rate: Tokens (requests) added per second
+        :param burst: Maximum number of tokens that can be saved up
+        :param clock: Time source, in seconds
+        """
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be positive and burst at least 1")
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._waiters: List[Tuple[int, int, _Waiter]] = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    @property
+    def queued(self) -> int:
+        with self._lock:
+            return sum(1 for _, _, waiter in self._waiters if not (waiter.granted or waiter.cancelled))
+
+    async def acquire(self, priority: int = PRIORITY_NORMAL):
+        """
+        Waits until a token is available and takes it
+        """
+        with self._lock:
+            self._refill()
+            if not self._waiters and self._tokens >= 1:
+                self._tokens -= 1
+                return
+            import asyncio
+            loop = asyncio.get_running_loop()
+            waiter = _Waiter(loop.create_future(), loop)
+            heapq.heappush(self._waiters, (priority, next(self._sequence), waiter))
+            self._dispatch()
+        try:
+            while not waiter.granted:
+                try:
+                    # Woken by whichever waiter dispatches the next token, or by the time it is due
+                    await asyncio.wait_for(asyncio.shield(waiter.future), self._next_token_in())
+                except asyncio.TimeoutError:
+                    with self._lock:
+                        self._dispatch()
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.granted:
+                    # The token was handed over just as the wait was cancelled
+                    self._tokens += 1
+                    self._dispatch()
+                else:
+                    waiter.cancelled = True
+            raise
+
+    def _next_token_in(self) -> float:
+        with self._lock:
+            self._refill()
+            return max(0.001, (1 - self._tokens) / self.rate)
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _dispatch(self):
+        """
+        Hands out the available tokens to waiters, by priority. Called with the lock held.
+        """
+        import asyncio
+        self._refill()
+        try:
+            current_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            current_loop = None
+        while self._waiters:
+            waiter = self._waiters[0][2]
+            if waiter.cancelled:
+                heapq.heappop(self._waiters)
+            elif self._tokens >= 1:
+                heapq.heappop(self._waiters)
+                self._tokens -= 1
+                waiter.granted = True
+                if waiter.loop is current_loop:
+                    _wake(waiter.future)
+                else:
+                    try:
+                        waiter.loop.call_soon_threadsafe(_wake, waiter.future)
+                    except RuntimeError:
+                        # Its event loop is closed, so nobody is waiting any more
+                        self._tokens += 1
+            else:
+                break
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+_shared_buckets: Dict[str, TokenBucket] = {}
+_shared_buckets_lock = threading.Lock()
+
+
+def shared_bucket(api_key: str, rate: float, burst: int = 10) -> TokenBucket:
+    """
+    Returns the token bucket shared by every adapter using this API key, whichever hosts they send
+    to: the CMS quota is per key.
+    :raise ValueError: If the key's bucket already exists with a different rate or burst
+    """
+    with _shared_buckets_lock:
+        bucket = _shared_buckets.get(api_key)
+        if bucket is None:
+            bucket = _shared_buckets[api_key] = TokenBucket(rate, burst)
+        elif (bucket.rate, bucket.burst) != (rate, burst):
+            raise ValueError(f"The rate limit for this API key is already {bucket.rate:g}/s with a burst of "
+                             f"{bucket.burst}, not {rate:g}/s with a burst of {burst}")
+    return bucket
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import random
+import time
+from typing import TYPE_CHECKING, Callable, Optional
+
+if TYPE_CHECKING:
+    import httpx
+
+# Server errors that are worth retrying -- the request most likely never reached the CMS
+RETRY_STATUS_CODES = frozenset({502, 503, 504})
+
+
+class RetryPolicy:
+    """
+    Decides whether, and after how long, a failed idempotent request is retried.
+    Delays grow exponentially up to max_delay, with "full jitter" so that clients that
+    failed together don't all retry at the same moment.
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.2, max_delay: float = 5.0,
+                 retry_statuses=RETRY_STATUS_CODES, max_retry_after: float = 30.0):
+        """
+        :param max_attempts: Total number of attempts, including the first one (1 = no retries)
+        :param base_delay: Upper bound of the delay before the first retry, in seconds
+        :param max_delay: Upper bound of any backoff delay, in seconds
+        :param retry_statuses: HTTP status codes that are retried
+        :param max_retry_after: Longest Retry-After value (in seconds) the server may ask for
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = frozenset(retry_statuses)
+        self.max_retry_after = max_retry_after
+
+    @staticmethod
+    def is_retryable_error(error: Exception) -> bool:
+        """
+        Timeouts, connection failures and dropped connections are retryable
+        """
+        import httpx
+        return isinstance(error, (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError))
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Returns a random delay for the retry after the given (1-based) attempt
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def delay(self, attempt: int, response: httpx.Response = None) -> float:
+        """
+        Returns the delay before the next attempt, honouring a Retry-After header if present
+        """
+        retry_after = parse_retry_after(response.headers.get("Retry-After")) if response is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        return self.backoff(attempt)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parses a Retry-After header, which holds either a number of seconds or an HTTP date
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from datetime import datetime, timezone
+    from email.utils import parsedate_to_datetime
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class CircuitBreaker:
+    """
+    Tracks consecutive failures for one host. After failure_threshold failures the circuit
+    opens and requests fail fast. Once reset_timeout has passed a single probe request is let
+    through (half-open); its success closes the circuit, its failure opens it again.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 on_state_change: Callable[[str, str], None] = None, clock: Callable[[], float] = time.monotonic):
+        """
+        :param failure_threshold: Consecutive failures that open the circuit
+        :param reset_timeout: Seconds the circuit stays open before a probe is allowed
+        :param on_state_change: (optional) Called with (old_state, new_state) on every transition
+        :param clock: Time source, in seconds
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._on_state_change = on_state_change
+        self._clock = clock
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started = None
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._set_state(self.HALF_OPEN)
+        return self._state
+
+    def allow_request(self) -> bool:
+        """
+        Returns True if a request may be sent now
+        """
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN:
+            # Only one probe at a time; a probe that never reported back is replaced after reset_timeout
+            now = self._clock()
+            if self._probe_started is None or now - self._probe_started >= self.reset_timeout:
+                self._probe_started = now
+                return True
+        return False
+
+    def record_success(self):
+        self._failures = 0
+        self._probe_started = None
+        if self._state != self.CLOSED:
+            self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        self._failures += 1
+        self._probe_started = None
+        if self._state == self.HALF_OPEN or (self._state == self.CLOSED and
+                                             self._failures >= self.failure_threshold):
+            self._opened_at = self._clock()
+            self._set_state(self.OPEN)
+
+    def _set_state(self, state: str):
+        old_state, self._state = self._state, state
+        if self._on_state_change is not None:
+            self._on_state_change(old_state, state)
@@ -0,0 +1,105 @@
+import re
+from typing import List
+
+# Characters that change the scanner state: string delimiters, escapes and brackets
+_STRUCTURAL = re.compile(rb'["\\{}\[\]]')
+
+_QUOTE, _BACKSLASH = ord('"'), ord('\\')
+_OPEN = {ord('{'), ord('[')}
+_OPEN_ARRAY = ord('[')
+
+_REST, _ITEM, _SKIP = 0, 1, 2
+
+
+class JsonArrayScanner:
+    """
+    Splits the object items of one top-level array member out of a JSON document that arrives
+    in chunks, for example {"Inquiries": [{...}, {...}], "ResponseStatus": {...}} with key
+    'Inquiries'. Items are returned as raw bytes as soon as they are complete, so a caller can
+    decode them one at a time instead of holding the whole document. Everything else in the
+    document is kept in 'rest', with the array emptied, and may be decoded once the input ends.
+    Only object items are returned; scalar items of the array are dropped.
+    """
+
+    def __init__(self, key: str):
+        """
+        :param key: Name of the top-level member holding the array
+        """
+        self._key = key.encode()
+        self.rest = bytearray()
+        self._item = bytearray()
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._key_start = 0
+        self._last_key = None
+        self._in_array = False
+        self._mode = _REST
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """
+        Scans the next chunk of the document
+        :return: The array items completed within this chunk
+        """
+        items = []
+        mark = 0
+        pos = 0
+        if self._escaped and chunk:
+            # The previous chunk ended with the backslash of an escape sequence
+            self._escaped = False
+            pos = 1
+
+        def flush(upto: int):
+            nonlocal mark
+            if self._mode == _REST:
+                self.rest += chunk[mark:upto]
+            elif self._mode == _ITEM:
+                self._item += chunk[mark:upto]
+            mark = upto
+
+        while True:
+            match = _STRUCTURAL.search(chunk, pos)
+            if match is None:
+                break
+            i = match.start()
+            c = chunk[i]
+            pos = i + 1
+            if self._in_string:
+                if c == _BACKSLASH:
+                    if i + 1 == len(chunk):
+                        self._escaped = True
+                    pos = i + 2
+                elif c == _QUOTE:
+                    self._in_string = False
+                    if self._depth == 1:
+                        flush(i)
+                        self._last_key = bytes(self.rest[self._key_start:])
+                continue
+
+            if c == _QUOTE:
+                self._in_string = True
+                if self._depth == 1:
+                    flush(i + 1)
+                    self._key_start = len(self.rest)
+            elif c in _OPEN:
+                if self._in_array and self._depth == 2:
+                    flush(i)
+                    self._mode = _ITEM
+                self._depth += 1
+                if c == _OPEN_ARRAY and self._depth == 2 and self._last_key == self._key:
+                    flush(i + 1)
+                    self._mode = _SKIP
+                    self._in_array = True
+            else:
+                self._depth -= 1
+                if self._in_array and self._depth == 2 and self._mode == _ITEM:
+                    flush(i + 1)
+                    items.append(bytes(self._item))
+                    self._item.clear()
+                    self._mode = _SKIP
+                elif self._in_array and self._depth == 1:
+                    flush(i)
+                    self._mode = _REST
+                    self._in_array = False
+        flush(len(chunk))
+        return items
@@ -0,0 +1,198 @@
+import asyncio
+import concurrent.futures
+import inspect
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, Optional, Union
+
+from src.cms_api_wrapper.batch import DEFAULT_CONCURRENCY, run_many
+from src.cms_api_wrapper.cms_api_adapter import CmsApiAdapter
+from src.cms_api_wrapper.models.account import Account
+from src.cms_api_wrapper.models.constants import CMS_API_HOSTNAME
+from src.cms_api_wrapper.models.inquiries import Inquires
+from src.cms_api_wrapper.models.sysop import Sysop
+
+
+class BackgroundLoop:
+    """
+    An event loop running in a daemon thread, for calling coroutines from synchronous code
+    """
+
+    def __init__(self, name: str = "cms-api-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro: Awaitable) -> concurrent.futures.Future:
+        """
+        Schedules the coroutine on the loop and returns a future for its result
+        """
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("blocking call made from the background loop; await the coroutine instead")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Awaitable, timeout: float = None):
+        """
+        Runs the coroutine on the loop and waits for its result. On timeout the coroutine is cancelled.
+        """
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    @staticmethod
+    async def _cancel_pending():
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def close(self):
+        """
+        Cancels outstanding tasks (such as background catalog refreshes), stops the loop and
+        waits for the thread to finish
+        """
+        if self.loop.is_closed():
+            return
+        self.run(self._cancel_pending())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+class BlockingMethod:
+    """
+    A blocking wrapper around a coroutine method. Calling it waits for the result;
+    submit() starts the call and returns a concurrent.futures.Future instead.
+    """
+
+    def __init__(self, background: BackgroundLoop, method: Callable, timeout: Optional[float]):
+        self._background = background
+        self._method = method
+        self._timeout = timeout
+        self.__doc__ = method.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self._background.run(self._method(*args, **kwargs), self._timeout)
+
+    def submit(self, *args, **kwargs) -> concurrent.futures.Future:
+        return self._background.submit(self._method(*args, **kwargs))
+
+
+class BlockingProxy:
+    """
+    Exposes the methods of an Account, Sysop or Inquires object as blocking calls. Async
+    generator methods (such as Inquires.iter_catalog) become ordinary iterators.
+    """
+
+    def __init__(self, background: BackgroundLoop, target: Any, timeout: Optional[float]):
+        self._background = background
+        self._target = target
+        self._timeout = timeout
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self._target, name)
+        if inspect.iscoroutinefunction(attribute):
+            return BlockingMethod(self._background, attribute, self._timeout)
+        if inspect.isasyncgenfunction(attribute):
+            return lambda *args, **kwargs: self._iterate(attribute(*args, **kwargs))
+        return attribute
+
+    def _iterate(self, generator) -> Iterator:
+        try:
+            while True:
+                try:
+                    yield self._background.run(generator.__anext__(), self._timeout)
+                except StopAsyncIteration:
+                    return
+        finally:
+            self._background.run(generator.aclose())
+
+
+class SyncClient:
+    """
+    Blocking access to the CMS web services for code that doesn't run an event loop (cron jobs,
+    WSGI handlers, command line tools). One background thread runs an event loop with a shared,
+    pooled adapter, so connections are reused across calls and batch() runs calls concurrently.
+    Create one client per process and close() it when done, or use it as a context manager.
+
+        with SyncClient(api_key) as client:
+            if client.account.account_exists("W1AW").exists:
+                ...
+    """
+
+    def __init__(self, api_key: str = None, hostname: str = CMS_API_HOSTNAME, logger: logging.Logger = None,
+                 timeout: float = None, cms_api: CmsApiAdapter = None, **adapter_options):
+        """
+        :param api_key: Web service access key (not needed when cms_api is supplied)
+        :param hostname: Normally, api.winlink.org
+        :param logger: (optional)
+        :param timeout: (optional) Seconds a blocking call waits before it is cancelled and TimeoutError raised
+        :param cms_api: (optional) Adapter to use; it must not be in use by another event loop
+        :param adapter_options: Passed to CmsApiAdapter, e.g. cache=ResponseCache() or rate_limit=10
+        """
+        self._background = BackgroundLoop()
+        self.timeout = timeout
+
+        async def create():
+            # Built on the background loop, where the adapter will run
+            adapter = cms_api or CmsApiAdapter(api_key, hostname, logger, **adapter_options)
+            return adapter, Account(cms_api=adapter, logger=logger), Sysop(cms_api=adapter, logger=logger), \
+                Inquires(cms_api=adapter, logger=logger)
+
+        self.cms_api, account, sysop, inquiries = self._background.run(create())
+        self.account = BlockingProxy(self._background, account, timeout)
+        self.sysop = BlockingProxy(self._background, sysop, timeout)
+        self.inquiries = BlockingProxy(self._background, inquiries, timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def run(self, coro: Awaitable, timeout: float = None):
+        """
+        Runs any coroutine on the client's event loop, e.g. one using self.cms_api directly
+        """
+        return self._background.run(coro, timeout if timeout is not None else self.timeout)
+
+    def batch(self, method: Union[BlockingMethod, Callable], args: Iterable, concurrency: int = DEFAULT_CONCURRENCY,
+              timeout: float = None) -> Dict[Any, Any]:
+        """
+        Calls method once per item of args, with at most 'concurrency' calls in flight, and waits for
+        all of them. A failing call does not abort the batch -- its exception is returned in place of
+        the result.
+
+            client.batch(client.account.account_exists, ["W1AW", "K1ABC"])
+            client.batch(client.account.validate_password, [("W1AW", "secret"), ("K1ABC", "other")])
+
+        :param method: A method of client.account, client.sysop or client.inquiries (or a coroutine function)
+        :param args: The argument of each call; a tuple is passed as several positional arguments
+        :param concurrency: Maximum number of concurrent calls
+        :param timeout: (optional) Seconds to wait for the whole batch
+        :return: Dictionary mapping each item of args to its result or exception
+        """
+        coroutine_function = method._method if isinstance(method, BlockingMethod) else method
+
+        def call(arg):
+            return coroutine_function(*arg) if isinstance(arg, tuple) else coroutine_function(arg)
+
+        return self.run(run_many(args, call, concurrency), timeout)
+
+    def close(self):
+        """
+        Closes the pooled connections and stops the background thread
+        """
+        if self._background.loop.is_closed():
+            return
+        try:
+            self._background.run(self.cms_api.aclose())
+        finally:
+            self._background.close()
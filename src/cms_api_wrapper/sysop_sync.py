@@ -0,0 +1,321 @@
+"""
+Mirrors the sysop records of many callsigns into a local SQLite file. The callsigns are split
+into shards, one per worker process, and each worker fetches its shard with its own pooled
+adapter. Rows are only rewritten when their content changed, and a run that was interrupted
+carries on where it stopped:
+
+    python -m src.cms_api_wrapper.sysop_sync gateways.csv sysops.db --processes 8
+
+The input is a CSV file with callsign and password columns.
+"""
+import argparse
+import csv
+import hashlib
+import logging
+import os
+import sys
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from src.cms_api_wrapper.batch import DEFAULT_CONCURRENCY, normalize_callsign
+from src.cms_api_wrapper.cms_api_adapter import CmsApiAdapter, CmsApiError
+from src.cms_api_wrapper.models.constants import CMS_API_HOSTNAME
+from src.cms_api_wrapper.models.sysop import Sysop, SysopRecord
+
+# Seconds a worker waits for another worker's write to finish
+BUSY_TIMEOUT = 30.0
+
+
+def record_hash(record: SysopRecord) -> str:
+    return hashlib.sha256("\x1f".join(record).encode()).hexdigest()
+
+
+def _clean(record: SysopRecord, callsign: str) -> SysopRecord:
+    # Keyed by the callsign that was asked for, with empty strings for fields the CMS left null
+    return SysopRecord(callsign, *("" if value is None else str(value) for value in record[1:]))
+
+
+class SysopStore:
+    """
+    Sysop records in an SQLite file, with the content hash of each row and the progress of the
+    current sync run. Several processes may write to it at once.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: SQLite database file, created if it doesn't exist
+        """
+        import sqlite3
+        self.path = path
+        self._connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS sysop ("
+                + "".join(f" {field} TEXT NOT NULL," for field in SysopRecord._fields)
+                + " content_hash TEXT NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " PRIMARY KEY (callsign))")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS sync_run ("
+                " run_id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " started_at REAL NOT NULL,"
+                " finished_at REAL)")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS sync_progress ("
+                " run_id INTEGER NOT NULL,"
+                " callsign TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " PRIMARY KEY (run_id, callsign))")
+
+    def __len__(self):
+        return self._connection.execute("SELECT COUNT(*) FROM sysop").fetchone()[0]
+
+    def get(self, callsign: str) -> Optional[SysopRecord]:
+        row = self._connection.execute(f"SELECT {', '.join(SysopRecord._fields)} FROM sysop WHERE callsign = ?",
+                                       (normalize_callsign(callsign),)).fetchone()
+        return SysopRecord(*row) if row else None
+
+    def save(self, run_id: int, records: Sequence[SysopRecord], missing: Iterable[str] = ()) -> int:
+        """
+        Writes the records whose content changed and marks them, and the callsigns without a
+        sysop record, as done for the run. Everything is written in one transaction.
+        :return: The number of rows inserted or changed
+        """
+        now = time.time()
+        fields = SysopRecord._fields
+        rows = [(*record, record_hash(record), now) for record in records]
+        with self._connection:
+            before = self._connection.total_changes
+            self._connection.executemany(
+                f"INSERT INTO sysop ({', '.join(fields)}, content_hash, updated_at)"
+                f" VALUES ({', '.join('?' * (len(fields) + 2))})"
+                f" ON CONFLICT (callsign) DO UPDATE SET "
+                + ", ".join(f"{field} = excluded.{field}" for field in fields[1:] + ("content_hash", "updated_at"))
+                + " WHERE content_hash != excluded.content_hash", rows)
+            changed = self._connection.total_changes - before
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO sync_progress (run_id, callsign, status) VALUES (?, ?, ?)",
+                [(run_id, record.callsign, "fetched") for record in records]
+                + [(run_id, callsign, "missing") for callsign in missing])
+        return changed
+
+    def start_run(self, resume: bool = True) -> int:
+        """
+        Returns the unfinished run to resume, or starts a new one
+        """
+        if resume:
+            row = self._connection.execute(
+                "SELECT run_id FROM sync_run WHERE finished_at IS NULL ORDER BY run_id DESC LIMIT 1").fetchone()
+            if row:
+                return row[0]
+        with self._connection:
+            return self._connection.execute("INSERT INTO sync_run (started_at) VALUES (?)", (time.time(),)).lastrowid
+
+    def done(self, run_id: int) -> Set[str]:
+        """
+        The callsigns already synced in the run
+        """
+        return {row[0] for row in self._connection.execute(
+            "SELECT callsign FROM sync_progress WHERE run_id = ?", (run_id,))}
+
+    def finish_run(self, run_id: int):
+        with self._connection:
+            self._connection.execute("UPDATE sync_run SET finished_at = ? WHERE run_id = ?", (time.time(), run_id))
+            self._connection.execute("DELETE FROM sync_progress WHERE run_id = ?", (run_id,))
+
+    def close(self):
+        self._connection.close()
+
+
+class ShardReport(NamedTuple):
+    """
+    What one worker did with its shard
+    """
+    shard: int
+    callsigns: int
+    fetched: int
+    changed: int
+    missing: int
+    failed: int
+    seconds: float
+
+    @property
+    def per_second(self) -> float:
+        return (self.fetched + self.missing) / self.seconds if self.seconds else 0.0
+
+
+class ShardJob(NamedTuple):
+    """
+    Everything a worker process needs to sync one shard (sent to it by pickling)
+    """
+    shard: int
+    run_id: int
+    credentials: List[Tuple[str, str]]
+    store_path: str
+    api_key: str
+    hostname: Sequence[str]
+    concurrency: int
+    batch_size: int
+    adapter_options: Dict
+
+
+def sync_shard(job: ShardJob) -> ShardReport:
+    """
+    Worker process entry point: fetches the shard's sysop records with its own event loop and
+    adapter, saving them to the store in batches
+    """
+    import asyncio
+    return asyncio.run(_sync_shard(job))
+
+
+async def _sync_shard(job: ShardJob) -> ShardReport:
+    import asyncio
+    started = time.perf_counter()
+    store = SysopStore(job.store_path)
+    records: List[SysopRecord] = []
+    missing: List[str] = []
+    counts = {"fetched": 0, "changed": 0, "missing": 0, "failed": 0}
+    logger = logging.getLogger(__name__)
+
+    def flush():
+        counts["changed"] += store.save(job.run_id, records, missing)
+        records.clear()
+        missing.clear()
+
+    async with CmsApiAdapter(job.api_key, job.hostname, max_keepalive_connections=job.concurrency,
+                             coalesce=False, **job.adapter_options) as cms_api:
+        sysop = Sysop(cms_api=cms_api)
+        semaphore = asyncio.Semaphore(job.concurrency)
+
+        async def fetch(callsign: str, password: str):
+            async with semaphore:
+                try:
+                    record = (await sysop.sysop_get(callsign, password)).sysop_record
+                    if record is None:
+                        # The account exists without a sysop record; done for this run, like a missing one
+                        missing.append(callsign)
+                        counts["missing"] += 1
+                    else:
+                        records.append(_clean(record, callsign))
+                        counts["fetched"] += 1
+                except CmsApiError as e:
+                    # The CMS refused the lookup, e.g. an unknown account or a wrong password; nothing to mirror
+                    logger.info(msg=f"no sysop record for {callsign}: {e}")
+                    missing.append(callsign)
+                    counts["missing"] += 1
+                except Exception as e:
+                    # Left out of the progress table, so the next run tries again
+                    logger.warning(msg=f"fetching the sysop record of {callsign} failed: {e!r}")
+                    counts["failed"] += 1
+                if len(records) + len(missing) >= job.batch_size:
+                    flush()
+
+        try:
+            await asyncio.gather(*(fetch(callsign, password) for callsign, password in job.credentials))
+        finally:
+            flush()
+            store.close()
+    return ShardReport(job.shard, len(job.credentials), counts["fetched"], counts["changed"], counts["missing"],
+                       counts["failed"], time.perf_counter() - started)
+
+
+class SysopSync:
+    """
+    Syncs sysop records into a SysopStore using a pool of worker processes, each running its own
+    event loop and connection pool, so the JSON decoding and SQLite writes of one shard don't
+    hold up the others.
+    """
+
+    def __init__(self, api_key: str, store_path: str, hostname: Sequence[str] = (CMS_API_HOSTNAME,),
+                 processes: int = None, concurrency: int = DEFAULT_CONCURRENCY, batch_size: int = 200,
+                 mp_context=None, **adapter_options):
+        """
+        :param api_key: Web service access key
+        :param store_path: SQLite file the records are written to
+        :param hostname: CMS API host, or several for failover
+        :param processes: Number of worker processes, the number of CPUs by default. With 1 the sync runs
+            in the calling process.
+        :param concurrency: Requests in flight per worker
+        :param batch_size: Records a worker saves per transaction
+        :param mp_context: (optional) multiprocessing context for the pool, e.g. get_context("spawn")
+        :param adapter_options: Passed to each worker's CmsApiAdapter, e.g. rate_limit= (which applies per worker)
+        """
+        self.api_key = api_key
+        self.store_path = store_path
+        self.hostname = [hostname] if isinstance(hostname, str) else list(hostname)
+        self.processes = processes or os.cpu_count() or 1
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self._mp_context = mp_context
+        self.adapter_options = adapter_options
+
+    def run(self, credentials: Iterable[Tuple[str, str]], resume: bool = True) -> List[ShardReport]:
+        """
+        Syncs the sysop records of the callsigns. Callsigns done by an interrupted earlier run are
+        skipped unless resume is False. The run is finished once every callsign has been synced.
+        :param credentials: (callsign, password) pairs
+        :return: One report per shard
+        """
+        store = SysopStore(self.store_path)
+        try:
+            run_id = store.start_run(resume)
+            done = store.done(run_id)
+            pending = list({normalize_callsign(callsign): password for callsign, password in credentials
+                            if normalize_callsign(callsign) not in done}.items())
+            shard_count = max(1, min(self.processes, len(pending)))
+            jobs = [ShardJob(shard, run_id, pending[shard::shard_count], self.store_path, self.api_key,
+                             self.hostname, self.concurrency, self.batch_size, self.adapter_options)
+                    for shard in range(shard_count)]
+            if shard_count == 1:
+                reports = [sync_shard(jobs[0])]
+            else:
+                from concurrent.futures import ProcessPoolExecutor
+                with ProcessPoolExecutor(shard_count, mp_context=self._mp_context) as pool:
+                    reports = list(pool.map(sync_shard, jobs))
+            if not any(report.failed for report in reports):
+                store.finish_run(run_id)
+            return reports
+        finally:
+            store.close()
+
+
+def format_reports(reports: List[ShardReport]) -> str:
+    lines = [f"{'shard':>5} {'callsigns':>9} {'fetched':>8} {'changed':>8} {'missing':>8} {'failed':>7} "
+             f"{'seconds':>8} {'per sec':>8}"]
+    for report in reports:
+        lines.append(f"{report.shard:5d} {report.callsigns:9d} {report.fetched:8d} {report.changed:8d} "
+                     f"{report.missing:8d} {report.failed:7d} {report.seconds:8.2f} {report.per_second:8.1f}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Command line entry point
+    :return: Exit status, 1 if any callsign could not be fetched
+    """
+    parser = argparse.ArgumentParser(description="Mirror sysop records into a local SQLite file")
+    parser.add_argument("credentials", help="CSV file with callsign and password columns")
+    parser.add_argument("store", help="SQLite file to write")
+    parser.add_argument("--api-key", default=os.environ.get("CMS_API_KEY"),
+                        help="web service access key (default: $CMS_API_KEY)")
+    parser.add_argument("--hostname", action="append", help="CMS API host, may be repeated for failover")
+    parser.add_argument("--processes", type=int, help="worker processes (default: number of CPUs)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="requests in flight per worker")
+    parser.add_argument("--restart", action="store_true", help="start a new run instead of resuming")
+    parser.add_argument("--scheme", default="https")
+    args = parser.parse_args(argv)
+    if not args.api_key:
+        parser.error("an API key is required (--api-key or $CMS_API_KEY)")
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(message)s")
+    with open(args.credentials, newline="", encoding="utf-8") as f:
+        credentials = [(row["callsign"], row["password"]) for row in csv.DictReader(f)]
+    sync = SysopSync(args.api_key, args.store, args.hostname or (CMS_API_HOSTNAME,), args.processes,
+                     args.concurrency, scheme=args.scheme)
+    reports = sync.run(credentials, resume=not args.restart)
+    print(format_reports(reports))
+    return 1 if any(report.failed for report in reports) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+"""
+Local checks of request parameters, so that input the CMS is certain to reject fails before a
+round trip. The checks are tables: FIELD_RULES lists the rules for each kind of value, and
+ENDPOINT_PARAMS says which kind each parameter of an endpoint is.
+
+The error codes are local to this library. The CMS does not document its validation error codes,
+so they can't be reproduced here: a ValidationError code is not necessarily what the CMS would
+have returned for the same input, and code that handles CmsApiError by code should treat the two
+separately. The codes are named after those the CMS does return (such as InvalidPassword):
+
+    InvalidCallsign           callsign missing, or not 3-12 letters and digits, optionally with /-separated
+                              prefixes and suffixes (VE3/W1AW, W1AW/M) and any number of hyphenated parts
+                              (an -SSID, or the parts of a tactical address)
+    InvalidEmailAddress       not an internet email address
+    WinlinkAddressNotAllowed  a winlink.org address where an outside address is required
+    InvalidGridSquare         not a 2, 4, 6 or 8 character Maidenhead locator
+    InvalidMaxMessageSize     not a whole number of kilobytes from 1 to 120
+    InvalidPassword           password missing from a provisioning record (passwords are otherwise left
+                              to the CMS)
+"""
+import re
+from typing import Callable, Dict, Iterable, List, NamedTuple, Sequence
+
+from src.cms_api_wrapper.cms_api_adapter import CmsApiError
+
+# Local error codes, see above
+INVALID_CALLSIGN = "InvalidCallsign"
+INVALID_EMAIL_ADDRESS = "InvalidEmailAddress"
+WINLINK_ADDRESS_NOT_ALLOWED = "WinlinkAddressNotAllowed"
+INVALID_GRID_SQUARE = "InvalidGridSquare"
+INVALID_MAX_MESSAGE_SIZE = "InvalidMaxMessageSize"
+INVALID_PASSWORD = "InvalidPassword"
+
+MAX_MESSAGE_SIZE_LIMIT = 120
+
+# Kinds of value
+CALLSIGN = "callsign"
+EMAIL = "email"
+OUTSIDE_EMAIL = "outside_email"
+GRID_SQUARE = "grid_square"
+MAX_MESSAGE_SIZE = "max_message_size"
+PASSWORD = "password"
+
+
+class ValidationError(CmsApiError):
+    """
+    Raised before sending a request whose parameters the CMS would reject. error_code is one of
+    the local codes listed above, not a code returned by the CMS.
+    """
+
+    def __init__(self, error_code: str, error_message: str, field: str = "", value=None):
+        super().__init__(f"{error_code}: {error_message}")
+        self.error_code = error_code
+        self.error_message = error_message
+        self.field = field
+        self.value = value
+
+
+class Rule(NamedTuple):
+    """
+    A check of one value: 'check' returns whether the (non-empty, string) value is acceptable
+    """
+    check: Callable[[str], bool]
+    error_code: str
+    error_message: str
+
+
+def _max_message_size_ok(value: str) -> bool:
+    return value.isdigit() and 1 <= int(value) <= MAX_MESSAGE_SIZE_LIMIT
+
+
+# Portable and prefixed callsigns have /-separated parts, e.g. VE3/W1AW or W1AW/M; tactical
+# addresses may have several hyphenated parts, e.g. EOC-KING-CO
+_CALLSIGN = re.compile(r"([A-Z0-9]{1,12}/)*[A-Z0-9]{3,12}(/[A-Z0-9]{1,12})*(-[A-Z0-9]{1,12})*", re.IGNORECASE)
+_EMAIL = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s.]+")
+_WINLINK_DOMAIN = re.compile(r"@(.+\.)?winlink\.org$", re.IGNORECASE)
+_GRID_SQUARE = re.compile(r"[A-R]{2}([0-9]{2}([A-X]{2}([0-9]{2})?)?)?", re.IGNORECASE)
+
+# Rules per kind of value, checked in order; the first one that fails gives the error.
+# Empty values are only an error for kinds listed in REQUIRED (records missing a required key also fail).
+FIELD_RULES: Dict[str, Sequence[Rule]] = {
+    CALLSIGN: (Rule(_CALLSIGN.fullmatch, INVALID_CALLSIGN,
+                    "The callsign must be 3 to 12 letters and digits, optionally with a /-separated prefix "
+                    "or suffix and hyphenated parts such as an -SSID"),),
+    EMAIL: (Rule(_EMAIL.fullmatch, INVALID_EMAIL_ADDRESS, "The email address is not valid"),),
+    OUTSIDE_EMAIL: (Rule(_EMAIL.fullmatch, INVALID_EMAIL_ADDRESS, "The email address is not valid"),
+                    Rule(lambda value: not _WINLINK_DOMAIN.search(value), WINLINK_ADDRESS_NOT_ALLOWED,
+                         "A Winlink address can't be used here, use a standard internet address")),
+    GRID_SQUARE: (Rule(_GRID_SQUARE.fullmatch, INVALID_GRID_SQUARE,
+                       "The grid square must be a Maidenhead locator such as FN31 or FN31pr"),),
+    MAX_MESSAGE_SIZE: (Rule(_max_message_size_ok, INVALID_MAX_MESSAGE_SIZE,
+                            f"The maximum message size is {MAX_MESSAGE_SIZE_LIMIT}K"),),
+    PASSWORD: (),
+}
+REQUIRED = {CALLSIGN: (INVALID_CALLSIGN, "A callsign is required"),
+            MAX_MESSAGE_SIZE: (INVALID_MAX_MESSAGE_SIZE, "A maximum message size is required"),
+            PASSWORD: (INVALID_PASSWORD, "A password is required")}
+
+_ACCOUNT = {"Callsign": CALLSIGN}
+
+# Kind of each checked parameter, per endpoint. Endpoints that aren't listed are not checked.
+ENDPOINT_PARAMS: Dict[str, Dict[str, str]] = {
+    "account/exists/": _ACCOUNT,
+    "account/add/": {**_ACCOUNT, "RecoveryEmail": OUTSIDE_EMAIL},
+    "account/password/change/": _ACCOUNT,
+    "account/password/validate/": _ACCOUNT,
+    "account/password/send": _ACCOUNT,
+    "account/alternateEmail/get": _ACCOUNT,
+    "account/alternateEmail/set": {**_ACCOUNT, "AlternateEmail": OUTSIDE_EMAIL},
+    "account/password/recovery/email/get": _ACCOUNT,
+    "account/password/recovery/email/set": {**_ACCOUNT, "RecoveryEmail": OUTSIDE_EMAIL},
+    "account/lockedOut/get": _ACCOUNT,
+    "account/lockedOutReason/get": _ACCOUNT,
+    "account/maxMessageSize/get": _ACCOUNT,
+    "account/maxMessageSize/set": {**_ACCOUNT, "MaxMessageSize": MAX_MESSAGE_SIZE},
+    "sysop/add/": {**_ACCOUNT, "GridSquare": GRID_SQUARE, "Email": EMAIL},
+    "sysop2/get": _ACCOUNT,
+}
+
+# Kind of each column of a provisioning record (see provisioning.py)
+RECORD_FIELDS: Dict[str, str] = {"callsign": CALLSIGN, "password": PASSWORD, "recovery_email": OUTSIDE_EMAIL,
+                                 "grid_square": GRID_SQUARE, "email": EMAIL}
+
+
+class RequestValidator:
+    """
+    Checks request parameters against the tables above. A CmsApiAdapter created with a validator
+    runs check() before every get() and post(), so Account and Sysop calls with bad input raise
+    ValidationError (a CmsApiError) without a request being made.
+    """
+
+    def __init__(self, field_rules: Dict[str, Sequence[Rule]] = None,
+                 endpoint_params: Dict[str, Dict[str, str]] = None):
+        """
+        :param field_rules: (optional) Replaces FIELD_RULES
+        :param endpoint_params: (optional) Replaces ENDPOINT_PARAMS
+        """
+        self.field_rules = FIELD_RULES if field_rules is None else field_rules
+        self.endpoint_params = ENDPOINT_PARAMS if endpoint_params is None else endpoint_params
+
+    def check_value(self, kind: str, value, field: str = ""):
+        """
+        :raise ValidationError: If the value is not acceptable for its kind
+        """
+        text = "" if value is None else str(value)
+        if text == "":
+            if kind in REQUIRED:
+                raise ValidationError(*REQUIRED[kind], field, value)
+            return
+        for rule in self.field_rules[kind]:
+            if not rule.check(text):
+                raise ValidationError(rule.error_code, rule.error_message, field, value)
+
+    def check(self, endpoint: str, params: Dict):
+        """
+        Checks the parameters of a request to endpoint. Parameters that are left out are not
+        checked; the CMS applies its own defaults to them.
+        :raise ValidationError: For the first parameter that is not acceptable
+        """
+        checked = self.endpoint_params.get(endpoint)
+        if not checked or not params:
+            return
+        for field, kind in checked.items():
+            if field in params:
+                self.check_value(kind, params[field], field)
+
+    def screen(self, records: Iterable[Dict], fields: Dict[str, str] = None) -> Dict[int, List[ValidationError]]:
+        """
+        Checks a whole batch of records before any of it is sent. The batch is checked a column
+        at a time, each rule being mapped over the values that passed the rules before it.
+        :param records: Dictionaries, such as the rows of a provisioning file
+        :param fields: Kind of each checked key, RECORD_FIELDS by default
+        :return: The errors of every record that has any, keyed by its position in records
+        """
+        records = records if isinstance(records, Sequence) else list(records)
+        errors: Dict[int, List[ValidationError]] = {}
+
+        def fail(index: int, error: ValidationError):
+            errors.setdefault(index, []).append(error)
+
+        for field, kind in (RECORD_FIELDS if fields is None else fields).items():
+            column = [None if record.get(field) is None else str(record.get(field)) for record in records]
+            pending = [index for index, value in enumerate(column) if value]
+            if kind in REQUIRED:
+                for index, value in enumerate(column):
+                    if not value:
+                        fail(index, ValidationError(*REQUIRED[kind], field, value))
+            for rule in self.field_rules[kind]:
+                passed = []
+                for index, ok in zip(pending, map(rule.check, [column[index] for index in pending])):
+                    if ok:
+                        passed.append(index)
+                    else:
+                        fail(index, ValidationError(rule.error_code, rule.error_message, field, column[index]))
+                pending = passed
+        return errors
+
+
+DEFAULT_VALIDATOR = RequestValidator()
@@ -0,0 +1,263 @@
+import json
+import logging
+import os
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from src.cms_api_wrapper.cms_api_adapter import (ApiResult, CircuitOpenError, CmsApiAdapter, CmsApiTransportError,
+                                                 DeadlineExceeded, WebServiceResponse)
+
+# Server errors that mean the CMS is down or not reachable through its gateway, rather than that
+# it failed on this particular request
+UNREACHABLE_STATUSES = {"502", "503", "504"}
+
+# Error code passed to on_rejected for a write dropped after max_attempts server errors
+ERROR_TOO_MANY_ATTEMPTS = "TooManyAttempts"
+
+
+def is_unreachable(error: CmsApiTransportError) -> bool:
+    """
+    Tells whether a transport error means the CMS can't be reached at the moment, so that a write
+    should wait in the journal, as opposed to a server error in answer to the write itself or the
+    caller's deadline running out
+    """
+    import httpx
+    if isinstance(error, DeadlineExceeded):
+        return False
+    if isinstance(error, CircuitOpenError) or isinstance(error.__cause__, httpx.RequestError):
+        return True
+    return bool(error.args) and error.args[0] in UNREACHABLE_STATUSES
+
+
+class QueuedWrite(NamedTuple):
+    """
+    A write request waiting in the journal
+    """
+    sequence: int
+    method: str
+    endpoint: str
+    params: Dict
+    key: Optional[str]
+    queued_at: float
+    attempts: int
+    last_error: Optional[str]
+    # Attempts the CMS answered with a server error (not counting those while it was unreachable)
+    failures: int
+
+
+class QueuedResponse(WebServiceResponse):
+    """
+    Returned in place of the CMS response when a write was journaled for later delivery
+    """
+    __slots__ = ("sequence",)
+
+    def __init__(self, sequence: int):
+        super().__init__(ApiResult())
+        self.sequence = sequence
+
+
+class WriteJournal:
+    """
+    The durable part of a WriteQueue: write requests in an SQLite file, in the order they were made.
+    Writes with the same key supersede each other, so only the last one is kept.
+    The journal holds account passwords, so the file is created readable by its owner only.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: SQLite database file, created if it doesn't exist
+        """
+        import sqlite3
+        self.path = path
+        if path != ":memory:" and not os.path.exists(path):
+            os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o600))
+        self._connection = sqlite3.connect(path)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS journal ("
+                " sequence INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " method TEXT NOT NULL,"
+                " endpoint TEXT NOT NULL,"
+                " params TEXT NOT NULL,"
+                " key TEXT UNIQUE,"
+                " queued_at REAL NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " last_error TEXT,"
+                " failures INTEGER NOT NULL DEFAULT 0)")
+            columns = [row[1] for row in self._connection.execute("PRAGMA table_info(journal)")]
+            if "failures" not in columns:
+                # Journal written by an older version
+                self._connection.execute("ALTER TABLE journal ADD COLUMN failures INTEGER NOT NULL DEFAULT 0")
+
+    def append(self, method: str, endpoint: str, params: Dict, key: str = None, queued_at: float = None) -> int:
+        """
+        Adds a write at the end of the journal, replacing any earlier write with the same key
+        :return: The sequence number of the write
+        """
+        with self._connection:
+            if key is not None:
+                self._connection.execute("DELETE FROM journal WHERE key = ?", (key,))
+            cursor = self._connection.execute(
+                "INSERT INTO journal (method, endpoint, params, key, queued_at) VALUES (?, ?, ?, ?, ?)",
+                (method, endpoint, json.dumps(params), key, time.time() if queued_at is None else queued_at))
+        return cursor.lastrowid
+
+    def pending(self, limit: int = None) -> List[QueuedWrite]:
+        """
+        Returns the waiting writes, oldest first
+        """
+        rows = self._connection.execute(
+            "SELECT sequence, method, endpoint, params, key, queued_at, attempts, last_error, failures FROM journal"
+            " ORDER BY sequence LIMIT ?", (-1 if limit is None else limit,)).fetchall()
+        return [QueuedWrite(row[0], row[1], row[2], json.loads(row[3]), *row[4:]) for row in rows]
+
+    def __len__(self):
+        return self._connection.execute("SELECT COUNT(*) FROM journal").fetchone()[0]
+
+    def remove(self, sequence: int):
+        with self._connection:
+            self._connection.execute("DELETE FROM journal WHERE sequence = ?", (sequence,))
+
+    def record_attempt(self, sequence: int, error: str, failed: bool = False):
+        """
+        :param failed: The CMS answered with a server error, rather than not being reachable
+        """
+        with self._connection:
+            self._connection.execute("UPDATE journal SET attempts = attempts + 1, last_error = ?,"
+                                     " failures = failures + ? WHERE sequence = ?", (error, int(failed), sequence))
+
+    def close(self):
+        self._connection.close()
+
+
+class WriteQueue:
+    """
+    Sends account and sysop changes through a durable journal when the CMS can't be reached.
+    A write made while the link is down (or while earlier writes are still waiting) is journaled
+    and answered with a QueuedResponse; flush() sends the journal in order once the link is back,
+    and start() does so periodically. Later writes to the same field of the same callsign
+    supersede earlier ones, so only the final value is sent.
+
+    Only connection errors, an open circuit and 502/503/504 responses count as the CMS being
+    unreachable. Other server errors are raised to the caller of a direct write; a journaled write
+    that keeps getting them is dropped after max_attempts, so it can't hold up the writes behind it.
+
+    Pass the queue to Account and Sysop as write_queue.
+    """
+
+    def __init__(self, cms_api: CmsApiAdapter, journal: WriteJournal, logger: logging.Logger = None,
+                 on_rejected: Callable[[QueuedWrite, ApiResult], None] = None, max_attempts: int = 5):
+        """
+        :param cms_api: Adapter used to send the writes
+        :param journal: Where waiting writes are kept, e.g. WriteJournal("writes.db")
+        :param logger: (optional)
+        :param on_rejected: (optional) Called with a journaled write and its result when the CMS rejects
+            it on replay. Rejected writes are dropped, since sending them again won't help.
+        :param max_attempts: Server errors after which a journaled write is dropped and reported to on_rejected,
+            with the error code ERROR_TOO_MANY_ATTEMPTS
+        """
+        self.cms_api = cms_api
+        self.journal = journal
+        self._logger = logger or logging.getLogger(__name__)
+        self._on_rejected = on_rejected
+        self.max_attempts = max_attempts
+        self._flush_lock = None
+        self._task = None
+
+    @staticmethod
+    def supersede_key(endpoint: str, params: Dict) -> str:
+        return f"{endpoint} {str(params['Callsign']).strip().upper()}"
+
+    async def submit(self, method: str, endpoint: str, params: Dict, supersede: bool = True) -> WebServiceResponse:
+        """
+        Sends the write now if nothing is waiting and the CMS is reachable, and journals it otherwise.
+        Transport errors other than the CMS being unreachable are raised.
+        :param method: 'GET' or 'POST'
+        :param supersede: Replace a waiting write to the same endpoint for the same callsign
+        :return: The CMS response, or a QueuedResponse if the write was journaled
+        """
+        key = self.supersede_key(endpoint, params) if supersede else None
+        if len(self.journal) == 0:
+            try:
+                return WebServiceResponse(await self._send(method, endpoint, dict(params)))
+            except CmsApiTransportError as e:
+                if not is_unreachable(e):
+                    raise
+                self._logger.warning(msg=f"CMS unreachable, journaling {method} {endpoint}: {e!r}")
+        sequence = self.journal.append(method, endpoint, params, key)
+        return QueuedResponse(sequence)
+
+    async def _send(self, method: str, endpoint: str, params: Dict) -> ApiResult:
+        try:
+            if method == 'GET':
+                return await self.cms_api.get(endpoint, params)
+            return await self.cms_api.post(endpoint, params)
+        finally:
+            # Every write changes the callsign's data, including GET writes to endpoints the adapter
+            # doesn't know to be mutating, so cached reads of it must not be served any longer
+            self.cms_api._invalidate(params)
+
+    async def flush(self) -> int:
+        """
+        Sends the journaled writes in order, stopping at the first one that couldn't be delivered
+        :return: The number of writes delivered (including any the CMS rejected or that were dropped)
+        """
+        import asyncio
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        delivered = 0
+        async with self._flush_lock:
+            for write in self.journal.pending():
+                try:
+                    result = await self._send(write.method, write.endpoint, dict(write.params))
+                except CmsApiTransportError as e:
+                    failed = not isinstance(e, DeadlineExceeded) and not is_unreachable(e)
+                    if failed and write.failures + 1 >= self.max_attempts:
+                        self.journal.remove(write.sequence)
+                        delivered += 1
+                        self._logger.warning(msg=f"dropping journaled {write.method} {write.endpoint} after "
+                                                 f"{write.failures + 1} server errors: {e!r}")
+                        if self._on_rejected is not None:
+                            self._on_rejected(write, ApiResult(ERROR_TOO_MANY_ATTEMPTS, repr(e)))
+                        continue
+                    self.journal.record_attempt(write.sequence, repr(e.__cause__ or e), failed)
+                    self._logger.info(msg=f"could not deliver journaled {write.method} {write.endpoint}, "
+                                          f"{len(self.journal)} writes waiting: {e!r}")
+                    break
+                # Removed by sequence, so a write that superseded this one while it was sent stays queued
+                self.journal.remove(write.sequence)
+                delivered += 1
+                if result.error_code:
+                    self._logger.warning(msg=f"CMS rejected journaled {write.method} {write.endpoint}: "
+                                             f"{result.error_code}: {result.error_message}")
+                    if self._on_rejected is not None:
+                        self._on_rejected(write, result)
+        return delivered
+
+    def start(self, interval: float = 30.0):
+        """
+        Flushes the journal every 'interval' seconds in a background task, until stop() is called
+        """
+        import asyncio
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run(interval))
+
+    async def _run(self, interval: float):
+        import asyncio
+        while True:
+            if len(self.journal):
+                try:
+                    await self.flush()
+                except Exception:
+                    self._logger.exception(msg="flushing the write journal failed")
+            await asyncio.sleep(interval)
+
+    async def stop(self):
+        import asyncio
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,10 @@
+class FakeClock:
+    """
+    A clock for the classes that take a clock argument; tests move time forward by setting now
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
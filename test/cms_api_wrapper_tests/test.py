@@ -1,6 +1,4 @@
-from src.cms_api_wrapper.models.account import *
-from src.cms_api_wrapper.models.sysop import *
-from src.cms_api_wrapper.models.inquiries import *
+from src.cms_api_wrapper import Account, CmsApiError, Inquires, Sysop
 
 import asyncio
 # import logging
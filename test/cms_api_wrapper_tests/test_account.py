@@ -0,0 +1,109 @@
+import asyncio
+import json
+from unittest import IsolatedAsyncioTestCase
+
+import httpx
+
+from src.cms_api_wrapper.cms_api_adapter import CmsApiError
+from src.cms_api_wrapper.models.account import *
+
+
+class FakeAccountService:
+    """
+    Answers account/exists/ requests: callsigns starting with 'W' exist, 'BAD' is a validation error
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls.append(request)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        callsign = request.url.params.get("Callsign", "")
+        if request.url.path.endswith("lockedOut/get"):
+            body = {"LockedOut": callsign.startswith("W"), "ResponseStatus": {}}
+            return httpx.Response(200, content=json.dumps(body).encode())
+        if request.url.path.endswith("lockedOutReason/get"):
+            body = {"Reason": "Too many bad passwords", "ResponseStatus": {}}
+            return httpx.Response(200, content=json.dumps(body).encode())
+        if callsign == "BAD":
+            body = {"ResponseStatus": {"ErrorCode": "InvalidCallsign", "Message": "Invalid callsign"}}
+            return httpx.Response(400, content=json.dumps(body).encode())
+        body = {"CallsignExists": callsign.startswith("W"), "ResponseStatus": {}}
+        return httpx.Response(200, content=json.dumps(body).encode())
+
+
+class TestAccountBatch(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.service = FakeAccountService(delay=0.01)
+        self.adapter = CmsApiAdapter("test-key", transport=httpx.MockTransport(self.service))
+        self.account = Account(cms_api=self.adapter)
+
+    async def asyncTearDown(self):
+        await self.adapter.aclose()
+
+    async def test_account_exists_many_maps_callsigns_to_responses(self):
+        results = await self.account.account_exists_many(["W1AW", "K1ABC"])
+        self.assertTrue(results["W1AW"].exists)
+        self.assertFalse(results["K1ABC"].exists)
+
+    async def test_account_exists_many_drops_duplicates(self):
+        results = await self.account.account_exists_many(["W1AW", "w1aw ", "W1AW"])
+        self.assertEqual(["W1AW"], list(results))
+        self.assertEqual(1, len(self.service.calls))
+
+    async def test_account_exists_many_keeps_going_after_an_error(self):
+        results = await self.account.account_exists_many(["BAD", "W1AW"])
+        self.assertIsInstance(results["BAD"], CmsApiError)
+        self.assertTrue(results["W1AW"].exists)
+
+    async def test_account_exists_many_limits_concurrency(self):
+        await self.account.account_exists_many([f"W{i}AW" for i in range(30)], concurrency=5)
+        self.assertEqual(30, len(self.service.calls))
+        self.assertLessEqual(self.service.max_in_flight, 5)
+
+
+class TestAccountLockedOut(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.service = FakeAccountService(delay=0.01)
+        self.adapter = CmsApiAdapter("test-key", transport=httpx.MockTransport(self.service))
+        self.account = Account(cms_api=self.adapter)
+
+    async def asyncTearDown(self):
+        await self.adapter.aclose()
+
+    async def test_sequential_mode_skips_reason_for_unlocked_account(self):
+        response = await self.account.get_locked_out("K1ABC")
+        self.assertFalse(response.is_locked_out)
+        self.assertEqual(1, len(self.service.calls))
+
+    async def test_concurrent_mode_sends_both_requests_at_once(self):
+        response = await self.account.get_locked_out("W1AW", concurrent=True)
+        self.assertTrue(response.is_locked_out)
+        self.assertEqual("Too many bad passwords", response.lockout_reason)
+        self.assertEqual(2, self.service.max_in_flight)
+
+    async def test_concurrent_mode_raises_when_reason_call_is_cancelled(self):
+        lookup = asyncio.ensure_future(self.account.get_locked_out("W1AW", concurrent=True))
+        reason = None
+        while reason is None:
+            await asyncio.sleep(0)
+            reason = next((task for key, task in self.adapter._in_flight.items()
+                           if key[0] == "account/lockedOutReason/get"), None)
+        # Cancel the shared request behind the reason call only
+        reason.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await lookup
+
+    async def test_concurrent_mode_ignores_reason_for_unlocked_account(self):
+        response = await self.account.get_locked_out("K1ABC", concurrent=True)
+        self.assertFalse(response.is_locked_out)
+        self.assertEqual("", response.lockout_reason)
@@ -0,0 +1,142 @@
+from unittest import IsolatedAsyncioTestCase, TestCase
+import asyncio
+
+import httpx
+
+from src.cms_api_wrapper.bandwidth import *
+from src.cms_api_wrapper.cache import ResponseCache
+from src.cms_api_wrapper.cms_api_adapter import CmsApiAdapter
+from src.cms_api_wrapper.models.inquiries import Inquires
+from src.cms_api_wrapper.ratelimit import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+from tools.cms_api_stub import StubCmsApi
+
+
+class TestCompression(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.api = StubCmsApi(catalog_size=500, compress=True)
+        self.api.populate(3)
+
+    def test_accept_encoding_lists_preferred_first(self):
+        self.assertEqual("zstd, br;q=0.9, gzip;q=0.8", accept_encoding(["zstd", "br", "gzip"]))
+        self.assertEqual("identity", accept_encoding([]))
+        self.assertEqual(["gzip"], supported_encodings(["gzip", "no-such-encoding"]))
+
+    def test_unknown_encoding_is_rejected(self):
+        with self.assertRaises(ValueError):
+            CmsApiAdapter("test-key", compression=["lzma"])
+
+    async def test_compressed_and_decompressed_bytes_are_counted(self):
+        async with CmsApiAdapter("test-key", transport=self.api.transport()) as adapter:
+            result = await adapter.get("inquiries/catalog/")
+            await adapter.get("account/exists/", {"Callsign": "ZZ1TST"})
+        self.assertEqual(500, len(result.data["Inquiries"]))
+        catalog = adapter.transfers.endpoints["inquiries/catalog/"]
+        self.assertEqual({"gzip": 1}, catalog.encodings)
+        self.assertEqual(result.size, catalog.content_bytes)
+        self.assertGreater(catalog.compression_ratio, 5)
+        self.assertEqual(2, sum(transfer["requests"] for transfer in adapter.transfers.dump().values()))
+        self.assertIn("inquiries/catalog/", adapter.transfers.format())
+
+    async def test_compression_can_be_turned_off(self):
+        async with CmsApiAdapter("test-key", transport=self.api.transport(), compression=False) as adapter:
+            await adapter.get("inquiries/catalog/")
+        catalog = adapter.transfers.endpoints["inquiries/catalog/"]
+        self.assertEqual(({"identity": 1}, 1.0), (catalog.encodings, catalog.compression_ratio))
+
+    async def test_streamed_bytes_are_counted(self):
+        async with CmsApiAdapter("test-key", transport=self.api.transport()) as adapter:
+            entries = [entry async for entry in Inquires(cms_api=adapter).iter_catalog()]
+        catalog = adapter.transfers.endpoints["inquiries/catalog/"]
+        self.assertEqual(500, len(entries))
+        self.assertEqual((0, catalog.wire_bytes), (catalog.content_bytes, catalog.streamed_wire_bytes))
+        self.assertGreater(catalog.wire_bytes, 0)
+
+
+class TestTransferSlots(IsolatedAsyncioTestCase):
+    async def test_background_transfers_leave_slots_for_interactive_ones(self):
+        slots = TransferSlots(2, 1)
+        await slots.acquire(PRIORITY_BACKGROUND)
+        background = asyncio.ensure_future(slots.acquire(PRIORITY_BACKGROUND))
+        await asyncio.sleep(0)
+        self.assertFalse(background.done())
+        await slots.acquire(PRIORITY_INTERACTIVE)
+        self.assertEqual(2, slots.active)
+
+        slots.release(PRIORITY_INTERACTIVE)
+        await asyncio.sleep(0)
+        self.assertFalse(background.done())
+        slots.release(PRIORITY_BACKGROUND)
+        await background
+        self.assertEqual((1, 1), (slots.active, slots.background_active))
+
+    async def test_waiters_are_served_by_priority(self):
+        slots = TransferSlots(1, 1)
+        await slots.acquire(PRIORITY_INTERACTIVE)
+        order = []
+
+        async def transfer(priority: int):
+            await slots.acquire(priority)
+            order.append(priority)
+            slots.release(priority)
+
+        waiters = [asyncio.ensure_future(transfer(priority)) for priority in (2, 1, 0)]
+        await asyncio.sleep(0)
+        slots.release(PRIORITY_INTERACTIVE)
+        await asyncio.gather(*waiters)
+        self.assertEqual([0, 1, 2], order)
+        self.assertEqual(0, slots.active)
+
+    async def test_cancelled_waiter_gives_up_its_place(self):
+        slots = TransferSlots(1, 1)
+        await slots.acquire(PRIORITY_INTERACTIVE)
+        waiter = asyncio.ensure_future(slots.acquire(PRIORITY_INTERACTIVE))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        slots.release(PRIORITY_INTERACTIVE)
+        self.assertEqual((0, 0), (slots.active, slots.queued))
+
+
+class TestLowBandwidthProfile(IsolatedAsyncioTestCase):
+    async def test_cached_results_are_kept_longer(self):
+        now = [0.0]
+        api = StubCmsApi()
+        api.populate(1)
+        adapter = CmsApiAdapter("test-key", transport=api.transport(), low_bandwidth=LowBandwidthProfile(),
+                                cache=ResponseCache(clock=lambda: now[0]))
+        await adapter.get("account/exists/", {"Callsign": "ZZ0TST"})
+        now[0] = 900.0  # Three times the 300 second TTL
+        await adapter.get("account/exists/", {"Callsign": "ZZ0TST"})
+        self.assertEqual(1, api.total_requests)
+        now[0] = 1300.0
+        await adapter.get("account/exists/", {"Callsign": "ZZ0TST"})
+        self.assertEqual(2, api.total_requests)
+        await adapter.aclose()
+
+    async def test_transfers_are_limited(self):
+        in_flight = []
+        peak = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            in_flight.append(request)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.remove(request)
+            return httpx.Response(200, content=b'{"CallsignExists":true,"ResponseStatus":{}}')
+
+        adapter = CmsApiAdapter("test-key", transport=httpx.MockTransport(handler), coalesce=False,
+                                low_bandwidth=LowBandwidthProfile(max_transfers=2, cache_ttl_factor=1))
+        self.assertIsNotNone(adapter.cache)
+        await asyncio.gather(*(adapter.get("account/exists/", {"Callsign": f"W{i}AW"}) for i in range(6)))
+        self.assertEqual(2, max(peak))
+        await adapter.aclose()
+
+
+class TestResponseCacheTtlFactor(TestCase):
+    def test_expired_entry_is_returned_within_factor(self):
+        now = [0.0]
+        cache = ResponseCache(ttls={"a": 10.0}, clock=lambda: now[0])
+        cache.put(("a", ()), "result")
+        now[0] = 15.0
+        self.assertEqual("result", cache.get(("a", ()), ttl_factor=2))
+        self.assertIsNone(cache.get(("a", ())))
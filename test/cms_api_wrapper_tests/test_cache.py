@@ -0,0 +1,138 @@
+import asyncio
+import json
+from unittest import TestCase, IsolatedAsyncioTestCase
+
+import httpx
+
+from src.cms_api_wrapper.cache import *
+from src.cms_api_wrapper.models.account import *
+
+from .helpers import FakeClock
+
+
+class TestMakeKey(TestCase):
+    def test_key_ignores_api_key_and_param_order(self):
+        key1 = make_key("account/exists/", {"Callsign": "w1aw", "key": "a", "format": "json"})
+        key2 = make_key("account/exists/", {"key": "b", "Callsign": "W1AW"})
+        self.assertEqual(key1, key2)
+
+    def test_key_does_not_contain_password(self):
+        key = make_key("sysop2/get", {"Callsign": "W1AW", "Password": "secret"})
+        self.assertNotIn("secret", repr(key))
+        self.assertNotEqual(key, make_key("sysop2/get", {"Callsign": "W1AW", "Password": "other"}))
+
+
+class TestResponseCache(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = ResponseCache(ttls={"account/exists/": 10}, max_entries=2, clock=self.clock)
+
+    def test_entries_expire_after_ttl(self):
+        key = make_key("account/exists/", {"Callsign": "W1AW"})
+        self.cache.put(key, ApiResult())
+        self.assertIsNotNone(self.cache.get(key))
+        self.clock.now = 11
+        self.assertIsNone(self.cache.get(key))
+        self.assertEqual((1, 1), (self.cache.hits, self.cache.misses))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        keys = [make_key("account/exists/", {"Callsign": c}) for c in ("A1A", "B1B", "C1C")]
+        self.cache.put(keys[0], ApiResult())
+        self.cache.put(keys[1], ApiResult())
+        self.cache.get(keys[0])
+        self.cache.put(keys[2], ApiResult())
+        self.assertIsNotNone(self.cache.get(keys[0]))
+        self.assertIsNone(self.cache.get(keys[1]))
+        self.assertEqual(1, self.cache.evictions)
+
+    def test_byte_bound_is_enforced(self):
+        cache = ResponseCache(ttls={"account/exists/": 10}, max_bytes=100)
+        for callsign in ("A1A", "B1B", "C1C"):
+            cache.put(make_key("account/exists/", {"Callsign": callsign}), ApiResult(), size=40)
+        self.assertEqual(2, len(cache))
+        self.assertEqual(80, cache.size_bytes)
+
+    def test_endpoints_without_ttl_are_not_cached(self):
+        key = make_key("account/lockedOut/get", {"Callsign": "W1AW"})
+        self.cache.put(key, ApiResult())
+        self.assertEqual(0, len(self.cache))
+
+    def test_invalidation_during_read_stops_put(self):
+        key = make_key("account/exists/", {"Callsign": "W1AW"})
+        generation = self.cache.start_read(key)
+        self.cache.invalidate_callsign("w1aw")
+        self.cache.put(key, ApiResult(), generation=generation)
+        self.cache.finish_read(key)
+        self.assertEqual(0, len(self.cache))
+        for i in range(100):
+            self.cache.invalidate_callsign(f"ZZ{i}TST")
+        self.assertEqual({}, self.cache._reads)
+
+
+class TestAdapterCache(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.requests = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.requests.append(request)
+            body = {"CallsignExists": True, "MaxMessageSize": 120, "ResponseStatus": {}}
+            return httpx.Response(200, content=json.dumps(body).encode())
+
+        self.cache = ResponseCache()
+        self.adapter = CmsApiAdapter("test-key", transport=httpx.MockTransport(handler), cache=self.cache)
+        self.account = Account(cms_api=self.adapter)
+
+    async def asyncTearDown(self):
+        await self.adapter.aclose()
+
+    async def test_repeated_reads_are_served_from_cache(self):
+        await self.account.account_exists("W1AW")
+        await self.account.account_exists("W1AW")
+        self.assertEqual(1, len(self.requests))
+        self.assertEqual(1, self.cache.hits)
+
+    async def test_write_invalidates_cached_reads_for_callsign(self):
+        await self.account.get_max_message_size("W1AW")
+        await self.account.set_max_message_size("W1AW", 100)
+        await self.account.get_max_message_size("W1AW")
+        self.assertEqual(3, len(self.requests))
+
+
+class TestAdapterCacheRace(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.size = 100
+        self.requests = 0
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            self.requests += 1
+            if request.method == "POST":
+                self.size = json.loads(request.content)["MaxMessageSize"]
+                return httpx.Response(200, content=b'{"ResponseStatus":{}}')
+            size = self.size
+            await asyncio.sleep(0.05)  # The write overtakes this read
+            return httpx.Response(200, content=json.dumps({"MaxMessageSize": size, "ResponseStatus": {}}).encode())
+
+        self.cache = ResponseCache()
+        self.adapter = CmsApiAdapter("test-key", transport=httpx.MockTransport(handler), cache=self.cache)
+        self.account = Account(cms_api=self.adapter)
+
+    async def asyncTearDown(self):
+        await self.adapter.aclose()
+
+    async def test_read_in_flight_during_write_is_not_cached(self):
+        read = asyncio.ensure_future(self.account.get_max_message_size("W1AW"))
+        await asyncio.sleep(0.01)
+        await self.account.set_max_message_size("W1AW", 50)
+        self.assertEqual(100, (await read).max_message_size)
+        self.assertEqual(50, (await self.account.get_max_message_size("W1AW")).max_message_size)
+        self.assertEqual(3, self.requests)
+        # Nothing is kept per callsign once no read is in progress
+        self.assertEqual({}, self.cache._reads)
+
+    async def test_read_after_write_does_not_join_older_read(self):
+        read = asyncio.ensure_future(self.account.get_max_message_size("W1AW"))
+        await asyncio.sleep(0.01)
+        await self.account.set_max_message_size("W1AW", 50)
+        later = await self.account.get_max_message_size("W1AW")
+        self.assertEqual((100, 50), ((await read).max_message_size, later.max_message_size))
+        self.assertEqual({}, self.adapter._in_flight)
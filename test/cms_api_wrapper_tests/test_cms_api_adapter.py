@@ -1,64 +1,180 @@
-from unittest import TestCase, mock
+from unittest import IsolatedAsyncioTestCase
 import os
 import asyncio
+import json
 
+import httpx
 from dotenv import load_dotenv
 
 from src.cms_api_wrapper.cms_api_adapter import *
 
-# TODO: Resolve test warnings and verify that tests are working properly
 
-
-class TestCmsApiAdapter(TestCase):
+class TestCmsApiAdapter(IsolatedAsyncioTestCase):
     def setUp(self):
         load_dotenv()
         api_key = os.getenv("API_KEY")
         hostname = "cms-z.winlink.org"
-        self.api_adapter = CmsApiAdapter(api_key, hostname)
-        self.response = httpx.Response(200)
-        self.test_loop = asyncio.new_event_loop()
+        self.status_code = 200
+        self.content = b""
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(self.status_code, content=self.content)
 
-    def tearDown(self) -> None:
-        self.test_loop.close()
+        self.api_adapter = CmsApiAdapter(api_key, hostname, transport=httpx.MockTransport(handler),
+                                         retry_policy=RetryPolicy(max_attempts=1))
+
+    async def asyncTearDown(self):
+        await self.api_adapter.aclose()
 
     async def test__do_good_request_returns_result(self):
-        self.response.status_code = 200
-        self.response._content = '{"ResponseStatus":{}}'.encode()
-        with mock.patch("httpx.request", return_value=self.response):
-            result = await self.api_adapter._do('GET', '')
-            self.assertIsInstance(result, ApiResult)
+        self.status_code = 200
+        self.content = '{"ResponseStatus":{}}'.encode()
+        result = await self.api_adapter._do('GET', '')
+        self.assertIsInstance(result, ApiResult)
 
     async def test__do_300_or_higher_raises_cms_api_exception(self):
-        self.response.status_code = 300
-        self.response._content = '{"ResponseStatus":{}}'.encode()
-        with mock.patch("httpx.request", return_value=self.response):
-            with self.assertRaises(Exception):
-                await self.api_adapter._do('GET', '')
+        self.status_code = 300
+        self.content = '{"ResponseStatus":{}}'.encode()
+        with self.assertRaises(Exception):
+            await self.api_adapter._do('GET', '')
 
     async def test__do_199_or_lower_raises_cms_api_exception(self):
-        self.response.status_code = 199
-        self.response._content = '{"ResponseStatus":{}}'.encode()
-        with mock.patch("httpx.request", return_value=self.response):
-            with self.assertRaises(Exception):
-                await self.api_adapter._do('GET', '')
+        self.status_code = 199
+        self.content = '{"ResponseStatus":{}}'.encode()
+        with self.assertRaises(Exception):
+            await self.api_adapter._do('GET', '')
 
     async def test__do_bad_json_raises_type_error_exception(self):
         bad_json = '{"some bad json": '
-        self.response._content = bad_json
-        with mock.patch("httpx.request", return_value=self.response):
-            with self.assertRaises(Exception):
-                await self.api_adapter._do('GET', '')
+        self.content = bad_json.encode()
+        with self.assertRaises(Exception):
+            await self.api_adapter._do('GET', '')
 
     async def test_get_good_request_returns_result(self):
-        self.response.status_code = 200
-        self.response._content = '{"ResponseStatus":{}}'.encode()
-        with mock.patch("httpx.request", return_value=self.response):
-            result = await self.api_adapter.get("")
-            self.assertIsInstance(result, ApiResult)
+        self.status_code = 200
+        self.content = '{"ResponseStatus":{}}'.encode()
+        result = await self.api_adapter.get("")
+        self.assertIsInstance(result, ApiResult)
 
     async def test_post_good_request_returns_result(self):
-        self.response.status_code = 200
-        self.response._content = '{"ResponseStatus":{}}'.encode()
-        with mock.patch("httpx.request", return_value=self.response):
-            result = await self.api_adapter.post("fake/endpoint/")
-            self.assertIsInstance(result, ApiResult)
+        self.status_code = 200
+        self.content = '{"ResponseStatus":{}}'.encode()
+        result = await self.api_adapter.post("fake/endpoint/")
+        self.assertIsInstance(result, ApiResult)
+
+
+def json_transport(handler_log: list, body: str = '{"ResponseStatus":{}}', status_code: int = 200):
+    """
+    Returns a mock transport that records each request and answers with a fixed body
+    """
+    def handler(request: httpx.Request) -> httpx.Response:
+        handler_log.append(request)
+        return httpx.Response(status_code, content=body.encode())
+    return httpx.MockTransport(handler)
+
+
+class TestCmsApiAdapterConnectionPool(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.requests = []
+        self.api_adapter = CmsApiAdapter("test-key", "cms-z.winlink.org", transport=json_transport(self.requests))
+
+    async def asyncTearDown(self):
+        await self.api_adapter.aclose()
+
+    async def test_requests_share_one_client(self):
+        await self.api_adapter.get("account/exists/", {"Callsign": "W1AW"})
+        client = self.api_adapter._client
+        await self.api_adapter.get("account/exists/", {"Callsign": "W1AW"})
+        self.assertIs(client, self.api_adapter._client)
+        self.assertEqual(2, len(self.requests))
+
+    async def test_aclose_releases_client_and_allows_reuse(self):
+        await self.api_adapter.get("account/exists/")
+        await self.api_adapter.aclose()
+        self.assertIsNone(self.api_adapter._client)
+        result = await self.api_adapter.get("account/exists/")
+        self.assertIsInstance(result, ApiResult)
+
+    async def test_context_manager_closes_client(self):
+        async with self.api_adapter as adapter:
+            await adapter.get("account/exists/")
+            client = adapter._client
+        self.assertTrue(client.is_closed)
+
+
+class TestCmsApiAdapterCoalescing(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.requests = []
+        self.status_code = 200
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            self.requests.append(request)
+            await asyncio.sleep(0.01)
+            return httpx.Response(self.status_code, content=b'{"CallsignExists":true,"ResponseStatus":{}}')
+
+        self.api_adapter = CmsApiAdapter("test-key", transport=httpx.MockTransport(handler))
+
+    async def asyncTearDown(self):
+        await self.api_adapter.aclose()
+
+    async def test_identical_concurrent_gets_share_one_request(self):
+        results = await asyncio.gather(*(self.api_adapter.get("account/exists/", {"Callsign": "W1AW"})
+                                         for _ in range(10)))
+        self.assertEqual(1, len(self.requests))
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual({}, self.api_adapter._in_flight)
+
+    async def test_different_params_are_not_coalesced(self):
+        await asyncio.gather(self.api_adapter.get("account/exists/", {"Callsign": "W1AW"}),
+                             self.api_adapter.get("account/exists/", {"Callsign": "K1ABC"}))
+        self.assertEqual(2, len(self.requests))
+
+    async def test_error_is_raised_in_every_waiter(self):
+        self.status_code = 500
+        results = await asyncio.gather(*(self.api_adapter.get("account/exists/", {"Callsign": "W1AW"})
+                                         for _ in range(3)), return_exceptions=True)
+        self.assertEqual(1, len(self.requests))
+        self.assertTrue(all(isinstance(result, Exception) for result in results))
+
+    async def test_mutating_gets_are_not_coalesced(self):
+        params = {"Callsign": "W1AW", "MaxMessageSize": 100}
+        await asyncio.gather(self.api_adapter.get("account/maxMessageSize/set", dict(params)),
+                             self.api_adapter.get("account/maxMessageSize/set", dict(params)))
+        self.assertEqual(2, len(self.requests))
+
+
+class TestCmsApiAdapterDecoder(IsolatedAsyncioTestCase):
+    async def test_validation_error_is_decoded_from_bytes(self):
+        body = '{"ResponseStatus":{"ErrorCode":"InvalidCallsign","Message":"Bad callsign"}}'
+        adapter = CmsApiAdapter("test-key", transport=json_transport([], body, 400), decoder="json")
+        result = await adapter.get("account/exists/")
+        self.assertEqual(("InvalidCallsign", "Bad callsign"), (result.error_code, result.error_message))
+        await adapter.aclose()
+
+    async def test_bad_json_raises_exception(self):
+        adapter = CmsApiAdapter("test-key", transport=json_transport([], '{"some bad json": '), decoder="json")
+        with self.assertRaises(Exception):
+            await adapter.get("account/exists/")
+        await adapter.aclose()
+
+
+class TestCmsApiAdapterRequestBody(IsolatedAsyncioTestCase):
+    async def test_post_params_go_in_the_body(self):
+        requests = []
+        async with CmsApiAdapter("test-key", transport=json_transport(requests)) as api_adapter:
+            await api_adapter.post("account/password/validate/", {"Callsign": "W1AW", "Password": "secret"})
+            await api_adapter.get("account/exists/", {"Callsign": "W1AW"})
+        self.assertNotIn("secret", str(requests[0].url))
+        self.assertEqual({"Callsign": "W1AW", "Password": "secret"}, json.loads(requests[0].content))
+        self.assertEqual("test-key", requests[0].url.params["key"])
+        self.assertEqual("W1AW", requests[1].url.params["Callsign"])
+
+    async def test_form_body_and_per_endpoint_placement(self):
+        requests = []
+        async with CmsApiAdapter("test-key", transport=json_transport(requests), body_format="form",
+                                 param_placement={"account/password/send": "query"}) as api_adapter:
+            await api_adapter.post("account/alternateEmail/set", {"Callsign": "W1AW", "AlternateEmail": "a@b.c"})
+            await api_adapter.post("account/password/send", {"Callsign": "W1AW"})
+        self.assertEqual(b"Callsign=W1AW&AlternateEmail=a%40b.c", requests[0].content)
+        self.assertEqual("W1AW", requests[1].url.params["Callsign"])
+        self.assertEqual(b"", requests[1].content)
@@ -0,0 +1,73 @@
+from unittest import IsolatedAsyncioTestCase
+
+from src.cms_api_wrapper.cms_api_adapter import CmsApiError, CmsApiTransportError
+from src.cms_api_wrapper.models.account import *
+from src.cms_api_wrapper.models.inquiries import Inquires
+from src.cms_api_wrapper.models.sysop import Sysop
+from src.cms_api_wrapper.resilience import RetryPolicy
+from tools.cms_api_stub import StubCmsApi, StubCmsServer
+
+
+class TestStubCmsServer(IsolatedAsyncioTestCase):
+    """
+    Runs the models against the local CMS API stand-in over a real socket
+    """
+
+    async def asyncSetUp(self):
+        self.api = StubCmsApi(catalog_size=25)
+        self.api.add_account("ZZ0TST", "CTCH22", with_sysop=True)
+        self.api.add_account("ZZ1TST", "CTCH22", locked_out=True)
+        self.server = StubCmsServer(self.api)
+        await self.server.start()
+        self.adapter = CmsApiAdapter("test-key", self.server.hostname, scheme="http",
+                                     retry_policy=RetryPolicy(base_delay=0))
+        self.account = Account(cms_api=self.adapter)
+
+    async def asyncTearDown(self):
+        await self.adapter.aclose()
+        await self.server.stop()
+
+    async def test_account_calls(self):
+        self.assertTrue((await self.account.account_exists("ZZ0TST")).exists)
+        self.assertFalse((await self.account.account_exists("DU0MMY")).exists)
+        self.assertTrue((await self.account.validate_password("ZZ0TST", "CTCH22")).is_valid)
+        locked_out = await self.account.get_locked_out("ZZ1TST")
+        self.assertEqual((True, "Locked by stub"), (locked_out.is_locked_out, locked_out.lockout_reason))
+        with self.assertRaises(CmsApiError):
+            await self.account.add_callsign_account("ZZ0TST", "CTCH22")
+
+    async def test_sysop_and_catalog_calls(self):
+        sysop = await Sysop(cms_api=self.adapter).sysop_get("ZZ0TST", "CTCH22")
+        self.assertEqual("ZZ0TST", sysop.sysop_record.callsign)
+        self.assertIsNone((await Sysop(cms_api=self.adapter).sysop_get("ZZ1TST", "CTCH22")).sysop_record)
+        catalog = await Inquires(cms_api=self.adapter).catalog_get()
+        self.assertEqual(25, len(catalog.inquiries))
+
+    async def test_connection_is_kept_alive(self):
+        for _ in range(5):
+            await self.account.account_exists("ZZ0TST")
+        self.assertEqual(1, self.server.connections)
+
+    async def test_injected_errors_are_retried(self):
+        self.api.error_rate = 1.0
+        with self.assertRaises(CmsApiTransportError):
+            await self.account.account_exists("ZZ0TST")
+        self.assertEqual(3, self.api.request_counts["account/exists/"])
+
+    async def test_bulk_updates_share_one_connection(self):
+        callsigns = self.api.populate(20)
+        results = await Sysop(cms_api=self.adapter).sysop_add_many(
+            [{"callsign": callsign, "password": "PASSWORD", "sysop_name": f"Op {callsign}", "grid_square": "FN31",
+              "email": "op@example.com"} for callsign in callsigns], concurrency=1)
+        self.assertFalse([result for result in results.values() if isinstance(result, Exception)])
+        self.assertEqual("Op ZZ7TST", self.api.accounts["ZZ7TST"].sysop["SysopName"])
+
+        records = [{"callsign": callsign, "password": "PASSWORD", "forwarding_address": "fwd@example.com",
+                    "max_message_size": 60} for callsign in callsigns]
+        records[3]["password"] = "wrong"
+        results = await self.account.set_settings_many(records, concurrency=1)
+        self.assertIsInstance(results["ZZ3TST"], CmsApiError)
+        self.assertEqual({"forwarding_address", "max_message_size"}, set(results["ZZ4TST"]))
+        self.assertEqual((60, "fwd@example.com"),
+                         (self.api.accounts["ZZ4TST"].max_message_size, self.api.accounts["ZZ4TST"].alternate_email))
+        self.assertEqual(1, self.server.connections)
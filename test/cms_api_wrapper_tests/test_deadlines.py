@@ -0,0 +1,113 @@
+from unittest import IsolatedAsyncioTestCase
+import asyncio
+
+import httpx
+
+from src.cms_api_wrapper.cms_api_adapter import CmsApiAdapter, DeadlineExceeded
+from src.cms_api_wrapper.deadlines import deadline_scope, remaining, run_with_deadline
+from src.cms_api_wrapper.hedging import HedgingPolicy
+from src.cms_api_wrapper.models.account import Account
+
+
+class TestDeadlines(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.requests = []
+        self.delays = []
+        self.cancelled = 0
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            self.requests.append(request)
+            try:
+                await asyncio.sleep(self.delays.pop(0) if self.delays else 0)
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+            return httpx.Response(200, content=b'{"CallsignExists":true,"ResponseStatus":{}}')
+
+        self.transport = httpx.MockTransport(handler)
+        self.api_adapter = CmsApiAdapter("test-key", transport=self.transport, coalesce=False)
+        self.account = Account(cms_api=self.api_adapter)
+
+    async def asyncTearDown(self):
+        await self.api_adapter.aclose()
+
+    def test_nested_scope_keeps_nearer_deadline(self):
+        self.assertIsNone(remaining())
+        with deadline_scope(1.0):
+            with deadline_scope(60.0) as budget:
+                self.assertLessEqual(budget, 1.0)
+            with deadline_scope(0.5) as budget:
+                self.assertLessEqual(budget, 0.5)
+        self.assertIsNone(remaining())
+
+    async def test_call_is_cancelled_when_deadline_passes(self):
+        self.delays = [1.0]
+        with self.assertRaises(DeadlineExceeded):
+            await self.account.account_exists("W1AW", deadline=0.05)
+        self.assertEqual(1, self.cancelled)
+
+    async def test_call_within_deadline_succeeds(self):
+        response = await self.account.account_exists("W1AW", deadline=1.0)
+        self.assertTrue(response.exists)
+
+    async def test_expired_deadline_sends_nothing(self):
+        with self.assertRaises(DeadlineExceeded):
+            await run_with_deadline(self.account.account_exists("W1AW"), 0)
+        self.assertEqual([], self.requests)
+
+    async def test_request_timeout_is_capped_by_deadline(self):
+        with deadline_scope(0.5):
+            await self.api_adapter.get("account/exists/", {"Callsign": "W1AW"})
+        self.assertLessEqual(self.requests[0].extensions["timeout"]["read"], 0.5)
+
+    async def test_coalesced_request_outlives_caller_deadline(self):
+        self.delays = [0.1]
+        params = {"Callsign": "W1AW"}
+        adapter = CmsApiAdapter("test-key", transport=self.transport)
+        results = await asyncio.gather(run_with_deadline(adapter.get("account/exists/", params), 0.02),
+                                       adapter.get("account/exists/", params), return_exceptions=True)
+        await adapter.aclose()
+        self.assertIsInstance(results[0], DeadlineExceeded)
+        self.assertNotIsInstance(results[1], Exception)
+        self.assertEqual(1, len(self.requests))
+        self.assertEqual(0, self.cancelled)
+
+
+class TestHedging(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.delays = []
+        self.requests = 0
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            self.requests += 1
+            await asyncio.sleep(self.delays.pop(0) if self.delays else 0.01)
+            return httpx.Response(200, content=b'{"CallsignExists":true,"ResponseStatus":{}}')
+
+        self.hedging = HedgingPolicy(min_samples=5, max_ratio=0.5)
+        self.api_adapter = CmsApiAdapter("test-key", transport=httpx.MockTransport(handler), coalesce=False,
+                                         hedging=self.hedging)
+
+    async def asyncTearDown(self):
+        await self.api_adapter.aclose()
+
+    async def test_slow_request_is_hedged(self):
+        for _ in range(5):
+            await self.api_adapter.get("account/exists/", {"Callsign": "W1AW"})
+        self.assertIsNotNone(self.hedging.threshold("account/exists/"))
+        self.assertEqual(0, self.hedging.hedged)
+
+        self.delays = [1.0]
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await self.api_adapter.get("account/exists/", {"Callsign": "W1AW"})
+        self.assertLess(loop.time() - start, 0.5)
+        self.assertEqual((1, 1), (self.hedging.hedged, self.hedging.hedge_wins))
+        self.assertEqual(7, self.requests)
+
+    async def test_hedges_are_capped(self):
+        self.hedging.max_ratio = 0.0
+        for _ in range(5):
+            await self.api_adapter.get("account/exists/", {"Callsign": "W1AW"})
+        self.delays = [0.1]
+        await self.api_adapter.get("account/exists/", {"Callsign": "W1AW"})
+        self.assertEqual((0, 6), (self.hedging.hedged, self.requests))
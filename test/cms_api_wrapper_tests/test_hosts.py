@@ -0,0 +1,96 @@
+from unittest import TestCase, IsolatedAsyncioTestCase
+
+import httpx
+
+from src.cms_api_wrapper.cms_api_adapter import CircuitOpenError, CmsApiAdapter, CmsApiTransportError
+from src.cms_api_wrapper.hosts import *
+from src.cms_api_wrapper.resilience import RetryPolicy
+
+from .helpers import FakeClock
+
+
+class TestHostSelector(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.selector = HostSelector(["eu", "us", "ap"], self.make_breaker, probe_interval=60, clock=self.clock)
+
+    def make_breaker(self, host: str) -> CircuitBreaker:
+        return CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=self.clock)
+
+    def use(self, latencies: dict):
+        for _ in range(len(latencies)):
+            health = self.selector.choose()
+            self.selector.record_success(health, latencies[health.host])
+
+    def test_unmeasured_hosts_are_tried_then_fastest_is_used(self):
+        self.use({"eu": 0.2, "us": 0.05, "ap": 0.4})
+        self.assertEqual("us", self.selector.choose().host)
+
+    def test_errors_count_against_a_host(self):
+        self.use({"eu": 0.08, "us": 0.05, "ap": 0.4})
+        self.selector.record_failure(self.selector.hosts["us"])
+        self.assertEqual("eu", self.selector.choose().host)
+
+    def test_avoided_hosts_are_a_last_resort(self):
+        self.use({"eu": 0.2, "us": 0.05, "ap": 0.4})
+        self.assertEqual("eu", self.selector.choose(avoid={"us"}).host)
+        self.assertEqual("us", self.selector.choose(avoid={"eu", "us", "ap"}).host)
+
+    def test_recovered_host_is_probed_when_half_open(self):
+        self.use({"eu": 0.2, "us": 0.05, "ap": 0.4})
+        us = self.selector.hosts["us"]
+        self.selector.record_failure(us)
+        self.selector.record_failure(us)
+        self.assertEqual(CircuitBreaker.OPEN, us.breaker.state)
+        self.assertNotEqual("us", self.selector.choose().host)
+
+        self.clock.now = 11
+        self.assertIs(us, self.selector.choose())
+        self.selector.record_success(us, 0.05)
+        self.assertEqual(CircuitBreaker.CLOSED, us.breaker.state)
+
+    def test_idle_host_is_measured_again(self):
+        self.use({"eu": 0.2, "us": 0.05, "ap": 0.4})
+        self.clock.now = 30
+        self.assertEqual("us", self.selector.choose().host)
+        self.clock.now = 61
+        self.assertEqual("eu", self.selector.choose().host)
+
+    def test_no_host_when_all_circuits_open(self):
+        for health in self.selector.hosts.values():
+            self.selector.record_failure(health)
+            self.selector.record_failure(health)
+        self.assertIsNone(self.selector.choose())
+
+
+class TestCmsApiAdapterFailover(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.down = {"cms-a.example"}
+        self.requests = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.requests.append(request.url.host)
+            if request.url.host in self.down:
+                raise httpx.ConnectError("connection refused")
+            return httpx.Response(200, content=b'{"ResponseStatus":{}}')
+
+        self.adapter = CmsApiAdapter("test-key", ["cms-a.example", "cms-b.example"], failure_threshold=2,
+                                     transport=httpx.MockTransport(handler), retry_policy=RetryPolicy(max_attempts=1))
+
+    async def asyncTearDown(self):
+        await self.adapter.aclose()
+
+    async def test_connection_error_fails_over_for_any_request(self):
+        await self.adapter.post("account/add", {"Callsign": "W1AW"})
+        self.assertEqual(["cms-a.example", "cms-b.example"], self.requests)
+        await self.adapter.get("account/exists/", {"Callsign": "W1AW"})
+        self.assertEqual("cms-b.example", self.requests[-1])
+
+    async def test_all_hosts_down_raises(self):
+        self.down = {"cms-a.example", "cms-b.example"}
+        with self.assertRaises(CmsApiTransportError):
+            await self.adapter.get("account/exists/", {"Callsign": "W1AW"})
+        with self.assertRaises(CmsApiTransportError):
+            await self.adapter.get("account/exists/", {"Callsign": "W1AW"})
+        with self.assertRaises(CircuitOpenError):
+            await self.adapter.get("account/exists/", {"Callsign": "W1AW"})
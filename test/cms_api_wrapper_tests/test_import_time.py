@@ -0,0 +1,15 @@
+from unittest import TestCase, skipUnless
+import os
+
+from tools.benchmarks.import_time import IMPORT_BUDGET_MS, loaded_modules, measure
+
+
+class TestImportTime(TestCase):
+    def test_httpx_and_asyncio_are_not_loaded_on_import(self):
+        self.assertEqual([], loaded_modules())
+
+    # Wall-clock timing depends on the machine, so it only runs when benchmarks are asked for
+    @skipUnless(os.environ.get("CMS_API_BENCHMARKS"), "set CMS_API_BENCHMARKS=1 to run timing benchmarks")
+    def test_import_is_within_budget(self):
+        result = measure(runs=3)
+        self.assertLess(result["total_ms"], IMPORT_BUDGET_MS)
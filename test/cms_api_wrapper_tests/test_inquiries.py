@@ -0,0 +1,193 @@
+import json
+import os
+import tempfile
+from unittest import TestCase, IsolatedAsyncioTestCase
+
+import httpx
+
+from src.cms_api_wrapper.catalog_store import CatalogStore
+from src.cms_api_wrapper.cms_api_adapter import CmsApiError
+from src.cms_api_wrapper.models.catalog_index import CatalogIndex
+from src.cms_api_wrapper.models.inquiries import *
+
+
+def make_catalog(count: int) -> dict:
+    categories = ["WX", "NEWS", "GOV", "PROP"]
+    return {"Inquiries": [{"Category": categories[i % len(categories)], "InquiryId": f"INQ{i}",
+                           "Subject": f"{categories[i % len(categories)]} bulletin {i}",
+                           "SizeEstimate": 1000 + (i * 37) % 20000} for i in range(count)],
+            "ResponseStatus": {}}
+
+
+class TestInquiresCatalog(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.catalog = make_catalog(10)
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, content=json.dumps(self.catalog).encode())
+
+        self.adapter = CmsApiAdapter("test-key", transport=httpx.MockTransport(handler), decoder="json")
+        self.inquiries = Inquires(cms_api=self.adapter)
+
+    async def asyncTearDown(self):
+        await self.adapter.aclose()
+
+    async def test_catalog_records_are_built_on_first_access(self):
+        response = await self.inquiries.catalog_get()
+        self.assertFalse(hasattr(response, "_inquiries"))
+        self.assertEqual(10, len(response.inquiries))
+        self.assertEqual("INQ3", response.inquiries[3].inquiry_id)
+        self.assertIs(response.inquiries, response.inquiries)
+
+    async def test_raw_payload_is_released_unless_requested(self):
+        response = await self.inquiries.catalog_get()
+        response.inquiries
+        self.assertIsNone(response.raw_data)
+        self.assertIsNone(response._result)
+
+        response = await self.inquiries.catalog_get(keep_raw=True)
+        response.inquiries
+        self.assertEqual(self.catalog["Inquiries"], response.raw_data["Inquiries"])
+
+    async def test_records_are_immutable(self):
+        response = await self.inquiries.catalog_get()
+        with self.assertRaises(AttributeError):
+            response.inquiries[0].subject = "changed"
+
+
+class TestInquiresCatalogStore(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.catalog = make_catalog(5)
+        self.requests = []
+        self.etag = '"v1"'
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.store = CatalogStore(os.path.join(temp_dir.name, "catalog.db"))
+        self.addCleanup(self.store.close)
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.requests.append(request)
+            if self.etag and request.headers.get("If-None-Match") == self.etag:
+                return httpx.Response(304)
+            headers = {"ETag": self.etag} if self.etag else {}
+            return httpx.Response(200, content=json.dumps(self.catalog).encode(), headers=headers)
+
+        self.adapter = CmsApiAdapter("test-key", transport=httpx.MockTransport(handler), decoder="json")
+
+    async def asyncTearDown(self):
+        await self.adapter.aclose()
+
+    async def test_stored_catalog_is_served_after_restart_without_network(self):
+        await Inquires(cms_api=self.adapter, catalog_store=self.store).catalog_get()
+        restarted = Inquires(cms_api=self.adapter, catalog_store=self.store)
+        response = await restarted.catalog_get()
+        self.assertEqual(5, len(response.inquiries))
+        self.assertEqual(1, len(self.requests))
+
+    async def test_stale_catalog_is_revalidated_in_background(self):
+        await Inquires(cms_api=self.adapter, catalog_store=self.store).catalog_get()
+        fetched_at = self.store.load().fetched_at
+        restarted = Inquires(cms_api=self.adapter, catalog_store=self.store, catalog_max_age=0)
+        response = await restarted.catalog_get()
+        self.assertEqual(5, len(response.inquiries))
+        await restarted._refresh_task
+        self.assertEqual('"v1"', self.requests[-1].headers["If-None-Match"])
+        self.assertGreaterEqual(self.store.load().fetched_at, fetched_at)
+
+    async def test_changed_catalog_replaces_stored_copy(self):
+        inquiries = Inquires(cms_api=self.adapter, catalog_store=self.store)
+        await inquiries.catalog_get()
+        self.catalog = make_catalog(7)
+        self.etag = '"v2"'
+        response = await inquiries.refresh_catalog()
+        self.assertEqual(7, len(response.inquiries))
+        self.assertEqual('"v2"', self.store.load().etag)
+
+    async def test_raw_payload_is_kept_whatever_the_catalog_came_from(self):
+        inquiries = Inquires(cms_api=self.adapter, catalog_store=self.store)
+        fetched = await inquiries.catalog_get(keep_raw=True)
+        stored = await Inquires(cms_api=self.adapter, catalog_store=self.store).catalog_get(keep_raw=True)
+        await inquiries.refresh_catalog()  # Not modified
+        revalidated = await inquiries.catalog_get(keep_raw=True)
+        for response in (fetched, stored, revalidated):
+            response.inquiries
+            self.assertEqual(self.catalog["Inquiries"], response.raw_data["Inquiries"])
+        self.assertIsNone((await inquiries.catalog_get()).raw_data)
+
+    async def test_unchanged_body_is_not_decoded_again(self):
+        self.etag = None
+        inquiries = Inquires(cms_api=self.adapter, catalog_store=self.store)
+        first = await inquiries.catalog_get()
+        second = await inquiries.refresh_catalog()
+        self.assertIs(first, second)
+
+
+class TestCatalogIndex(TestCase):
+    def setUp(self):
+        self.records = [InquiryRecord("WX", "W1", "Weather forecast North", 5000),
+                        InquiryRecord("WX", "W2", "Weather warnings", 12000),
+                        InquiryRecord("NEWS", "N1", "World news summary", 8000),
+                        InquiryRecord("WX", "W3", "Marine forecast", 3000)]
+        self.index = CatalogIndex(self.records)
+
+    def test_lookup_by_id(self):
+        self.assertIs(self.records[2], self.index.get("N1"))
+        self.assertIsNone(self.index.get("missing"))
+
+    def test_category_filtered_by_size(self):
+        self.assertEqual(["W3", "W1"], [rec.inquiry_id for rec in self.index.in_category("WX", max_size=10000)])
+        self.assertEqual(8000, self.index.total_size("WX", max_size=10000))
+        self.assertEqual(28000, self.index.total_size())
+
+    def test_subject_prefix_is_case_insensitive(self):
+        self.assertEqual(["W1", "W2"], [rec.inquiry_id for rec in self.index.subject_prefix("WEATHER")])
+
+    def test_search_matches_all_words_with_last_word_as_prefix(self):
+        self.assertEqual(["W1", "W3"], [rec.inquiry_id for rec in self.index.search("forecast")])
+        self.assertEqual(["W3"], [rec.inquiry_id for rec in self.index.search("forecast mar")])
+        self.assertEqual([], self.index.search("forecast news"))
+
+
+class ChunkedStream(httpx.AsyncByteStream):
+    def __init__(self, body: bytes, chunk_size: int):
+        self.body = body
+        self.chunk_size = chunk_size
+
+    async def __aiter__(self):
+        for i in range(0, len(self.body), self.chunk_size):
+            yield self.body[i:i + self.chunk_size]
+
+
+class TestInquiresCatalogStreaming(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.catalog = make_catalog(20)
+        # Brackets, quotes and escapes inside strings must not confuse the scanner
+        self.catalog["Inquiries"][5]["Subject"] = 'Tricky "quoted" {subject} [with] \\ backslash'
+        self.chunk_size = 3
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            body = json.dumps(self.catalog).encode()
+            return httpx.Response(200, stream=ChunkedStream(body, self.chunk_size))
+
+        self.adapter = CmsApiAdapter("test-key", transport=httpx.MockTransport(handler))
+        self.inquiries = Inquires(cms_api=self.adapter)
+
+    async def asyncTearDown(self):
+        await self.adapter.aclose()
+
+    async def test_records_match_eager_catalog(self):
+        for self.chunk_size in (1, 2, 7, 4096):
+            streamed = [rec async for rec in self.inquiries.iter_catalog()]
+            eager = (await self.inquiries.catalog_get()).inquiries
+            self.assertEqual(eager, streamed)
+        self.assertEqual('Tricky "quoted" {subject} [with] \\ backslash', streamed[5].subject)
+
+    async def test_error_status_is_raised_after_records(self):
+        self.catalog = {"ResponseStatus": {"ErrorCode": "Unauthorized", "Message": "Bad key"}, "Inquiries": []}
+        with self.assertRaises(CmsApiError):
+            [rec async for rec in self.inquiries.iter_catalog()]
+
+    async def test_stopping_early_closes_the_response(self):
+        async for rec in self.inquiries.iter_catalog():
+            break
+        self.assertEqual("INQ0", rec.inquiry_id)
@@ -0,0 +1,103 @@
+import logging
+from unittest import IsolatedAsyncioTestCase
+
+import httpx
+
+from src.cms_api_wrapper.cache import ResponseCache
+from src.cms_api_wrapper.cms_api_adapter import CmsApiTransportError
+from src.cms_api_wrapper.instrumentation import *
+from src.cms_api_wrapper.models.account import *
+from src.cms_api_wrapper.resilience import RetryPolicy
+
+
+class FakeSpan:
+    def __init__(self, name, start_time):
+        self.name = name
+        self.start_time = start_time
+        self.attributes = {}
+        self.end_time = None
+
+    def set_attribute(self, name, value):
+        self.attributes[name] = value
+
+    def end(self, end_time=None):
+        self.end_time = end_time
+
+
+class FakeTracer:
+    def __init__(self):
+        self.spans = []
+
+    def start_span(self, name, start_time=None):
+        span = FakeSpan(name, start_time)
+        self.spans.append(span)
+        return span
+
+
+class TestInstrumentation(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.statuses = []
+        self.metrics = MetricsAggregator()
+        self.api_adapter = self.make_adapter(self.metrics)
+
+    def make_adapter(self, instrumentation, **kwargs):
+        def handler(request: httpx.Request) -> httpx.Response:
+            status_code = self.statuses.pop(0) if self.statuses else 200
+            return httpx.Response(status_code, content=b'{"Exists":true,"ResponseStatus":{}}')
+        return CmsApiAdapter("secret-key", "cms-z.winlink.org", transport=httpx.MockTransport(handler),
+                             retry_policy=RetryPolicy(max_attempts=3, base_delay=0), instrumentation=instrumentation,
+                             **kwargs)
+
+    async def asyncTearDown(self):
+        await self.api_adapter.aclose()
+
+    async def test_requests_are_aggregated_per_endpoint(self):
+        await self.api_adapter.get("account/exists/", {"Callsign": "W1AW"})
+        await self.api_adapter.get("account/exists/", {"Callsign": "K1AW"})
+        stats = self.metrics.dump()["account/exists/"]
+        self.assertEqual(stats["requests"], 2)
+        self.assertEqual(stats["status_codes"], {200: 2})
+        self.assertEqual(stats["latency"]["count"], 2)
+        self.assertIn("decode", stats["phases"])
+        self.assertIn("account/exists/", self.metrics.format())
+
+    async def test_retries_are_counted(self):
+        self.statuses = [503, 200]
+        await self.api_adapter.get("account/exists/", {"Callsign": "W1AW"})
+        stats = self.metrics.dump()["account/exists/"]
+        self.assertEqual(stats["retries"], 1)
+        self.assertEqual(self.metrics.events["retry"], 1)
+
+    async def test_cache_hits_are_counted(self):
+        await self.api_adapter.aclose()
+        self.api_adapter = self.make_adapter(self.metrics, cache=ResponseCache())
+        await self.api_adapter.get("account/exists/", {"Callsign": "W1AW"})
+        await self.api_adapter.get("account/exists/", {"Callsign": "W1AW"})
+        stats = self.metrics.dump()["account/exists/"]
+        self.assertEqual((stats["requests"], stats["cache_hits"]), (2, 1))
+
+    async def test_secrets_are_redacted(self):
+        with self.assertLogs("src.cms_api_wrapper.cms_api_adapter", logging.DEBUG) as logs:
+            await self.api_adapter.post("account/password/validate/",
+                                        {"Callsign": "W1AW", "Password": "hunter2"})
+        output = "\n".join(logs.output)
+        self.assertNotIn("secret-key", output)
+        self.assertNotIn("hunter2", output)
+
+        tracer = FakeTracer()
+        await self.api_adapter.aclose()
+        self.api_adapter = self.make_adapter(SpanInstrumentation(tracer))
+        await self.api_adapter.post("account/password/validate/", {"Callsign": "W1AW", "Password": "hunter2"})
+        span = tracer.spans[0]
+        self.assertEqual(span.name, "CMS POST account/password/validate/")
+        self.assertEqual(span.attributes["cms.param.Password"], REDACTED)
+        self.assertEqual(span.attributes["http.response.status_code"], 200)
+        self.assertNotIn("cms.param.key", span.attributes)
+        self.assertGreaterEqual(span.end_time, span.start_time)
+
+    async def test_failures_are_reported(self):
+        self.statuses = [500]
+        with self.assertRaises(CmsApiTransportError):
+            await self.api_adapter.get("account/exists/", {"Callsign": "W1AW"})
+        stats = self.metrics.dump()["account/exists/"]
+        self.assertEqual((stats["errors"], stats["status_codes"]), (1, {500: 1}))
@@ -0,0 +1,119 @@
+from unittest import IsolatedAsyncioTestCase, TestCase
+import asyncio
+
+import httpx
+
+from src.cms_api_wrapper.cms_api_adapter import CmsApiAdapter
+from src.cms_api_wrapper.models.account import Account
+from src.cms_api_wrapper.negative_cache import *
+
+from .helpers import FakeClock
+
+
+class TestNegativeLookupSet(TestCase):
+    def test_ttl_bound_and_discard(self):
+        clock = FakeClock()
+        cache = NegativeLookupSet(ttl=10, max_entries=2, clock=clock)
+        cache.add("w1aw")
+        self.assertTrue(cache.contains("W1AW "))
+        cache.add("K1ABC")
+        cache.add("N0CALL")
+        self.assertFalse(cache.contains("W1AW"))  # Dropped to stay within max_entries
+        cache.discard("K1ABC")
+        self.assertFalse(cache.contains("K1ABC"))
+        clock.now = 10
+        self.assertFalse(cache.contains("N0CALL"))
+        self.assertEqual((1, 3, 0), (cache.hits, cache.misses, len(cache)))
+
+    def test_discards_take_fixed_memory(self):
+        cache = NegativeLookupSet()
+        memory = cache.memory_bytes()
+        generation = cache.generation("W1AW")
+        for i in range(20000):
+            cache.discard(f"ZZ{i}TST")
+        cache.discard("W1AW")
+        self.assertEqual(memory, cache.memory_bytes())
+        cache.add("W1AW", generation)
+        self.assertFalse(cache.contains("W1AW"))
+
+
+class TestCountingBloomFilter(TestCase):
+    def test_false_positive_rate_is_bounded(self):
+        bloom = CountingBloomFilter(capacity=5000, false_positive_rate=0.01)
+        self.assertLess(bloom.memory_bytes(), 2 * 5000 * 10)
+        for i in range(5000):
+            bloom.add(f"ZZ{i}TST")
+        self.assertTrue(all(bloom.contains(f"ZZ{i}TST") for i in range(5000)))
+        false_positives = sum(bloom.contains(f"QQ{i}XYZ") for i in range(20000))
+        self.assertLess(false_positives / 20000, 0.02)
+        self.assertLess(bloom.estimated_false_positive_rate(), 0.02)
+
+    def test_discard_and_expiry(self):
+        clock = FakeClock()
+        bloom = CountingBloomFilter(ttl=10, capacity=100, clock=clock)
+        bloom.add("W1AW")
+        bloom.add("K1ABC")
+        bloom.discard("W1AW")
+        self.assertEqual((False, True), (bloom.contains("W1AW"), bloom.contains("K1ABC")))
+        clock.now = 6
+        bloom.add("N0CALL")
+        self.assertTrue(bloom.contains("K1ABC"))  # Now in the previous generation
+        clock.now = 10
+        self.assertEqual((False, True), (bloom.contains("K1ABC"), bloom.contains("N0CALL")))
+        clock.now = 100
+        self.assertFalse(bloom.contains("N0CALL"))
+
+
+class TestAccountNegativeCache(IsolatedAsyncioTestCase):
+    async def test_missing_callsigns_are_not_looked_up_again(self):
+        existing = set()
+        requests = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request.url.path)
+            if request.url.path == "/account/add/":
+                existing.add("W1AW")
+                return httpx.Response(200, content=b'{"ResponseStatus":{}}')
+            exists = "true" if request.url.params["Callsign"] in existing else "false"
+            return httpx.Response(200, content=f'{{"CallsignExists":{exists},"ResponseStatus":{{}}}}'.encode())
+
+        negative_cache = NegativeLookupSet()
+        async with CmsApiAdapter("test-key", transport=httpx.MockTransport(handler)) as adapter:
+            account = Account(cms_api=adapter, negative_cache=negative_cache)
+            self.assertFalse((await account.account_exists("W1AW")).exists)
+            self.assertFalse((await account.account_exists("w1aw")).exists)
+            self.assertEqual(1, len(requests))
+
+            await account.add_callsign_account("W1AW", "secret")
+            self.assertTrue((await account.account_exists("W1AW")).exists)
+            self.assertEqual(3, len(requests))
+        self.assertEqual({"hits": 1, "misses": 2, "added": 1, "invalidated": 1},
+                         {name: value for name, value in negative_cache.stats().items()
+                          if name in ("hits", "misses", "added", "invalidated")})
+
+    async def test_lookup_overtaken_by_add_is_not_remembered(self):
+        async def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/account/add/":
+                return httpx.Response(200, content=b'{"ResponseStatus":{}}')
+            await asyncio.sleep(0.05)  # Answered before the account was added
+            return httpx.Response(200, content=b'{"CallsignExists":false,"ResponseStatus":{}}')
+
+        negative_cache = NegativeLookupSet()
+        async with CmsApiAdapter("test-key", transport=httpx.MockTransport(handler)) as adapter:
+            account = Account(cms_api=adapter, negative_cache=negative_cache)
+            lookup = asyncio.ensure_future(account.account_exists("W1AW"))
+            await asyncio.sleep(0.01)
+            await account.add_callsign_account("W1AW", "secret")
+            self.assertFalse((await lookup).exists)
+        self.assertEqual(0, negative_cache.added)
+        self.assertFalse(negative_cache.contains("W1AW"))
+
+
+class TestNegativeLookupCache(TestCase):
+    def test_incomplete_subclass_cannot_be_created(self):
+        class Incomplete(NegativeLookupCache):
+            def _contains(self, callsign: str) -> bool:
+                return False
+
+        with self.assertRaises(TypeError):
+            Incomplete(ttl=10)
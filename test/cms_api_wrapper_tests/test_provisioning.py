@@ -0,0 +1,81 @@
+import csv
+import json
+import os
+import tempfile
+from unittest import IsolatedAsyncioTestCase
+
+from src.cms_api_wrapper.provisioning import *
+from tools.cms_api_stub import StubCmsApi, StubCmsServer
+
+
+class TestProvisioning(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.api = StubCmsApi()
+        self.api.add_account("ZZ0TST", "other")
+        self.server = StubCmsServer(self.api)
+        await self.server.start()
+        self.directory = tempfile.TemporaryDirectory()
+        self.input = os.path.join(self.directory.name, "club.csv")
+        self.report = os.path.join(self.directory.name, "report.csv")
+        with open(self.input, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["callsign", "password", "recovery_email", "sysop_name", "grid_square", "city"])
+            writer.writerow(["zz1tst", "secret1", "one@example.com", "Op One", "FN31", "Newington"])
+            writer.writerow(["ZZ2TST", "secret2", "", "", "", ""])
+            writer.writerow(["ZZ0TST", "secret0", "zero@example.com", "", "", ""])
+            writer.writerow(["", "nocallsign", "", "", "", ""])
+            writer.writerow(["ZZ3TST", "secret3", "", "Op Three", "FN3", ""])
+
+    async def asyncTearDown(self):
+        await self.server.stop()
+        self.directory.cleanup()
+
+    async def provision(self):
+        args = parse_args([self.input, "--api-key", "test-key", "--hostname", self.server.hostname, "--scheme",
+                           "http", "--report", self.report, "--concurrency", "3", "--rate-limit", "1000"])
+        counts = await provision_file(args)
+        with open(self.report, newline="") as f:
+            return counts, {row["line"]: row for row in csv.DictReader(f)}
+
+    async def test_provision_and_resume(self):
+        counts, report = await self.provision()
+        self.assertEqual({STATUS_PROVISIONED: 2, STATUS_SKIPPED: 0, STATUS_FAILED: 3}, counts)
+        self.assertEqual(("provisioned", "account recovery_email sysop"),
+                         (report["2"]["status"], report["2"]["completed"]))
+        self.assertEqual(("failed", "account"), (report["4"]["status"], report["4"]["failed_step"]))
+        self.assertEqual("input", report["5"]["failed_step"])
+        self.assertIn("InvalidGridSquare", report["6"]["error"])
+        self.assertNotIn("ZZ3TST", self.api.accounts)
+        account = self.api.accounts["ZZ1TST"]
+        self.assertEqual(("secret1", "one@example.com"), (account.password, account.recovery_email))
+        self.assertEqual(("Op One", "Newington"), (account.sysop["SysopName"], account.sysop["City"]))
+
+        # Only the failed record is attempted again; an account that already exists with the
+        # right password counts as added
+        self.api.accounts["ZZ0TST"].password = "secret0"
+        counts, report = await self.provision()
+        self.assertEqual({STATUS_PROVISIONED: 1, STATUS_SKIPPED: 2, STATUS_FAILED: 2}, counts)
+        self.assertEqual("provisioned", report["4"]["status"])
+        self.assertEqual("zero@example.com", self.api.accounts["ZZ0TST"].recovery_email)
+
+    async def test_checkpoint_survives_a_torn_line(self):
+        checkpoint = ProvisioningCheckpoint(os.path.join(self.directory.name, "checkpoint"))
+        checkpoint.mark("ZZ1TST", STEP_ACCOUNT)
+        checkpoint.close()
+        with open(checkpoint.path, "a") as f:
+            f.write('{"callsign": "ZZ1T')
+        reopened = ProvisioningCheckpoint(checkpoint.path)
+        self.assertEqual({STEP_ACCOUNT}, reopened.completed("ZZ1TST"))
+        reopened.mark("ZZ1TST", STEP_SYSOP)
+        reopened.close()
+        reopened = ProvisioningCheckpoint(checkpoint.path)
+        self.assertEqual({STEP_ACCOUNT, STEP_SYSOP}, reopened.completed("ZZ1TST"))
+        reopened.close()
+
+    def test_read_jsonl(self):
+        path = os.path.join(self.directory.name, "club.jsonl")
+        with open(path, "w") as f:
+            f.write(json.dumps({"callsign": "ZZ1TST", "password": "x"}) + "\n\n")
+            f.write(json.dumps({"callsign": "ZZ2TST", "password": "y"}) + "\n")
+        self.assertEqual([("ZZ1TST", 1), ("ZZ2TST", 3)],
+                         [(row["callsign"], row["_line"]) for row in read_records(path)])
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+import time
+from unittest import TestCase, IsolatedAsyncioTestCase
+
+from src.cms_api_wrapper.cms_api_adapter import CmsApiAdapter
+from src.cms_api_wrapper.ratelimit import *
+
+
+class TestTokenBucket(IsolatedAsyncioTestCase):
+    async def test_burst_is_available_immediately(self):
+        bucket = TokenBucket(rate=1, burst=3)
+        await asyncio.wait_for(asyncio.gather(*(bucket.acquire() for _ in range(3))), 0.1)
+
+    async def test_requests_beyond_burst_are_paced(self):
+        bucket = TokenBucket(rate=50, burst=1)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await asyncio.gather(*(bucket.acquire() for _ in range(5)))
+        self.assertGreaterEqual(loop.time() - start, 0.07)
+
+    async def test_higher_priority_waiters_go_first(self):
+        bucket = TokenBucket(rate=100, burst=1)
+        await bucket.acquire()
+        order = []
+
+        async def request(name: str, priority: int):
+            await bucket.acquire(priority)
+            order.append(name)
+
+        background = [asyncio.create_task(request(f"bg{i}", PRIORITY_BACKGROUND)) for i in range(3)]
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(request("login", PRIORITY_INTERACTIVE))
+        await asyncio.gather(interactive, *background)
+        self.assertEqual("login", order[0])
+        self.assertEqual(["bg0", "bg1", "bg2"], order[1:])
+
+    async def test_cancelled_waiter_gives_up_its_place(self):
+        bucket = TokenBucket(rate=20, burst=1)
+        await bucket.acquire()
+        waiter = asyncio.create_task(bucket.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.wait_for(bucket.acquire(), 0.2)
+        self.assertEqual(0, bucket.queued)
+
+
+class TestSharedBucket(TestCase):
+    def test_same_key_shares_a_bucket(self):
+        bucket = shared_bucket("shared-key", 5)
+        self.assertIs(bucket, shared_bucket("shared-key", 5))
+        self.assertIsNot(bucket, shared_bucket("other-key", 5))
+        with self.assertRaises(ValueError):
+            shared_bucket("shared-key", 10)
+        with self.assertRaises(ValueError):
+            shared_bucket("shared-key", 5, burst=2)
+
+    def test_adapters_with_different_hosts_share_the_key_limit(self):
+        first = CmsApiAdapter("host-key", ["cms-a.example", "cms-b.example"], rate_limit=3)
+        second = CmsApiAdapter("host-key", "cms-b.example", rate_limit=3)
+        self.assertIs(first._rate_limiter, second._rate_limiter)
+
+    def test_bucket_is_shared_by_event_loops_in_different_threads(self):
+        bucket = TokenBucket(rate=10, burst=1)
+        waited = {}
+
+        def run(name: str):
+            async def take():
+                start = time.monotonic()
+                for _ in range(3):
+                    await bucket.acquire()
+                waited[name] = time.monotonic() - start
+            asyncio.run(take())
+
+        threads = [threading.Thread(target=run, args=(name,)) for name in ("a", "b")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Six tokens at ten per second, one of them saved up
+        self.assertLess(max(waited.values()), 1.0)
+        self.assertGreaterEqual(max(waited.values()), 0.4)
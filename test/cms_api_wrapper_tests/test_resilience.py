@@ -0,0 +1,93 @@
+from unittest import TestCase, IsolatedAsyncioTestCase
+
+import httpx
+
+from src.cms_api_wrapper.cms_api_adapter import *
+from src.cms_api_wrapper.resilience import *
+
+from .helpers import FakeClock
+
+
+class TestRetryPolicy(TestCase):
+    def test_backoff_is_capped(self):
+        policy = RetryPolicy(base_delay=1.0, max_delay=2.0)
+        self.assertTrue(all(0 <= policy.backoff(10) <= 2.0 for _ in range(100)))
+
+    def test_retry_after_seconds_is_honoured_and_capped(self):
+        policy = RetryPolicy(max_retry_after=10.0)
+        self.assertEqual(3.0, policy.delay(1, httpx.Response(503, headers={"Retry-After": "3"})))
+        self.assertEqual(10.0, policy.delay(1, httpx.Response(503, headers={"Retry-After": "120"})))
+
+    def test_only_transport_errors_are_retryable(self):
+        self.assertTrue(RetryPolicy.is_retryable_error(httpx.ConnectError("reset")))
+        self.assertTrue(RetryPolicy.is_retryable_error(httpx.ReadTimeout("slow")))
+        self.assertFalse(RetryPolicy.is_retryable_error(ValueError()))
+
+
+class TestCircuitBreaker(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.changes = []
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=self.clock,
+                                      on_state_change=lambda old, new: self.changes.append(new))
+
+    def test_opens_after_threshold_and_probes_after_timeout(self):
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record_failure()
+        self.assertFalse(self.breaker.allow_request())
+        self.clock.now = 10
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())  # one probe at a time
+        self.breaker.record_success()
+        self.assertEqual([CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN, CircuitBreaker.CLOSED], self.changes)
+
+    def test_failed_probe_reopens_circuit(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.clock.now = 10
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record_failure()
+        self.assertEqual(CircuitBreaker.OPEN, self.breaker.state)
+
+
+class TestAdapterRetries(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.statuses = []
+        self.requests = []
+        self.events = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.requests.append(request)
+            status = self.statuses.pop(0) if self.statuses else 200
+            return httpx.Response(status, content=b'{"ResponseStatus":{}}')
+
+        self.api_adapter = CmsApiAdapter("test-key", transport=httpx.MockTransport(handler),
+                                         retry_policy=RetryPolicy(max_attempts=3, base_delay=0),
+                                         failure_threshold=3, event_hook=lambda *event: self.events.append(event))
+
+    async def asyncTearDown(self):
+        await self.api_adapter.aclose()
+
+    async def test_get_is_retried_on_503(self):
+        self.statuses = [503, 502]
+        result = await self.api_adapter.get("account/exists/")
+        self.assertIsInstance(result, ApiResult)
+        self.assertEqual(3, len(self.requests))
+        self.assertEqual(["retry", "retry"], [name for name, _ in self.events])
+
+    async def test_post_is_not_retried(self):
+        self.statuses = [503]
+        with self.assertRaises(CmsApiTransportError):
+            await self.api_adapter.post("account/add/")
+        self.assertEqual(1, len(self.requests))
+
+    async def test_open_circuit_fails_fast(self):
+        self.statuses = [503] * 3
+        with self.assertRaises(CmsApiTransportError):
+            await self.api_adapter.get("account/exists/")
+        with self.assertRaises(CircuitOpenError):
+            await self.api_adapter.get("account/exists/")
+        self.assertEqual(3, len(self.requests))
+        self.assertIn(("circuit_state", {"host": "api.winlink.org", "old_state": "closed", "new_state": "open"}),
+                      self.events)
@@ -0,0 +1,64 @@
+import json
+import threading
+import time
+from unittest import TestCase
+
+import httpx
+
+from src.cms_api_wrapper.sync_client import *
+
+CATALOG = {"Inquiries": [{"Category": "WX", "InquiryId": f"INQ{i}", "Subject": f"WX bulletin {i}", "SizeEstimate": 1000}
+                         for i in range(3)], "ResponseStatus": {}}
+
+
+class TestSyncClient(TestCase):
+    def setUp(self):
+        self.requests = []
+        self.threads = set()
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.requests.append(request)
+            self.threads.add(threading.current_thread().name)
+            if request.url.path == "/inquiries/catalog/":
+                return httpx.Response(200, content=json.dumps(CATALOG).encode())
+            exists = request.url.params["Callsign"] != "N0NE"
+            return httpx.Response(200, content=json.dumps({"CallsignExists": exists, "ResponseStatus": {}}).encode())
+
+        self.client = SyncClient("test-key", transport=httpx.MockTransport(handler))
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_blocking_calls_share_one_loop_and_client(self):
+        self.assertTrue(self.client.account.account_exists("W1AW").exists)
+        self.assertFalse(self.client.account.account_exists("N0NE").exists)
+        http_client = self.client.cms_api._client
+        self.client.account.account_exists("K1ABC")
+        self.assertIs(http_client, self.client.cms_api._client)
+        self.assertEqual({"cms-api-loop"}, self.threads)
+
+    def test_batch_returns_result_per_argument(self):
+        results = self.client.batch(self.client.account.account_exists, ["W1AW", "N0NE", "K1ABC"])
+        self.assertEqual({"W1AW": True, "N0NE": False, "K1ABC": True},
+                         {callsign: response.exists for callsign, response in results.items()})
+
+    def test_submit_returns_future(self):
+        future = self.client.account.account_exists.submit("W1AW")
+        self.assertTrue(future.result(5).exists)
+
+    def test_async_generators_become_iterators(self):
+        self.assertEqual(["INQ0", "INQ1", "INQ2"], [rec.inquiry_id for rec in self.client.inquiries.iter_catalog()])
+
+    def test_timeout_cancels_call(self):
+        async def slow():
+            await asyncio.sleep(10)
+
+        start = time.perf_counter()
+        with self.assertRaises(concurrent.futures.TimeoutError):
+            self.client.run(slow(), timeout=0.05)
+        self.assertLess(time.perf_counter() - start, 5)
+
+    def test_close_stops_thread(self):
+        self.client.close()
+        self.assertFalse(self.client._background._thread.is_alive())
+        self.client.close()
@@ -0,0 +1,51 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from src.cms_api_wrapper.sysop_sync import *
+from tools.cms_api_stub import StubCmsApi, StubCmsServer
+
+
+class TestSysopSync(TestCase):
+    def setUp(self):
+        self.api = StubCmsApi()
+        callsigns = self.api.populate(30)
+        self.api.add_account("ZZ99TST", "PASSWORD")  # No sysop record
+        self.credentials = [(callsign, "PASSWORD") for callsign in callsigns] + [("zz99tst", "PASSWORD")]
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "sysops.db")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_sync_writes_only_changed_rows(self):
+        with StubCmsServer(self.api).in_thread() as server:
+            sync = SysopSync("test-key", self.path, server.hostname, processes=2, concurrency=5, batch_size=4,
+                             scheme="http")
+            reports = sync.run(self.credentials)
+            self.assertEqual([16, 15], [report.callsigns for report in reports])
+            self.assertEqual((30, 30, 1, 0), tuple(sum(report[i] for report in reports) for i in (2, 3, 4, 5)))
+
+            self.api.accounts["ZZ7TST"].sysop["City"] = "Hartford"
+            reports = sync.run(self.credentials)
+            self.assertEqual(1, sum(report.changed for report in reports))
+            self.assertIn("changed", format_reports(reports))
+
+        store = SysopStore(self.path)
+        self.assertEqual(30, len(store))
+        self.assertEqual("Hartford", store.get("zz7tst").city)
+        store.close()
+
+    def test_interrupted_run_is_resumed(self):
+        store = SysopStore(self.path)
+        run_id = store.start_run()
+        store.save(run_id, [], missing=[callsign for callsign, _ in self.credentials[:20]])
+        store.close()
+        with StubCmsServer(self.api).in_thread() as server:
+            reports = SysopSync("test-key", self.path, server.hostname, processes=1, scheme="http").run(
+                self.credentials)
+        self.assertEqual([11], [report.callsigns for report in reports])
+        store = SysopStore(self.path)
+        self.assertEqual(set(), store.done(run_id))  # Finished, so its progress was cleared
+        self.assertNotEqual(run_id, store.start_run())
+        store.close()
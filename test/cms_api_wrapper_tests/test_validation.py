@@ -0,0 +1,72 @@
+import io
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+import httpx
+
+from src.cms_api_wrapper.cms_api_adapter import CmsApiAdapter, CmsApiError
+from src.cms_api_wrapper.models.account import Account
+from src.cms_api_wrapper.models.sysop import Sysop
+from src.cms_api_wrapper.provisioning import ProvisioningReport, check_records
+from src.cms_api_wrapper.validation import *
+
+
+class TestRequestValidator(TestCase):
+    def setUp(self):
+        self.validator = RequestValidator()
+
+    def assertRejected(self, error_code, endpoint, params):
+        with self.assertRaises(ValidationError) as context:
+            self.validator.check(endpoint, params)
+        self.assertEqual(error_code, context.exception.error_code)
+
+    def test_check(self):
+        for callsign in ("W1AW", "k1abc-10", "EOC1", "EOC-KING-CO", "RACES-SEATTLE-1", "VE3/W1AW",
+                         "W1AW/M", "W1AW/P-5"):
+            self.validator.check("account/exists/", {"Callsign": callsign})
+        for callsign in ("", "W1 AW", "W1AW@winlink.org", "AB", "W1AW-", "W1AW--1", "/W1AW", "W1AW/", "VE3//W1AW"):
+            self.assertRejected(INVALID_CALLSIGN, "account/exists/", {"Callsign": callsign})
+        self.assertRejected(WINLINK_ADDRESS_NOT_ALLOWED, "account/alternateEmail/set",
+                            {"Callsign": "W1AW", "AlternateEmail": "K1ABC@Winlink.org"})
+        self.assertRejected(INVALID_EMAIL_ADDRESS, "account/password/recovery/email/set",
+                            {"Callsign": "W1AW", "RecoveryEmail": "nobody"})
+        self.assertRejected(INVALID_GRID_SQUARE, "sysop/add/", {"Callsign": "W1AW", "GridSquare": "FN3"})
+        self.validator.check("sysop/add/", {"Callsign": "W1AW", "GridSquare": "fn31pr", "Email": ""})
+        self.assertRejected(INVALID_MAX_MESSAGE_SIZE, "account/maxMessageSize/set",
+                            {"Callsign": "W1AW", "MaxMessageSize": 121})
+        self.validator.check("account/maxMessageSize/set", {"Callsign": "W1AW", "MaxMessageSize": 120})
+        self.validator.check("inquiries/catalog/", {"anything": "goes"})
+
+    def test_screen_batch(self):
+        rows = [{"callsign": "W1AW", "password": "pw", "grid_square": "FN31"},
+                {"callsign": "W1 AW", "password": "pw", "recovery_email": "W1AW@winlink.org"},
+                {"callsign": "K1ABC", "grid_square": "ZZ99"}]
+        errors = self.validator.screen(rows)
+        self.assertEqual([1, 2], sorted(errors))
+        self.assertEqual([INVALID_CALLSIGN, WINLINK_ADDRESS_NOT_ALLOWED], [e.error_code for e in errors[1]])
+        self.assertEqual([("password", INVALID_PASSWORD), ("grid_square", INVALID_GRID_SQUARE)],
+                         [(e.field, e.error_code) for e in errors[2]])
+
+        report = io.StringIO()
+        self.assertEqual({"valid": 1, "failed": 2}, check_records(rows, ProvisioningReport(report)))
+        self.assertIn("grid_square: InvalidGridSquare", report.getvalue())
+
+
+class TestAdapterValidation(IsolatedAsyncioTestCase):
+    async def test_bad_input_is_rejected_without_a_request(self):
+        requests = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            return httpx.Response(200, content=b'{"ResponseStatus":{}}')
+
+        async with CmsApiAdapter("test-key", transport=httpx.MockTransport(handler), validator=True) as adapter:
+            with self.assertRaises(CmsApiError):
+                await Account(cms_api=adapter).set_forwarding_email_address("W1AW", "pw", "K1ABC@winlink.org")
+            with self.assertRaises(ValidationError):
+                await Sysop(cms_api=adapter).sysop_add("W1AW", "pw", "Op", "not a grid", "op@example.com")
+            self.assertEqual([], requests)
+
+        # Requests are not checked unless a validator is given
+        async with CmsApiAdapter("test-key", transport=httpx.MockTransport(handler)) as adapter:
+            await Account(cms_api=adapter).set_max_message_size("W1AW", 500)
+            self.assertEqual(1, len(requests))
@@ -0,0 +1,139 @@
+import json
+import os
+import stat
+import tempfile
+from unittest import IsolatedAsyncioTestCase
+
+import httpx
+
+from src.cms_api_wrapper.cache import ResponseCache
+from src.cms_api_wrapper.models.account import Account
+from src.cms_api_wrapper.models.sysop import Sysop
+from src.cms_api_wrapper.resilience import RetryPolicy
+from src.cms_api_wrapper.write_queue import *
+
+
+class TestWriteQueue(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.online = False
+        self.status_code = 200
+        self.sent = []
+        self.rejected = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            if not self.online:
+                raise httpx.ConnectError("no link")
+            params = dict(request.url.params)
+            if request.content:
+                params.update(json.loads(request.content))
+            self.sent.append((request.url.path, params))
+            if params.get("MaxMessageSize") == 99:
+                return httpx.Response(400, content=b'{"ResponseStatus":{"ErrorCode":"Invalid","Message":"Too big"}}')
+            return httpx.Response(self.status_code, content=b'{"ResponseStatus":{}}')
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "writes.db")
+        self.adapter = CmsApiAdapter("test-key", transport=httpx.MockTransport(handler),
+                                     retry_policy=RetryPolicy(max_attempts=1), failure_threshold=100)
+        self.queue = WriteQueue(self.adapter, WriteJournal(self.path),
+                                on_rejected=lambda write, result: self.rejected.append((write, result)),
+                                max_attempts=2)
+        self.account = Account(cms_api=self.adapter, write_queue=self.queue)
+
+    async def asyncTearDown(self):
+        await self.queue.stop()
+        self.queue.journal.close()
+        await self.adapter.aclose()
+        self.directory.cleanup()
+
+    async def test_writes_are_sent_directly_when_online(self):
+        self.online = True
+        response = await self.account.set_max_message_size("W1AW", 100)
+        self.assertNotIsInstance(response, QueuedResponse)
+        self.assertEqual(0, len(self.queue.journal))
+        self.assertEqual(1, len(self.sent))
+
+    async def test_offline_writes_are_journaled_and_superseded(self):
+        self.assertIsInstance(await self.account.set_max_message_size("W1AW", 50), QueuedResponse)
+        await self.account.set_forwarding_email_address("W1AW", "pw", "a@example.com")
+        await self.account.set_max_message_size("w1aw", 100)
+        self.assertEqual(["account/alternateEmail/set", "account/maxMessageSize/set"],
+                         [write.endpoint for write in self.queue.journal.pending()])
+
+        self.online = True
+        self.assertEqual(2, await self.queue.flush())
+        self.assertEqual(["/account/alternateEmail/set", "/account/maxMessageSize/set"],
+                         [path for path, _ in self.sent])
+        self.assertEqual(100, self.sent[1][1]["MaxMessageSize"])
+        self.assertEqual(0, len(self.queue.journal))
+
+    async def test_journal_survives_restart(self):
+        await Sysop(cms_api=self.adapter, write_queue=self.queue).sysop_add("W1AW", "pw", "Op", "FN31", "a@b.c")
+        self.queue.journal.close()
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+        self.queue = WriteQueue(self.adapter, WriteJournal(self.path))
+        self.online = True
+        self.assertEqual(1, await self.queue.flush())
+        self.assertEqual("/sysop/add/", self.sent[0][0])
+
+    async def test_writes_wait_behind_journaled_ones(self):
+        await self.account.set_max_message_size("W1AW", 50)
+        self.online = True
+        # Sent directly it would overtake the journaled write
+        self.assertIsInstance(await self.account.set_password_recovery_email_address("W1AW", "pw", "r@x.org"),
+                              QueuedResponse)
+        self.assertEqual([], self.sent)
+
+    async def test_replayed_writes_drop_cached_reads(self):
+        self.adapter.cache = ResponseCache(ttls={"account/maxMessageSize/get": 300.0})
+        await self.account.set_max_message_size("W1AW", 50)
+        # A GET write to an endpoint the adapter doesn't list as mutating
+        await self.queue.submit('GET', "account/settings/set", {"Callsign": "K1ABC", "Setting": 1})
+        self.online = True
+        # Read while the writes wait in the journal
+        await self.account.get_max_message_size("W1AW")
+        await self.account.get_max_message_size("K1ABC")
+        self.assertEqual(2, len(self.adapter.cache))
+
+        self.assertEqual(2, await self.queue.flush())
+        self.assertEqual(0, len(self.adapter.cache))
+
+    async def test_rejected_writes_are_dropped_and_reported(self):
+        await self.account.set_max_message_size("W1AW", 99)
+        await self.account.set_forwarding_email_address("W1AW", "pw", "a@example.com")
+        self.online = True
+        self.assertEqual(2, await self.queue.flush())
+        self.assertEqual(["account/maxMessageSize/set"], [write.endpoint for write, _ in self.rejected])
+        self.assertEqual(0, len(self.queue.journal))
+
+    async def test_flush_stops_while_offline(self):
+        await self.account.set_max_message_size("W1AW", 50)
+        self.assertEqual(0, await self.queue.flush())
+        write, = self.queue.journal.pending()
+        self.assertEqual(1, write.attempts)
+        self.assertIn("ConnectError", write.last_error)
+
+    async def test_server_error_is_raised_not_journaled(self):
+        self.online = True
+        self.status_code = 500
+        with self.assertRaises(CmsApiTransportError):
+            await self.account.set_max_message_size("W1AW", 50)
+        self.assertEqual(0, len(self.queue.journal))
+
+        self.status_code = 503
+        self.assertIsInstance(await self.account.set_max_message_size("W1AW", 50), QueuedResponse)
+
+    async def test_failing_write_is_dropped_after_max_attempts(self):
+        await self.account.set_max_message_size("W1AW", 50)
+        await self.account.set_forwarding_email_address("W1AW", "pw", "a@example.com")
+        self.online = True
+        self.status_code = 500
+        self.assertEqual(0, await self.queue.flush())
+        self.assertEqual(1, self.queue.journal.pending()[0].failures)
+        # The next server error drops it; the write behind it gets its first one
+        self.assertEqual(1, await self.queue.flush())
+        (write, result), = self.rejected
+        self.assertEqual(("account/maxMessageSize/set", ERROR_TOO_MANY_ATTEMPTS),
+                         (write.endpoint, result.error_code))
+        self.assertEqual(["account/alternateEmail/set"], [write.endpoint for write in self.queue.journal.pending()])
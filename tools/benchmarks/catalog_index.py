@@ -0,0 +1,59 @@
+"""
+Compares CatalogIndex queries with linear scans of the inquiry list. Run from the
+repository root:
+
+    python -m tools.benchmarks.catalog_index --records 50000
+"""
+import argparse
+import timeit
+
+from src.cms_api_wrapper.models.catalog_index import CatalogIndex
+from src.cms_api_wrapper.models.inquiries import InquiryRecord
+
+CATEGORIES = ["WX", "NEWS", "GOV", "PROP", "SPACE", "HF", "VHF", "MARINE"]
+
+
+def synthetic_inquiries(count: int):
+    return [InquiryRecord(CATEGORIES[i % len(CATEGORIES)], f"INQ{i:06d}",
+                          f"{CATEGORIES[i % len(CATEGORIES)]} bulletin number {i}", 500 + (i * 37) % 50000)
+            for i in range(count)]
+
+
+def main(count: int = 50_000):
+    inquiries = synthetic_inquiries(count)
+    build = timeit.timeit(lambda: CatalogIndex(inquiries), number=3) / 3
+    index = CatalogIndex(inquiries)
+    target = f"INQ{count // 2:06d}"
+    queries = {
+        "lookup by id": (lambda: next(rec for rec in inquiries if rec.inquiry_id == target),
+                         lambda: index.get(target)),
+        "category": (lambda: [rec for rec in inquiries if rec.category == "WX"],
+                     lambda: index.in_category("WX")),
+        "category under 10 KB": (lambda: [rec for rec in inquiries
+                                          if rec.category == "WX" and rec.size_estimate <= 10_000],
+                                 lambda: index.in_category("WX", max_size=10_000)),
+        "category total size": (lambda: sum(rec.size_estimate for rec in inquiries if rec.category == "WX"),
+                                lambda: index.total_size("WX")),
+        "subject prefix": (lambda: [rec for rec in inquiries
+                                    if rec.subject.lower().startswith("wx bulletin number 12")],
+                           lambda: index.subject_prefix("wx bulletin number 12")),
+        "keyword": (lambda: [rec for rec in inquiries if "marine" in rec.subject.lower().split()],
+                    lambda: index.search("marine")),
+    }
+    print(f"{count} catalog records, index built in {build * 1000:.1f} ms")
+    print(f"  {'query':24} {'list scan':>12} {'index':>12} {'speedup':>9}")
+    for name, (scan, indexed) in queries.items():
+        number = 20
+        scan_time = timeit.timeit(scan, number=number) / number
+        index_time = timeit.timeit(indexed, number=number) / number
+        print(f"  {name:24} {scan_time * 1e6:10.1f}us {index_time * 1e6:10.1f}us {scan_time / index_time:8.0f}x")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="CatalogIndex queries compared with list scans")
+    parser.add_argument("--records", type=int, default=50_000, help="synthetic catalog records")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    main(parse_args().records)
@@ -0,0 +1,121 @@
+"""
+Compares the memory held by a parsed inquiry catalog before and after the switch to
+slotted records, and the peak memory of eager and streamed catalog parsing. Run from
+the repository root:
+
+    python -m tools.benchmarks.catalog_memory --records 50000
+"""
+import argparse
+import gc
+import json
+import tracemalloc
+
+from src.cms_api_wrapper.models.inquiries import *
+from src.cms_api_wrapper.streaming import JsonArrayScanner
+
+# Size of the chunks httpx hands to aiter_bytes() for a typical response
+CHUNK_SIZE = 65536
+
+
+class DictInquiryRecord:
+    """
+    The previous InquiryRecord layout: a plain class with a per-instance __dict__
+    """
+
+    def __init__(self, category, inquiry_id, subject, size_estimate):
+        self.category: str = category
+        self.inquiry_id: str = inquiry_id
+        self.subject: str = subject
+        self.size_estimate: int = size_estimate
+
+
+def synthetic_catalog(count: int) -> bytes:
+    categories = ["WX", "NEWS", "GOV", "PROP", "SPACE", "HF", "VHF", "MARINE"]
+    return json.dumps({"Inquiries": [{"Category": categories[i % len(categories)], "InquiryId": f"INQ{i:06d}",
+                                      "Subject": f"{categories[i % len(categories)]} bulletin number {i}",
+                                      "SizeEstimate": 500 + (i * 37) % 50000} for i in range(count)],
+                       "ResponseStatus": {}}).encode()
+
+
+def measure(build) -> int:
+    """
+    Returns the bytes still allocated by the object build() returns
+    """
+    gc.collect()
+    tracemalloc.start()
+    kept = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return size
+
+
+def measure_peak(run) -> int:
+    """
+    Returns the peak bytes allocated while run() executes
+    """
+    gc.collect()
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def eager_parse(body: bytes):
+    # The body arrives in chunks and is joined before decoding, as response.content does
+    chunks = [body[i:i + CHUNK_SIZE] for i in range(0, len(body), CHUNK_SIZE)]
+    joined = b"".join(chunks)
+    del chunks
+    for rec in current_layout(joined).inquiries:
+        pass
+
+
+def streamed_parse(body: bytes):
+    scanner = JsonArrayScanner("Inquiries")
+    for i in range(0, len(body), CHUNK_SIZE):
+        for item in scanner.feed(body[i:i + CHUNK_SIZE]):
+            rec = json.loads(item)
+            InquiryRecord(rec["Category"], rec["InquiryId"], rec["Subject"], rec["SizeEstimate"])
+
+
+def previous_layout(body: bytes):
+    # The raw payload stayed referenced by the response next to the records
+    data = json.loads(body)
+    return data, [DictInquiryRecord(rec["Category"], rec["InquiryId"], rec["Subject"], rec["SizeEstimate"])
+                  for rec in data["Inquiries"]]
+
+
+def current_layout(body: bytes):
+    data = json.loads(body)
+    del data["ResponseStatus"]
+    response = InquiresCatalogGetResponse(ApiResult(data=data))
+    del data
+    response.inquiries
+    return response
+
+
+def main(count: int = 50_000):
+    body = synthetic_catalog(count)
+    before = measure(lambda: previous_layout(body))
+    after = measure(lambda: current_layout(body))
+    print(f"{count} catalog records")
+    print(f"  dict records + raw payload: {before / 1e6:8.2f} MB ({before / count:6.1f} bytes/record)")
+    print(f"  slotted records only:       {after / 1e6:8.2f} MB ({after / count:6.1f} bytes/record)")
+    print(f"  reduction:                  {100 * (1 - after / before):8.1f} %")
+    eager = measure_peak(lambda: eager_parse(body))
+    streamed = measure_peak(lambda: streamed_parse(body))
+    print(f"peak while parsing ({len(body) / 1e6:.1f} MB body, excluding the body itself)")
+    print(f"  catalog_get():              {eager / 1e6:8.2f} MB")
+    print(f"  iter_catalog():             {streamed / 1e6:8.2f} MB")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Memory held and peak memory of catalog parsing")
+    parser.add_argument("--records", type=int, default=50_000, help="synthetic catalog records")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    main(parse_args().records)
@@ -0,0 +1,96 @@
+"""
+Measures how long importing the cms_api_wrapper package takes, using python -X importtime
+in a fresh interpreter. Run from the repository root:
+
+    python -m tools.benchmarks.import_time --statement "import statement" --runs 5
+
+The default statement imports Account, Sysop and Inquires from the package, as a command
+line tool would. Modules the interpreter loads at startup are not counted.
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, NamedTuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_STATEMENT = "from src.cms_api_wrapper import Account, Sysop, Inquires"
+
+# Milliseconds the default statement may take; checked by the test suite when CMS_API_BENCHMARKS is set
+IMPORT_BUDGET_MS = 40
+
+# Modules that should only be loaded once a request is made
+DEFERRED_MODULES = ("httpx", "asyncio", "sqlite3")
+
+
+class ImportTiming(NamedTuple):
+    name: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def run_importtime(statement: str) -> List[ImportTiming]:
+    """
+    Runs statement in a new interpreter and returns its -X importtime report
+    """
+    env = dict(os.environ)
+    # Bytecode has to be cached, or the first run's compile time is counted every time
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=ROOT, env=env,
+                               capture_output=True, text=True, check=True)
+    timings = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings.append(ImportTiming(name.strip(), int(self_us), int(cumulative_us),
+                                    (len(name) - len(name.lstrip()) - 1) // 2))
+    return timings
+
+
+def measure(statement: str = DEFAULT_STATEMENT, runs: int = 5) -> Dict:
+    """
+    Returns the fastest of 'runs' import times of statement in milliseconds, with the module
+    timings of that run
+    """
+    startup = {timing.name for timing in run_importtime("pass")}
+    best = None
+    for _ in range(runs + 1):  # The first run also writes the bytecode cache
+        timings = [timing for timing in run_importtime(statement) if timing.name not in startup]
+        total_ms = sum(timing.cumulative_us for timing in timings if timing.depth == 0) / 1000
+        if best is None or total_ms < best["total_ms"]:
+            best = {"total_ms": total_ms, "timings": timings}
+    return best
+
+
+def loaded_modules(statement: str = DEFAULT_STATEMENT) -> List[str]:
+    """
+    Returns which of DEFERRED_MODULES are loaded after running statement
+    """
+    check = f"{statement}\nimport sys\nprint(' '.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))"
+    completed = subprocess.run([sys.executable, "-c", check], cwd=ROOT, capture_output=True, text=True, check=True)
+    return completed.stdout.split()
+
+
+def main(statement: str = DEFAULT_STATEMENT, runs: int = 5):
+    result = measure(statement, runs)
+    print(f"{statement}")
+    print(f"  import time: {result['total_ms']:.1f} ms (budget {IMPORT_BUDGET_MS} ms)")
+    print(f"  deferred modules loaded: {', '.join(loaded_modules(statement)) or 'none'}")
+    print("  slowest modules (self time):")
+    for timing in sorted(result["timings"], key=lambda t: t.self_us, reverse=True)[:10]:
+        print(f"    {timing.self_us / 1000:7.2f} ms  {timing.name}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Import time of the cms_api_wrapper package")
+    parser.add_argument("--statement", default=DEFAULT_STATEMENT, help="import statement to time")
+    parser.add_argument("--runs", type=int, default=5, help="timed runs; the fastest is reported")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args.statement, args.runs)
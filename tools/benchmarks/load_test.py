@@ -0,0 +1,145 @@
+"""
+Drives Account, Sysop and Inquires against the local CMS API stub at fixed concurrency
+levels and reports throughput, latency percentiles and memory. Run from the repository root:
+
+    python -m tools.benchmarks.load_test --requests 2000 --concurrency 1,10,50 --latency 0.02
+
+Use --memory to also report the peak memory allocated during each run (tracemalloc slows
+the client down, so throughput figures from such a run are not comparable).
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from src.cms_api_wrapper.cms_api_adapter import CmsApiAdapter
+from src.cms_api_wrapper.models.account import Account
+from src.cms_api_wrapper.models.inquiries import Inquires
+from src.cms_api_wrapper.models.sysop import Sysop
+from tools.cms_api_stub import StubCmsApi, StubCmsServer
+
+
+class ScenarioResult(NamedTuple):
+    name: str
+    concurrency: int
+    requests: int
+    errors: int
+    elapsed: float
+    latencies: List[float]
+    peak_memory: Optional[int]
+
+    @property
+    def requests_per_second(self) -> float:
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, p: float) -> float:
+        return percentile(self.latencies, p)
+
+
+def percentile(values: List[float], p: float) -> float:
+    """
+    Returns the p-th percentile (0-100) of values, by nearest rank
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered) + 0.5)) - 1))]
+
+
+async def run_scenario(name: str, call: Callable[[int], Awaitable], requests: int, concurrency: int,
+                       measure_memory: bool = False) -> ScenarioResult:
+    """
+    Runs call(i) for i in range(requests) with 'concurrency' workers and times every call
+    """
+    latencies = []
+    errors = 0
+    next_index = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in next_index:
+            start = time.perf_counter()
+            try:
+                await call(i)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    if measure_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    peak_memory = None
+    if measure_memory:
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return ScenarioResult(name, concurrency, requests, errors, elapsed, latencies, peak_memory)
+
+
+def scenarios(adapter: CmsApiAdapter, callsigns: List[str]) -> Dict[str, Callable[[int], Awaitable]]:
+    account = Account(cms_api=adapter)
+    sysop = Sysop(cms_api=adapter)
+    inquiries = Inquires(cms_api=adapter)
+
+    async def catalog_get(i: int):
+        (await inquiries.catalog_get()).inquiries
+
+    async def sysop_get(i: int):
+        (await sysop.sysop_get(callsigns[i % len(callsigns)], "PASSWORD")).sysop_record
+
+    return {
+        "account_exists": lambda i: account.account_exists(callsigns[i % len(callsigns)]),
+        "validate_password": lambda i: account.validate_password(callsigns[i % len(callsigns)], "PASSWORD"),
+        "get_locked_out": lambda i: account.get_locked_out(callsigns[i % len(callsigns)]),
+        "sysop_get": sysop_get,
+        "catalog_get": catalog_get,
+    }
+
+
+def print_result(result: ScenarioResult):
+    memory = f"{result.peak_memory / 1e6:9.2f}" if result.peak_memory is not None else f"{'-':>9}"
+    print(f"{result.name:18} {result.concurrency:5d} {result.requests:7d} {result.errors:6d} "
+          f"{result.requests_per_second:9.1f} {result.percentile(50) * 1000:8.2f} "
+          f"{result.percentile(95) * 1000:8.2f} {result.percentile(99) * 1000:8.2f} {memory}")
+
+
+async def main(args):
+    api = StubCmsApi(latency=args.latency, latency_jitter=args.jitter, error_rate=args.error_rate,
+                     catalog_size=args.catalog_size, sysop_comment_size=args.sysop_comment_size, seed=1)
+    callsigns = api.populate(args.accounts, locked_out_every=10)
+    with StubCmsServer(api).in_thread() as server:
+        print(f"stub: latency={args.latency}s jitter={args.jitter}s error_rate={args.error_rate} "
+              f"catalog_size={args.catalog_size}")
+        print(f"{'scenario':18} {'conc':>5} {'reqs':>7} {'errors':>6} {'req/s':>9} "
+              f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'peak MB':>9}")
+        for concurrency in args.concurrency:
+            adapter = CmsApiAdapter("benchmark-key", server.hostname, scheme="http", coalesce=False,
+                                    max_keepalive_connections=max(20, concurrency))
+            async with adapter:
+                for name, call in scenarios(adapter, callsigns).items():
+                    if args.scenarios and name not in args.scenarios:
+                        continue
+                    requests = args.catalog_requests if name == "catalog_get" else args.requests
+                    print_result(await run_scenario(name, call, requests, concurrency, args.memory))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the CMS API wrapper against a local stub")
+    parser.add_argument("--requests", type=int, default=1000, help="calls per scenario and concurrency level")
+    parser.add_argument("--catalog-requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=lambda s: [int(c) for c in s.split(",")], default=[1, 10, 50])
+    parser.add_argument("--scenarios", type=lambda s: s.split(","), default=None)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--catalog-size", type=int, default=2000)
+    parser.add_argument("--sysop-comment-size", type=int, default=0)
+    parser.add_argument("--accounts", type=int, default=500)
+    parser.add_argument("--memory", action="store_true", help="report peak allocated memory (slower)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
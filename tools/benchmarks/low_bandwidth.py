@@ -0,0 +1,87 @@
+"""
+Measures interactive latency over a slow link while catalog downloads run in the background,
+against the local CMS API stub with an emulated link bandwidth. Run from the repository root:
+
+    python -m tools.benchmarks.low_bandwidth --bandwidth 200000 --requests 40 --background 4
+
+For uncompressed responses, gzip responses, and gzip with a LowBandwidthProfile, it reports the
+latency percentiles of account_exists calls, the catalogs downloaded meanwhile, and the response
+bytes received (on the wire) and decoded.
+"""
+import argparse
+import asyncio
+from typing import Dict
+
+from src.cms_api_wrapper.bandwidth import LowBandwidthProfile
+from src.cms_api_wrapper.cms_api_adapter import CmsApiAdapter
+from src.cms_api_wrapper.models.account import Account
+from src.cms_api_wrapper.ratelimit import PRIORITY_BACKGROUND
+from tools.benchmarks.load_test import run_scenario
+from tools.cms_api_stub import StubCmsApi, StubCmsServer
+
+
+def modes(args) -> Dict[str, Dict]:
+    """
+    Adapter options of each mode, and whether the stub compresses
+    """
+    return {
+        "identity": {"adapter": {"compression": False}, "compress": False},
+        "gzip": {"adapter": {}, "compress": True},
+        "gzip+profile": {"adapter": {"low_bandwidth": LowBandwidthProfile(args.max_transfers)}, "compress": True},
+    }
+
+
+async def run_mode(name: str, mode: Dict, api: StubCmsApi, hostname: str, callsigns, args):
+    api.compress = mode["compress"]
+    adapter = CmsApiAdapter("benchmark-key", hostname, scheme="http", coalesce=False, **mode["adapter"])
+    account = Account(cms_api=adapter)
+    catalogs = 0
+    stop = asyncio.Event()
+
+    async def background():
+        nonlocal catalogs
+        while not stop.is_set():
+            # As Inquires.refresh_catalog() fetches it, past the cache
+            await adapter.get_conditional("inquiries/catalog/", priority=PRIORITY_BACKGROUND)
+            catalogs += 1
+
+    async with adapter:
+        downloads = [asyncio.ensure_future(background()) for _ in range(args.background)]
+        # Let the downloads take the link first
+        await asyncio.sleep(0.05)
+        result = await run_scenario(name, lambda i: account.account_exists(callsigns[i]), args.requests,
+                                    args.concurrency)
+        stop.set()
+        await asyncio.gather(*downloads)
+    transfers = adapter.transfers
+    print(f"{name:14} {result.percentile(50) * 1000:8.1f} {result.percentile(95) * 1000:8.1f} "
+          f"{result.percentile(99) * 1000:8.1f} {result.errors:6d} {catalogs:8d} {transfers.wire_bytes:10d} "
+          f"{transfers.content_bytes:10d}")
+
+
+async def main(args):
+    api = StubCmsApi(latency=args.latency, catalog_size=args.catalog_size, bandwidth=args.bandwidth)
+    callsigns = api.populate(args.requests, with_sysop=False)
+    with StubCmsServer(api).in_thread() as server:
+        print(f"stub: bandwidth={args.bandwidth:g} B/s latency={args.latency}s catalog_size={args.catalog_size}, "
+              f"{args.background} background downloads, {args.concurrency} interactive callers")
+        print(f"{'mode':14} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6} {'catalogs':>8} "
+              f"{'received':>10} {'decoded':>10}")
+        for name, mode in modes(args).items():
+            await run_mode(name, mode, api, server.hostname, callsigns, args)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Interactive latency over a slow link")
+    parser.add_argument("--bandwidth", type=float, default=200000.0, help="bytes per second of the link")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--catalog-size", type=int, default=500)
+    parser.add_argument("--background", type=int, default=4, help="concurrent background catalog downloads")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--max-transfers", type=int, default=2, help="transfer limit of the low-bandwidth profile")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
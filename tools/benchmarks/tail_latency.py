@@ -0,0 +1,77 @@
+"""
+Compares tail latency with and without per-call deadlines and hedged requests, against the
+local CMS API stub with a share of requests made very slow. Run from the repository root:
+
+    python -m tools.benchmarks.tail_latency --requests 2000 --slow-rate 0.02 --slow-latency 0.5
+
+For each mode it reports the latency percentiles of account_exists calls, the calls that
+failed (with a deadline: that ran out of time) and how many requests reached the server.
+"""
+import argparse
+import asyncio
+from typing import Dict
+
+from src.cms_api_wrapper.cms_api_adapter import CmsApiAdapter
+from src.cms_api_wrapper.hedging import HedgingPolicy
+from src.cms_api_wrapper.models.account import Account
+from src.cms_api_wrapper.resilience import RetryPolicy
+from tools.benchmarks.load_test import ScenarioResult, run_scenario
+from tools.cms_api_stub import StubCmsApi, StubCmsServer
+
+
+def modes(args) -> Dict[str, Dict]:
+    """
+    Adapter options and per-call deadline of each mode
+    """
+    return {
+        "baseline": {"adapter": {}, "deadline": None},
+        "deadline": {"adapter": {}, "deadline": args.deadline},
+        "hedged": {"adapter": {"hedging": HedgingPolicy(args.percentile)}, "deadline": None},
+        "hedged+deadline": {"adapter": {"hedging": HedgingPolicy(args.percentile)}, "deadline": args.deadline},
+    }
+
+
+def print_result(result: ScenarioResult, server_requests: int):
+    print(f"{result.name:16} {result.requests:7d} {result.errors:6d} {server_requests:8d} "
+          f"{result.percentile(50) * 1000:8.2f} {result.percentile(95) * 1000:8.2f} "
+          f"{result.percentile(99) * 1000:8.2f} {max(result.latencies) * 1000:8.2f}")
+
+
+async def main(args):
+    api = StubCmsApi(latency=args.latency, latency_jitter=args.jitter, slow_rate=args.slow_rate,
+                     slow_latency=args.slow_latency, seed=1)
+    callsigns = api.populate(args.accounts, with_sysop=False)
+    with StubCmsServer(api).in_thread() as server:
+        print(f"stub: latency={args.latency}s jitter={args.jitter}s slow_rate={args.slow_rate} "
+              f"slow_latency={args.slow_latency}s, deadline={args.deadline}s, hedge after p{args.percentile:g}")
+        print(f"{'mode':16} {'calls':>7} {'errors':>6} {'server':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+              f"{'max ms':>8}")
+        for name, mode in modes(args).items():
+            adapter = CmsApiAdapter("benchmark-key", server.hostname, scheme="http", coalesce=False,
+                                    retry_policy=RetryPolicy(max_attempts=1), failure_threshold=10 ** 6,
+                                    max_keepalive_connections=args.concurrency * 2, **mode["adapter"])
+            account = Account(cms_api=adapter)
+            deadline = mode["deadline"]
+            before = api.total_requests
+            async with adapter:
+                result = await run_scenario(name, lambda i: account.account_exists(
+                    callsigns[i % len(callsigns)], deadline=deadline), args.requests, args.concurrency)
+            print_result(result, api.total_requests - before)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Tail latency with deadlines and hedged requests")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--jitter", type=float, default=0.005)
+    parser.add_argument("--slow-rate", type=float, default=0.02, help="fraction of requests made slow")
+    parser.add_argument("--slow-latency", type=float, default=0.5, help="extra seconds of a slow request")
+    parser.add_argument("--deadline", type=float, default=0.1, help="seconds per call in the deadline modes")
+    parser.add_argument("--percentile", type=float, default=95.0, help="latency percentile to hedge after")
+    parser.add_argument("--accounts", type=int, default=500)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
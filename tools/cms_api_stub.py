@@ -0,0 +1,433 @@
+"""
+A local stand-in for the CMS web services, for tests and benchmarks. It answers the
+account, sysop and inquiries endpoints used by the wrapper from in-memory state, with
+configurable latency, error rate, payload sizes, gzip compression and link bandwidth.
+
+StubCmsApi holds the state and can be plugged into an adapter directly with transport().
+StubCmsServer serves it over a real HTTP/1.1 socket with keep-alive:
+
+    async with StubCmsServer(StubCmsApi(latency=0.02)) as server:
+        adapter = CmsApiAdapter("key", server.hostname, scheme="http")
+
+Run it on its own with:
+
+    python -m tools.cms_api_stub --port 8080 --latency 0.05 --accounts 1000
+"""
+import argparse
+import asyncio
+import contextlib
+import gzip
+import json
+import random
+import threading
+import time
+from http import HTTPStatus
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import httpx
+
+CATEGORIES = ["WX", "NEWS", "GOV", "PROP", "SPACE", "HF", "VHF", "MARINE"]
+
+StubResponse = Tuple[int, Dict[str, str], bytes]
+
+
+class StubAccount:
+    def __init__(self, callsign: str, password: str, recovery_email: str = ""):
+        self.callsign = callsign
+        self.password = password
+        self.recovery_email = recovery_email
+        self.alternate_email = ""
+        self.max_message_size = 120
+        self.locked_out = False
+        self.lockout_reason = ""
+        self.sysop: Optional[Dict[str, str]] = None
+
+
+class StubCmsApi:
+    """
+    In-memory CMS API state and request handling
+    """
+
+    def __init__(self, latency: float = 0.0, latency_jitter: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 503, catalog_size: int = 200, sysop_comment_size: int = 0, seed: int = None,
+                 slow_rate: float = 0.0, slow_latency: float = 1.0, compress: bool = False, bandwidth: float = None):
+        """
+        :param latency: Seconds added to every response
+        :param latency_jitter: Up to this many extra seconds, chosen at random per request
+        :param error_rate: Fraction of requests answered with error_status instead of being handled
+        :param error_status: HTTP status used for injected errors
+        :param catalog_size: Number of entries in the inquiry catalog
+        :param sysop_comment_size: Length of the comments field of sysop records, to enlarge payloads
+        :param seed: (optional) Seed for latency jitter and error injection
+        :param slow_rate: Fraction of requests that take slow_latency seconds longer, to model a latency tail
+        :param slow_latency: Extra seconds taken by the slow requests
+        :param compress: gzip response bodies for clients that accept it
+        :param bandwidth: (optional) Bytes per second of a link shared by all responses, to model a slow connection
+        """
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.sysop_comment_size = sysop_comment_size
+        self.compress = compress
+        self.bandwidth = bandwidth
+        self._link_free_at = 0.0
+        self.accounts: Dict[str, StubAccount] = {}
+        self.request_counts: Dict[str, int] = {}
+        self._random = random.Random(seed)
+        self.catalog = [{"Category": CATEGORIES[i % len(CATEGORIES)], "InquiryId": f"INQ{i:06d}",
+                         "Subject": f"{CATEGORIES[i % len(CATEGORIES)]} bulletin number {i}",
+                         "SizeEstimate": 500 + (i * 37) % 50000} for i in range(catalog_size)]
+        self._routes = {
+            "account/exists/": self._account_exists,
+            "account/add/": self._account_add,
+            "account/remove": self._account_remove,
+            "account/password/change/": self._password_change,
+            "account/password/validate/": self._password_validate,
+            "account/password/send": self._password_send,
+            "account/alternateEmail/get": self._alternate_email_get,
+            "account/alternateEmail/set": self._alternate_email_set,
+            "account/password/recovery/email/get": self._recovery_email_get,
+            "account/password/recovery/email/set": self._recovery_email_set,
+            "account/lockedOut/get": self._locked_out_get,
+            "account/lockedOutReason/get": self._locked_out_reason_get,
+            "account/maxMessageSize/get": self._max_message_size_get,
+            "account/maxMessageSize/set": self._max_message_size_set,
+            "inquiries/catalog/": self._catalog,
+            "sysop/add/": self._sysop_add,
+            "sysop2/get": self._sysop_get,
+        }
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.request_counts.values())
+
+    def add_account(self, callsign: str, password: str = "PASSWORD", locked_out: bool = False,
+                    with_sysop: bool = False) -> StubAccount:
+        account = StubAccount(callsign.upper(), password)
+        account.locked_out = locked_out
+        account.lockout_reason = "Locked by stub" if locked_out else ""
+        if with_sysop:
+            account.sysop = {"Callsign": account.callsign, "GridSquare": "FN31pr", "SysopName": "Stub Sysop",
+                             "StreetAddress1": "225 Main Street", "StreetAddress2": "", "City": "Newington",
+                             "State": "CT", "Country": "USA", "PostalCode": "06111",
+                             "Email": "sysop@example.com", "Phones": "", "Website": "",
+                             "Comments": "x" * self.sysop_comment_size}
+        self.accounts[account.callsign] = account
+        return account
+
+    def populate(self, count: int, locked_out_every: int = 0, with_sysop: bool = True) -> List[str]:
+        """
+        Adds count accounts named ZZ<n>TST and returns their callsigns
+        """
+        callsigns = []
+        for i in range(count):
+            locked_out = bool(locked_out_every) and i % locked_out_every == 0
+            callsigns.append(self.add_account(f"ZZ{i}TST", locked_out=locked_out, with_sysop=with_sysop).callsign)
+        return callsigns
+
+    async def handle(self, method: str, path: str, params: Dict[str, str], body: bytes = b"") -> StubResponse:
+        """
+        Handles one request and returns (status, headers, body)
+        """
+        endpoint = path.lstrip("/")
+        self.request_counts[endpoint] = self.request_counts.get(endpoint, 0) + 1
+        delay = self.latency + (self._random.uniform(0, self.latency_jitter) if self.latency_jitter else 0.0)
+        if self.slow_rate and self._random.random() < self.slow_rate:
+            delay += self.slow_latency
+        if delay:
+            await asyncio.sleep(delay)
+        if self.error_rate and self._random.random() < self.error_rate:
+            return self.error_status, {"Retry-After": "0"}, HTTPStatus(self.error_status).phrase.encode()
+        route = self._routes.get(endpoint)
+        if route is None:
+            return 404, {}, b"Not Found"
+        params = dict(params)
+        params.update(_body_params(body))
+        try:
+            data = route(params)
+        except StubValidationError as e:
+            return 400, {}, _json({"ResponseStatus": {"ErrorCode": e.error_code, "Message": e.message}})
+        data["ResponseStatus"] = {}
+        return 200, {}, _json(data)
+
+    async def respond(self, method: str, path: str, params: Dict[str, str], body: bytes = b"",
+                      accept_encoding: str = "") -> StubResponse:
+        """
+        Handles one request like handle(), compressing the response body if compress is set and the client
+        accepts gzip, and holding it back for as long as it would take to send over the configured bandwidth
+        """
+        status, headers, response_body = await self.handle(method, path, params, body)
+        if self.compress and "gzip" in accept_encoding:
+            response_body = gzip.compress(response_body, compresslevel=6)
+            headers = {**headers, "Content-Encoding": "gzip"}
+        if self.bandwidth:
+            # Bodies queue for the link one after another, as over a single slow connection
+            now = time.monotonic()
+            self._link_free_at = max(now, self._link_free_at) + len(response_body) / self.bandwidth
+            await asyncio.sleep(self._link_free_at - now)
+        return status, headers, response_body
+
+    def transport(self) -> httpx.MockTransport:
+        """
+        Returns an httpx transport that answers from this stub without a socket
+        """
+        async def handler(request: httpx.Request) -> httpx.Response:
+            accept_encoding = request.headers.get("Accept-Encoding", "")
+            status, headers, body = await self.respond(request.method, request.url.path, dict(request.url.params),
+                                                       await request.aread(), accept_encoding)
+            # Passed as a stream, so that the client counts the bytes it receives
+            return httpx.Response(status, headers=headers, stream=httpx.ByteStream(body))
+        return httpx.MockTransport(handler)
+
+    # Endpoint handlers
+
+    def _account(self, params: Dict[str, str], check_password: bool = False) -> StubAccount:
+        account = self.accounts.get(params.get("Callsign", "").upper())
+        if account is None:
+            raise StubValidationError("AccountNotFound", "The account does not exist")
+        if check_password and params.get("Password") != account.password:
+            raise StubValidationError("InvalidPassword", "The password is not valid")
+        return account
+
+    def _account_exists(self, params):
+        return {"CallsignExists": params.get("Callsign", "").upper() in self.accounts}
+
+    def _account_add(self, params):
+        if params.get("Callsign", "").upper() in self.accounts:
+            raise StubValidationError("AccountExists", "The account already exists")
+        account = self.add_account(params["Callsign"], params.get("Password", ""))
+        account.recovery_email = params.get("RecoveryEmail", "")
+        return {}
+
+    def _account_remove(self, params):
+        self._account(params, check_password=True)
+        del self.accounts[params["Callsign"].upper()]
+        return {}
+
+    def _password_change(self, params):
+        account = self._account(params)
+        if params.get("OldPassword") != account.password:
+            raise StubValidationError("InvalidPassword", "The password is not valid")
+        account.password = params.get("NewPassword", "")
+        return {}
+
+    def _password_validate(self, params):
+        account = self._account(params)
+        return {"IsValid": params.get("Password") == account.password}
+
+    def _password_send(self, params):
+        if not self._account(params).recovery_email:
+            raise StubValidationError("NoRecoveryEmail", "No password recovery address is set")
+        return {}
+
+    def _alternate_email_get(self, params):
+        return {"AlternateEmail": self._account(params, check_password=True).alternate_email}
+
+    def _alternate_email_set(self, params):
+        self._account(params, check_password=True).alternate_email = params.get("AlternateEmail", "")
+        return {}
+
+    def _recovery_email_get(self, params):
+        return {"RecoveryEmail": self._account(params, check_password=True).recovery_email}
+
+    def _recovery_email_set(self, params):
+        self._account(params, check_password=True).recovery_email = params.get("RecoveryEmail", "")
+        return {}
+
+    def _locked_out_get(self, params):
+        return {"LockedOut": self._account(params).locked_out}
+
+    def _locked_out_reason_get(self, params):
+        return {"Reason": self._account(params).lockout_reason}
+
+    def _max_message_size_get(self, params):
+        return {"MaxMessageSize": self._account(params).max_message_size}
+
+    def _max_message_size_set(self, params):
+        size = int(params.get("MaxMessageSize", 0))
+        if not 0 <= size <= 120:
+            raise StubValidationError("InvalidMaxMessageSize", "The maximum message size is 120K")
+        self._account(params).max_message_size = size
+        return {}
+
+    def _catalog(self, params):
+        return {"Inquiries": self.catalog}
+
+    def _sysop_add(self, params):
+        account = self._account(params, check_password=True)
+        account.sysop = {name: params.get(name, "") for name in (
+            "Callsign", "GridSquare", "SysopName", "StreetAddress1", "StreetAddress2", "City", "State",
+            "Country", "PostalCode", "Email", "Phones", "Website", "Comments")}
+        account.sysop["Callsign"] = account.callsign
+        return {}
+
+    def _sysop_get(self, params):
+        account = self._account(params, check_password=True)
+        # As the CMS does, an account without a sysop record gets a null Sysop
+        return {"Sysop": account.sysop}
+
+
+class StubValidationError(Exception):
+    def __init__(self, error_code: str, message: str):
+        super().__init__(message)
+        self.error_code = error_code
+        self.message = message
+
+
+def _json(data: Dict) -> bytes:
+    return json.dumps(data).encode()
+
+
+def _body_params(body: bytes) -> Dict[str, str]:
+    """
+    Accepts parameters sent as a JSON object or as a form in the request body
+    """
+    if not body:
+        return {}
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return dict(parse_qsl(body.decode()))
+    if not isinstance(data, dict):
+        return {}
+    return {name: "" if value is None else str(value) for name, value in data.items()}
+
+
+class StubCmsServer:
+    """
+    Serves a StubCmsApi over HTTP/1.1 with keep-alive on a local port
+    """
+
+    def __init__(self, api: StubCmsApi = None, host: str = "127.0.0.1", port: int = 0):
+        """
+        :param api: The stub to serve (a default one is created if omitted)
+        :param host: Interface to listen on
+        :param port: Port to listen on, 0 picks a free one
+        """
+        self.api = api or StubCmsApi()
+        self.host = host
+        self.port = port
+        self.connections = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._handlers = set()
+
+    @property
+    def hostname(self) -> str:
+        """
+        host:port, as passed to CmsApiAdapter
+        """
+        return f"{self.host}:{self.port}"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            # Connections still waiting on a slow response, e.g. from clients that gave up on it
+            for handler in list(self._handlers):
+                handler.cancel()
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.stop()
+
+    @contextlib.contextmanager
+    def in_thread(self):
+        """
+        Runs the server on its own event loop in a background thread, so that it doesn't
+        compete with the client for the caller's event loop:
+
+            with StubCmsServer(api).in_thread() as server:
+                ...
+        """
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, name="cms-api-stub", daemon=True)
+        thread.start()
+        asyncio.run_coroutine_threadsafe(self.start(), loop).result()
+        try:
+            yield self
+        finally:
+            asyncio.run_coroutine_threadsafe(self.stop(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        handler = asyncio.current_task()
+        self._handlers.add(handler)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                url = urlsplit(target)
+                status, response_headers, response_body = await self.api.respond(
+                    method, url.path, dict(parse_qsl(url.query, keep_blank_values=True)), body,
+                    headers.get("accept-encoding", ""))
+                keep_alive = headers.get("connection", "").lower() != "close"
+                head = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+                        "Content-Type: application/json",
+                        f"Content-Length: {len(response_body)}",
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+                head += [f"{name}: {value}" for name, value in response_headers.items()]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + response_body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # Cancelled by stop(); ending quietly keeps asyncio from logging the handler as failed
+            pass
+        finally:
+            self._handlers.discard(handler)
+            writer.close()
+
+
+async def _main(args):
+    api = StubCmsApi(latency=args.latency, latency_jitter=args.jitter, error_rate=args.error_rate,
+                     catalog_size=args.catalog_size, slow_rate=args.slow_rate, slow_latency=args.slow_latency,
+                     compress=args.compress, bandwidth=args.bandwidth)
+    api.populate(args.accounts)
+    async with StubCmsServer(api, args.host, args.port) as server:
+        print(f"CMS API stub listening on http://{server.hostname}/ with {args.accounts} accounts")
+        await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the CMS web services")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra latency, in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of requests delayed by --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=1.0)
+    parser.add_argument("--catalog-size", type=int, default=200)
+    parser.add_argument("--compress", action="store_true", help="gzip responses for clients that accept it")
+    parser.add_argument("--bandwidth", type=float, help="bytes per second of the emulated link")
+    parser.add_argument("--accounts", type=int, default=100, help="accounts named ZZ<n>TST, password PASSWORD")
+    try:
+        asyncio.run(_main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass